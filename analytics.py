@@ -0,0 +1,172 @@
+# analytics.py
+"""
+Estadísticas de autor (visitas, likes, comentarios y seguidores en el
+tiempo) servidas desde tablas de rollup diarias.
+
+- NoteDailyStats: una fila por nota y día con actividad. Los write paths la
+  actualizan con bump() en la misma transacción que la visita, el like o el
+  comentario. Likes y comentarios cuentan en el día en que se crearon (al
+  retirarlos se resta de ese día), así que `flask rollup-analytics` puede
+  recalcular cualquier rango desde las filas vivas y corregir la deriva.
+  Las visitas no tienen filas de origen: solo las escribe bump().
+- UserDailyStats: seguidores netos por día (seguimientos menos bajas de
+  ese día). Las bajas no dejan filas de origen, así que el lote no lo
+  recalcula: solo lo escriben follow() y unfollow(). La curva de
+  crecimiento parte de UserStats.followers_count y resta hacia atrás.
+
+Cada consulta del panel filtra por (user_id, day) con el índice
+ix_note_daily_stats_user_day y agrega en SQL (GROUP BY) dentro de una
+ventana de como mucho MAX_DAYS días: el coste depende del tamaño de la
+ventana, no de la actividad acumulada.
+"""
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func
+
+from extensions import db
+from models import Note, Like, Comment, UserStats, NoteDailyStats, UserDailyStats
+
+MAX_DAYS = 365
+WINDOWS = (7, 30, 90, 365)
+TOP_NOTES = 10
+
+
+def window(days, today=None):
+    """(primer día, último día) de los últimos `days` días, hoy incluido"""
+    days = max(1, min(days, MAX_DAYS))
+    end = today or datetime.utcnow().date()
+    return end - timedelta(days=days - 1), end
+
+
+def _day(value):
+    # func.date() devuelve 'YYYY-MM-DD' en SQLite
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def _days(start, end):
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def _sums(user_id, start, end):
+    columns = [func.coalesce(func.sum(getattr(NoteDailyStats, name)), 0) for name in NoteDailyStats.COUNTERS]
+    row = db.session.query(*columns).filter(
+        NoteDailyStats.user_id == user_id, NoteDailyStats.day.between(start, end)).one()
+    return dict(zip(NoteDailyStats.COUNTERS, row))
+
+
+def totals(user_id, start, end):
+    """Totales de la ventana y variación frente a la ventana anterior del mismo tamaño"""
+    current = _sums(user_id, start, end)
+    length = (end - start).days + 1
+    previous = _sums(user_id, start - timedelta(days=length), start - timedelta(days=1))
+    return {
+        name: {
+            'total': current[name],
+            'previous': previous[name],
+            'change': round((current[name] - previous[name]) / previous[name] * 100, 1) if previous[name] else None
+        }
+        for name in NoteDailyStats.COUNTERS
+    }
+
+
+def daily_series(user_id, start, end):
+    """{'days': [...], 'views': [...], 'likes': [...], 'comments': [...]} con ceros en los días sin actividad"""
+    rows = db.session.query(
+        NoteDailyStats.day, *[func.sum(getattr(NoteDailyStats, name)) for name in NoteDailyStats.COUNTERS]
+    ).filter(NoteDailyStats.user_id == user_id, NoteDailyStats.day.between(start, end))\
+        .group_by(NoteDailyStats.day).all()
+    by_day = {_day(row[0]): row[1:] for row in rows}
+    days = _days(start, end)
+    series = {'days': [day.isoformat() for day in days]}
+    for index, name in enumerate(NoteDailyStats.COUNTERS):
+        series[name] = [by_day[day][index] if day in by_day else 0 for day in days]
+    return series
+
+
+def top_notes(user_id, start, end, metric='views', limit=TOP_NOTES):
+    if metric not in NoteDailyStats.COUNTERS:
+        metric = 'views'
+    sums = {name: func.sum(getattr(NoteDailyStats, name)).label(name) for name in NoteDailyStats.COUNTERS}
+    rows = db.session.query(NoteDailyStats.note_id, *sums.values())\
+        .filter(NoteDailyStats.user_id == user_id, NoteDailyStats.day.between(start, end))\
+        .group_by(NoteDailyStats.note_id)\
+        .order_by(sums[metric].desc(), NoteDailyStats.note_id)\
+        .limit(limit).all()
+    titles = dict(db.session.query(Note.id, Note.title).filter(Note.id.in_([row.note_id for row in rows])))
+    return [
+        dict({'id': row.note_id, 'title': titles.get(row.note_id, '')},
+             **{name: getattr(row, name) for name in NoteDailyStats.COUNTERS})
+        for row in rows if row.note_id in titles
+    ]
+
+
+def follower_growth(user_id, start, end):
+    """Seguidores al final de cada día de la ventana y ganancia neta diaria"""
+    today = datetime.utcnow().date()
+    rows = db.session.query(UserDailyStats.day, UserDailyStats.followers)\
+        .filter(UserDailyStats.user_id == user_id, UserDailyStats.day.between(start, today)).all()
+    gained = {_day(day): value for day, value in rows}
+    stats = db.session.get(UserStats, user_id)
+    current = stats.followers_count if stats else 0
+    # Seguidores al cierre del día anterior a la ventana
+    count = current - sum(gained.values())
+    days = _days(start, end)
+    net, totals_by_day = [], []
+    for day in days:
+        count += gained.get(day, 0)
+        net.append(gained.get(day, 0))
+        totals_by_day.append(count)
+    return {'days': [day.isoformat() for day in days], 'gained': net, 'followers': totals_by_day,
+            'current': current}
+
+
+def dashboard(user_id, days=30, metric='views'):
+    start, end = window(days)
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'days': (end - start).days + 1,
+        'totals': totals(user_id, start, end),
+        'series': daily_series(user_id, start, end),
+        'top_notes': top_notes(user_id, start, end, metric),
+        'followers': follower_growth(user_id, start, end)
+    }
+
+
+# --- Lote nocturno ---
+
+def _load(model, key_columns, start, end):
+    rows = model.query.filter(model.day.between(start, end)).all()
+    return {tuple(getattr(row, column) for column in key_columns): row for row in rows}
+
+
+def rollup(start, end):
+    """
+    Recalcula likes y comentarios de los días [start, end] desde las filas
+    de origen (las visitas y los seguidores se conservan). Devuelve las
+    filas diarias escritas.
+    """
+    since = datetime.combine(start, time.min)
+    until = datetime.combine(end + timedelta(days=1), time.min)
+
+    notes = _load(NoteDailyStats, ('note_id', 'day'), start, end)
+    for row in notes.values():
+        row.likes = row.comments = 0
+    for model, column in ((Like, 'likes'), (Comment, 'comments')):
+        day = func.date(model.created_at)
+        counts = db.session.query(model.note_id, Note.user_id, day, func.count(model.id))\
+            .join(Note, Note.id == model.note_id)\
+            .filter(model.created_at >= since, model.created_at < until)\
+            .group_by(model.note_id, Note.user_id, day)
+        for note_id, user_id, value, count in counts:
+            key = (note_id, _day(value))
+            row = notes.get(key)
+            if row is None:
+                row = notes[key] = NoteDailyStats(note_id=note_id, day=key[1], user_id=user_id,
+                                                  views=0, likes=0, comments=0)
+                db.session.add(row)
+            row.user_id = user_id
+            setattr(row, column, count)
+
+    db.session.commit()
+    return len(notes)
@@ -2,12 +2,23 @@ from flask import Flask, render_template, request, redirect, url_for, flash, sen
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, login_required, current_user
 import os
-from datetime import datetime
+import click
+from datetime import datetime, timedelta
 from flask_migrate import Migrate
 from extensions import db, login_manager, migrate
-from models import User, Category, Note, Attachment, Like, Comment, Badge
-from blueprints import auth_bp, notes_bp, categories_bp, tasks_bp, calendar_bp, feed_bp, users_bp, social_bp
+from models import User, Category, Note, Attachment, Like, Comment, Badge, UserStats
+from blueprints import auth_bp, notes_bp, categories_bp, tasks_bp, calendar_bp, feed_bp, users_bp, social_bp, stream_bp, analytics_bp
 from helpers import create_uploads_folder
+import cache
+import assets
+import compression
+import scheduler
+import recurrence
+import ratelimit
+import passwords
+import metrics
+import profiler
+import changelog  # registra el evento after_flush del registro de cambios
 
 # Configuration
 app = Flask(__name__)
@@ -21,6 +32,7 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload
 
 # Custom Jinja tests
 app.jinja_env.tests['match'] = lambda s, p: bool(re.match(p, s)) if s else False
+app.jinja_env.filters['recurrence'] = recurrence.describe
 
 # Inicializar extensiones
 db.init_app(app)
@@ -29,6 +41,30 @@ migrate.init_app(app, db)
 
 login_manager.login_view = 'auth.login'
 
+# Fragment and page caches (cached_fragment() in templates)
+cache.init_app(app)
+
+# Jinja bytecode cache, precompile command and fingerprinted static assets
+assets.init_app(app)
+
+# Per-endpoint request metrics at /metrics (before compression: counts bytes sent)
+metrics.init_app(app)
+
+# SQL/template timings for slow requests, stack sampling and ?_profile=1 (/profiler)
+profiler.init_app(app)
+
+# gzip/brotli responses and precompressed static variants
+compression.init_app(app)
+
+# Token-bucket throttling of likes, comments, follows and logins
+ratelimit.init_app(app)
+
+# Bounded pool for password hashing (login/register)
+passwords.init_app(app)
+
+# Overdue tasks and due-date reminders (background thread + CLI)
+scheduler.init_app(app)
+
 # Register user_loader directly in app.py
 @login_manager.user_loader
 def load_user(user_id):
@@ -44,6 +80,84 @@ app.register_blueprint(calendar_bp)
 app.register_blueprint(feed_bp)
 app.register_blueprint(users_bp)
 app.register_blueprint(social_bp)
+app.register_blueprint(stream_bp)
+app.register_blueprint(analytics_bp)
+
+# CLI commands
+@app.cli.command('rebuild-user-stats')
+def rebuild_user_stats():
+    """Recalcula la tabla user_stats a partir de notas, likes, comentarios y seguidores"""
+    count = UserStats.rebuild()
+    print(f'Rebuilt stats for {count} users.')
+
+@app.cli.command('compute-suggestions')
+@click.option('--workers', default=1, help='Procesos para repartir el cálculo')
+@click.option('--top-k', default=20, help='Sugerencias guardadas por usuario')
+def compute_suggestions(workers, top_k):
+    """Recalcula las sugerencias de usuarios a seguir (amigos de amigos)"""
+    from suggestions import compute_all
+    count = compute_all(workers=workers, top_k=top_k)
+    print(f'Computed suggestions for {count} users.')
+
+@app.cli.command('compact-revisions')
+@click.option('--keep-days', default=30, help='Días de historial que se conservan completos')
+def compact_revisions_command(keep_days):
+    """Deja una revisión por día en el historial más antiguo que --keep-days"""
+    from revisions import compact_revisions
+    notes, removed = compact_revisions(keep_days=keep_days)
+    print(f'Removed {removed} revisions from {notes} notes.')
+
+@app.cli.command('compact-changes')
+@click.option('--keep-days', default=None, type=int, help='Días que se conservan (CHANGE_LOG_RETENTION_DAYS)')
+def compact_changes_command(keep_days):
+    """Compacta el registro de cambios y borra las entradas más antiguas que --keep-days"""
+    from changelog import compact_changes
+    keep_days = keep_days or app.config.get('CHANGE_LOG_RETENTION_DAYS', 30)
+    compacted, expired = compact_changes(keep_days=keep_days)
+    print(f'Compacted {compacted} superseded entries, expired {expired} entries.')
+
+@app.cli.command('rollup-analytics')
+@click.option('--days', default=2, help='Días recalculados, hoy incluido')
+@click.option('--since', default=None, help='Recalcula desde esta fecha (YYYY-MM-DD)')
+def rollup_analytics_command(days, since):
+    """Recalcula likes y comentarios diarios desde las filas de origen"""
+    from analytics import rollup
+    end = datetime.utcnow().date()
+    start = datetime.strptime(since, '%Y-%m-%d').date() if since else end - timedelta(days=days - 1)
+    written = rollup(start, end)
+    print(f'Rolled up {written} daily rows from {start} to {end}.')
+
+@app.cli.command('benchmark-revisions')
+@click.option('--sizes', default='1000,10000,100000', help='Tamaños de nota (caracteres)')
+@click.option('--edits', default='10,100', help='Número de ediciones')
+def benchmark_revisions_command(sizes, edits):
+    """Espacio y tiempo de reconstrucción de los deltas frente a copias completas"""
+    from revisions import benchmark
+    results = benchmark(sizes=[int(size) for size in sizes.split(',')],
+                        edit_counts=[int(count) for count in edits.split(',')])
+    for result in results:
+        print(f"size={result['size']:>7} edits={result['edits']:>5} "
+              f"full={result['full_bytes']:>10} stored={result['stored_bytes']:>9} "
+              f"({result['ratio']:.1%}, {result['snapshots']} snapshots) "
+              f"rebuild avg={result['rebuild_avg_ms']:.2f}ms max={result['rebuild_max_ms']:.2f}ms")
+
+@app.cli.command('rerender-notes')
+@click.option('--workers', default=1, help='Procesos para renderizar en paralelo')
+def rerender_notes(workers):
+    """Renderiza el Markdown de las notas que no tengan HTML de la versión actual"""
+    from rendering import rerender_all
+    rendered, removed = rerender_all(workers=workers)
+    print(f'Rendered {rendered} contents, removed {removed} stale entries.')
+
+@app.route('/api/cache/stats')
+@login_required
+def cache_stats():
+    return jsonify(cache.all_stats())
+
+@app.route('/api/ratelimit/stats')
+@login_required
+def ratelimit_stats():
+    return jsonify(ratelimit.limiter.stats())
 
 # Root route (redirect to notes table)
 @app.route('/')
@@ -0,0 +1,97 @@
+# assets.py
+"""
+Plantillas precompiladas y recursos estáticos con huella.
+
+- Caché de bytecode de Jinja en disco (compartida por todos los workers) y
+  comando `flask precompile-templates` para rellenarla en el build.
+- `asset_url()` en plantillas: URL del fichero con hash de static/dist si
+  existe el manifest de `flask build-assets`, o de static con ?v=<hash>;
+  ambas se sirven con Cache-Control inmutable de un año.
+"""
+import hashlib
+import json
+import os
+
+from flask import current_app, request, url_for
+from jinja2 import FileSystemBytecodeCache
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_hashes = {}
+
+
+def file_hash(path):
+    """Hash corto del contenido, memorizado por (ruta, mtime)"""
+    mtime = os.path.getmtime(path)
+    cached = _hashes.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        digest = hashlib.md5(f.read()).hexdigest()[:12]
+    _hashes[path] = (mtime, digest)
+    return digest
+
+
+_manifest = {'mtime': None, 'entries': {}}
+
+
+def _load_manifest():
+    """Manifest de `flask build-assets` (static/dist/manifest.json), si existe"""
+    path = os.path.join(current_app.static_folder, 'dist', 'manifest.json')
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    if _manifest['mtime'] != mtime:
+        with open(path) as f:
+            _manifest['entries'] = json.load(f)
+        _manifest['mtime'] = mtime
+    return _manifest['entries']
+
+
+def asset_url(filename):
+    hashed = _load_manifest().get(filename)
+    if hashed:
+        return url_for('static', filename=hashed)
+
+    path = os.path.join(current_app.static_folder, filename)
+    try:
+        version = file_hash(path)
+    except OSError:
+        return url_for('static', filename=filename)
+    return url_for('static', filename=filename, v=version)
+
+
+def _immutable_static(response):
+    fingerprinted = 'v' in request.args or (request.view_args or {}).get('filename', '').startswith('dist/')
+    if request.endpoint == 'static' and fingerprinted and response.status_code == 200:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
+def precompile_templates(app):
+    """Compila todas las plantillas para dejar su bytecode en la caché de disco"""
+    compiled = []
+    for name in app.jinja_env.list_templates():
+        if not name.endswith('.html'):
+            continue
+        app.jinja_env.get_template(name)
+        compiled.append(name)
+    return compiled
+
+
+def init_app(app):
+    cache_dir = app.config.get('JINJA_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.after_request(_immutable_static)
+
+    @app.cli.command('precompile-templates')
+    def precompile_templates_command():
+        """Precompila las plantillas Jinja en la caché de bytecode"""
+        compiled = precompile_templates(app)
+        print(f'Precompiled {len(compiled)} templates into {cache_dir}.')
@@ -6,3 +6,5 @@ from .calendar import calendar_bp
 from .feed import feed_bp
 from .users import users_bp
 from .social import social_bp
+from .stream import stream_bp
+from .analytics import analytics_bp
@@ -0,0 +1,25 @@
+from flask import Blueprint, render_template, request, jsonify
+from flask_login import login_required, current_user
+from analytics import dashboard, WINDOWS
+
+analytics_bp = Blueprint('analytics', __name__)
+
+def _params():
+    days = request.args.get('days', 30, type=int)
+    metric = request.args.get('metric', 'views')
+    return days, metric
+
+@analytics_bp.route('/analytics')
+@login_required
+def author_dashboard():
+    """Views, likes, comments and follower growth for the current user's notes"""
+    days, metric = _params()
+    data = dashboard(current_user.id, days, metric)
+    return render_template('analytics.html', data=data, metric=metric, windows=WINDOWS)
+
+@analytics_bp.route('/api/analytics')
+@login_required
+def author_dashboard_api():
+    """Same data as /analytics as JSON (?days=30&metric=views|likes|comments)"""
+    days, metric = _params()
+    return jsonify(dashboard(current_user.id, days, metric))
@@ -1,20 +1,39 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 from extensions import db
-from models import User
+from models import User, UserStats
+from ratelimit import rate_limit
+from passwords import HashingBusy, verify_missing
 
 # Create a Blueprint for auth routes
 auth_bp = Blueprint('auth', __name__)
 
+def _hashing_busy(template):
+    flash('El servidor está ocupado, inténtalo de nuevo en unos segundos', 'error')
+    return render_template(template), 503, {'Retry-After': '5'}
+
+def _login_key():
+    # Per (IP, username): failed attempts from one address can't lock the account for everyone
+    username = request.form.get('username', '').lower()
+    return f'{request.remote_addr}:{username}' if username else None
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
+@rate_limit('login', methods=('POST',), user_key=_login_key, template='login.html')
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
         user = User.query.filter_by(username=username).first()
         
-        if user and user.check_password(password):
+        try:
+            valid = user.check_password(password) if user else verify_missing(password)
+        except HashingBusy:
+            return _hashing_busy('login.html')
+        
+        if valid:
+            db.session.commit()  # guarda el hash rehecho si cambió PASSWORD_HASH_METHOD
             login_user(user)
             flash('Logged in successfully!', 'success')
             return redirect(url_for('notes.notes_table'))
@@ -35,18 +54,31 @@ def register():
             flash('Passwords do not match', 'error')
             return redirect(url_for('auth.register'))
         
-        if User.query.filter_by(username=username).first():
-            flash('Username already exists', 'error')
-            return redirect(url_for('auth.register'))
-        
-        if User.query.filter_by(email=email).first():
-            flash('Email already exists', 'error')
+        taken = db.session.query(User.username, User.email)\
+            .filter(or_(User.username == username, User.email == email)).all()
+        if taken:
+            if any(row.username == username for row in taken):
+                flash('Username already exists', 'error')
+            else:
+                flash('Email already exists', 'error')
             return redirect(url_for('auth.register'))
         
         new_user = User(username=username, email=email)
-        new_user.set_password(password)
-        db.session.add(new_user)
-        db.session.commit()
+        try:
+            new_user.set_password(password)
+        except HashingBusy:
+            return _hashing_busy('register.html')
+        
+        # Las restricciones unique resuelven la carrera entre dos registros simultáneos
+        try:
+            db.session.add(new_user)
+            db.session.flush()
+            db.session.add(UserStats(user_id=new_user.id))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash('Username or email already exists', 'error')
+            return redirect(url_for('auth.register'))
         
         flash('Registration successful! Please log in.', 'success')
         return redirect(url_for('auth.login'))
@@ -1,20 +1,101 @@
-from flask import Blueprint, render_template, jsonify
+from flask import Blueprint, render_template, jsonify, request, Response, stream_with_context, \
+    redirect, url_for, flash
 from flask_login import login_required, current_user
-from models import Note, Task
+from datetime import datetime, timedelta, timezone
+from extensions import db
+from models import User, Note, Task, TaskOccurrence
+from recurrence import expand, local_now
+from changelog import latest_change, is_expired
+import ics
 
 calendar_bp = Blueprint('calendar', __name__)
 
+TASK_COLORS = {'pending': '#ffcc00', 'overdue': '#dc3545', 'completed': '#00cc66', 'skipped': '#adb5bd'}
+
 @calendar_bp.route('/calendar')
 @login_required
 def view_calendar():
-    return render_template('calendar.html')
+    feed_url = None
+    if current_user.calendar_token:
+        feed_url = url_for('calendar.ics_feed', token=current_user.calendar_token, _external=True)
+    return render_template('calendar.html', feed_url=feed_url)
+
+@calendar_bp.route('/calendar/feed-token', methods=['POST'])
+@login_required
+def regenerate_feed_token():
+    # A new token invalidates the previous subscription URL
+    current_user.calendar_token = ics.generate_token()
+    db.session.commit()
+    flash('Calendar subscription URL generated', 'success')
+    return redirect(url_for('calendar.view_calendar'))
+
+@calendar_bp.route('/calendar/<token>.ics')
+def ics_feed(token):
+    """
+    Subscription feed, authenticated by the secret token. The change-log
+    sequence is the ETag and X-Sync-Token; pass it back as ?since= to get
+    only what changed.
+    """
+    user = User.query.filter_by(calendar_token=token).first_or_404()
+    since = request.args.get('since', type=int)
+    if since is not None and is_expired(user.id, since):
+        return jsonify({'error': 'Sync token expired, fetch the full feed'}), 410
+    sequence, changed_at = latest_change(user.id)
+    
+    response = Response(stream_with_context(ics.feed(user, request.host, since)),
+                        mimetype='text/calendar')
+    response.set_etag(f'{sequence}' if since is None else f'{sequence}-{since}')
+    if changed_at is not None:
+        response.last_modified = changed_at
+    response.headers['X-Sync-Token'] = str(sequence)
+    response.headers['Content-Disposition'] = 'inline; filename="calendar.ics"'
+    response.cache_control.private = True
+    response.cache_control.max_age = 300
+    # 304 without running the generator when the client is up to date
+    return response.make_conditional(request)
+
+def _window_arg(name, default):
+    """
+    FullCalendar sends ?start=&end= as ISO dates, possibly with an offset.
+    Returns (local, utc) naive bounds: task due dates are local wall-clock
+    times (recurrence.py), note timestamps are UTC.
+    """
+    try:
+        parsed = datetime.fromisoformat(request.args.get(name, '').replace('Z', '+00:00'))
+    except ValueError:
+        parsed = default
+    # Naive values are taken as server local time by astimezone()
+    return parsed.replace(tzinfo=None), parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _task_event(task, start, status, occurrence=None):
+    return {
+        'id': f'task-{task.id}' if occurrence is None else f'task-{task.id}-{occurrence:%Y%m%dT%H%M%S}',
+        'title': f'{"🔁" if task.recurrence_rule else "✅"} {task.title}',
+        'start': start.isoformat(),
+        'color': TASK_COLORS.get(status, '#ffcc00'),
+        'extendedProps': {'taskId': task.id, 'occurrence': occurrence.isoformat() if occurrence else None,
+                          'status': status}
+    }
 
 @calendar_bp.route('/api/calendar-events')
 @login_required
 def get_events():
-    # Fetch notes and tasks to show on calendar
-    notes = Note.query.filter_by(user_id=current_user.id).all()
-    tasks = Task.query.filter_by(user_id=current_user.id).all()
+    # Only the visible window: one-off items are filtered in SQL and
+    # recurring tasks are expanded lazily (recurrence.py)
+    now = local_now()
+    start, start_utc = _window_arg('start', now - timedelta(days=31))
+    end, end_utc = _window_arg('end', now + timedelta(days=62))
+    if end <= start:
+        return jsonify({'error': 'end must be after start'}), 400
+    
+    notes = Note.query.filter(Note.user_id == current_user.id,
+                              Note.created_at >= start_utc, Note.created_at < end_utc).all()
+    tasks = Task.query.filter(Task.user_id == current_user.id,
+                              Task.recurrence_rule.is_(None),
+                              Task.due_date >= start, Task.due_date < end).all()
+    recurring = Task.query.filter(Task.user_id == current_user.id,
+                                  Task.recurrence_rule.isnot(None),
+                                  Task.due_date < end).all()
     
     events = []
     
@@ -28,12 +109,24 @@ def get_events():
         })
         
     for task in tasks:
-        if task.due_date:
-            events.append({
-                'id': f'task-{task.id}',
-                'title': f'✅ {task.title}',
-                'start': task.due_date.isoformat(),
-                'color': '#ffcc00' if task.status == 'pending' else '#00cc66'
-            })
+        events.append(_task_event(task, task.due_date, task.status))
+    
+    if recurring:
+        # Completed/skipped occurrences are stored sparsely: one query for the window
+        exceptions = {(row.task_id, row.occurrence): row.status for row in TaskOccurrence.query.filter(
+            TaskOccurrence.task_id.in_([task.id for task in recurring]),
+            TaskOccurrence.occurrence >= start,
+            TaskOccurrence.occurrence < end
+        )}
+        for task in recurring:
+            try:
+                occurrences = expand(task.recurrence_rule, task.due_date, start, end)
+            except ValueError:
+                continue
+            for occurrence in occurrences:
+                status = exceptions.get((task.id, occurrence))
+                if status is None:
+                    status = 'overdue' if occurrence < now else 'pending'
+                events.append(_task_event(task, occurrence, status, occurrence))
             
     return jsonify(events)
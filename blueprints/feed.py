@@ -1,7 +1,10 @@
 from flask import Blueprint, render_template, request, jsonify
+from markupsafe import Markup
 from flask_login import login_required, current_user
 from models import Note, Category, User
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, selectinload
+from cache import page_cache
+from sharing import shared_with_me_query
 
 feed_bp = Blueprint('feed', __name__)
 
@@ -23,16 +26,44 @@ def discovery_feed():
 @feed_bp.route('/discover')
 @login_required
 def discover_feed():
-    # Show all public notes for discovery
-    notes = Note.query.filter_by(is_public=True)\
-        .options(joinedload(Note.author), joinedload(Note.category))\
-        .order_by(Note.created_at.desc())\
-        .limit(20).all()
-        
-    return render_template('discover.html', notes=notes)
+    # The public grid is the same for every user: serve it from the page cache
+    grid_html = page_cache.get(('discover',))
+    if grid_html is None:
+        notes = Note.query.filter_by(is_public=True)\
+            .options(joinedload(Note.author), joinedload(Note.category), selectinload(Note.likes))\
+            .order_by(Note.created_at.desc())\
+            .limit(20).all()
+        grid_html = Markup(render_template('partials/discover_grid.html', notes=notes))
+        page_cache.set(('discover',), grid_html)
+    
+    return render_template('discover.html', grid_html=grid_html)
 
 @feed_bp.route('/shared-with-me')
 @login_required
 def shared_notes():
-    notes = current_user.shared_with_me.all()
-    return render_template('shared.html', notes=notes)
+    page = request.args.get('page', 1, type=int)
+    format_type = request.args.get('format', 'html')
+    per_page = 12
+    
+    shared = shared_with_me_query(current_user.id)\
+        .options(joinedload(Note.author))\
+        .paginate(page=page, per_page=per_page, error_out=False)
+    
+    if format_type == 'json':
+        return jsonify({
+            'items': [{
+                'id': note.id,
+                'title': note.title,
+                'content_preview': note.content[:150] + ('...' if len(note.content) > 150 else ''),
+                'author': {'id': note.author.id, 'username': note.author.username},
+                'shared_at': shared_at.isoformat() if shared_at else None
+            } for note, shared_at in shared.items],
+            'total': shared.total,
+            'page': shared.page,
+            'pages': shared.pages,
+            'has_prev': shared.has_prev,
+            'has_next': shared.has_next
+        })
+    
+    notes = [note for note, shared_at in shared.items]
+    return render_template('shared.html', notes=notes, pagination=shared)
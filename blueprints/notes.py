@@ -1,15 +1,255 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, jsonify, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, jsonify, current_app, abort
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 import os
+import hashlib
 from datetime import datetime
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, selectinload
 from extensions import db
-from models import User, Category, Note, Attachment, Like
+from sqlalchemy import func, select, exists, case
+from models import User, Category, Note, Attachment, Like, Comment, UserStats, NoteRevision, NoteDailyStats, note_sharing
 from helpers import categories_to_dict, category_to_dict, allowed_file
+from events import publish, author_channel, note_channel, user_channel
+from file_cleaner import schedule_removal
+from sharing import can_access_note, can_access_attachment, share_notes
+from cache import note_dict
+from tags import set_note_tags, remove_note_tags, tagged_notes_query, note_tags_map, parse_tags, autocomplete
+from revisions import record_revision, get_revision_content, apply_delta, merge_lines
+from rendering import rendered_html
+from changelog import UPDATE, DELETE, record_changes, latest_change, changes_after, is_expired
 
 notes_bp = Blueprint('notes', __name__)
 
+BULK_ACTIONS = ('delete', 'move', 'set_public', 'share')
+PATCH_FIELDS = ('title', 'content', 'content_delta', 'category_id', 'is_public', 'tags')
+
+# Sparse fieldsets for the notes JSON API (?fields=a,b&include=category,attachments)
+PREVIEW_LENGTH = 150
+NOTE_COLUMNS = {
+    'id': Note.id,
+    'title': Note.title,
+    'content': Note.content,
+    'created_at': Note.created_at,
+    'updated_at': Note.updated_at,
+    'category_id': Note.category_id,
+    'user_id': Note.user_id,
+    'is_public': Note.is_public,
+    'view_count': Note.view_count,
+}
+NOTE_COUNTS = {
+    'attachments_count': (Attachment.id, Attachment.note_id),
+    'likes_count': (Like.id, Like.note_id),
+    'comments_count': (Comment.id, Comment.note_id),
+}
+NOTE_FIELDS = tuple(NOTE_COLUMNS) + ('content_preview',) + tuple(NOTE_COUNTS)
+NOTE_RELATIONS = ('category', 'attachments', 'tags')
+DEFAULT_LIST_FIELDS = ('id', 'title', 'content', 'content_preview', 'created_at', 'updated_at',
+                       'category_id', 'attachments_count', 'likes_count', 'user_id')
+
+# Offline sync (/api/notes/sync): full records for the local store
+SYNC_FIELDS = DEFAULT_LIST_FIELDS + ('is_public', 'comments_count')
+SYNC_MUTABLE_FIELDS = ('title', 'content', 'category_id', 'is_public', 'tags')
+SYNC_BATCH_SIZE = 200
+SYNC_MAX_MUTATIONS = 100
+
+
+def _requested_fieldset(default_fields, default_include):
+    """Parse ?fields= and ?include=, falling back to the given defaults"""
+    fields_arg = request.args.get('fields')
+    include_arg = request.args.get('include')
+    
+    if fields_arg:
+        fields = [name for name in fields_arg.split(',') if name in NOTE_FIELDS]
+    else:
+        fields = list(default_fields)
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    
+    if include_arg is not None:
+        include = [name for name in include_arg.split(',') if name in NOTE_RELATIONS]
+    else:
+        include = [] if fields_arg else list(default_include)
+    return fields, include
+
+
+def _fieldset_columns(fields, include):
+    """SQL columns for a fieldset: only what is asked for is selected"""
+    columns = []
+    for name in fields:
+        if name in NOTE_COLUMNS:
+            columns.append(NOTE_COLUMNS[name].label(name))
+        elif name == 'content_preview':
+            columns.append(func.substr(Note.content, 1, PREVIEW_LENGTH).label('_content_head'))
+            columns.append(func.length(Note.content).label('_content_length'))
+        elif name in NOTE_COUNTS:
+            counted, note_fk = NOTE_COUNTS[name]
+            columns.append(select(func.count(counted)).where(note_fk == Note.id)
+                           .correlate(Note).scalar_subquery().label(name))
+    if 'category' in include and 'category_id' not in fields:
+        columns.append(Note.category_id.label('_category_id'))
+    return columns
+
+
+def _serialize_rows(rows, fields, include):
+    rows = [row._mapping for row in rows]
+    
+    categories = {}
+    if 'category' in include:
+        category_ids = {row.get('category_id', row.get('_category_id')) for row in rows}
+        categories = {category.id: category_to_dict(category)
+                      for category in Category.query.filter(Category.id.in_(category_ids))}
+    
+    attachments = {}
+    if 'attachments' in include and rows:
+        for attachment in Attachment.query.filter(Attachment.note_id.in_([row['id'] for row in rows])):
+            attachments.setdefault(attachment.note_id, []).append(
+                {'id': attachment.id, 'filename': attachment.filename, 'file_type': attachment.file_type})
+    
+    tags = note_tags_map([row['id'] for row in rows]) if 'tags' in include and rows else {}
+    
+    items = []
+    for row in rows:
+        item = {}
+        for name in fields:
+            if name == 'content_preview':
+                truncated = (row['_content_length'] or 0) > PREVIEW_LENGTH
+                item[name] = (row['_content_head'] or '') + ('...' if truncated else '')
+            elif isinstance(row[name], datetime):
+                item[name] = row[name].isoformat()
+            else:
+                item[name] = row[name]
+        if 'category' in include:
+            item['category'] = categories.get(row.get('category_id', row.get('_category_id')))
+        if 'attachments' in include:
+            item['attachments'] = attachments.get(row['id'], [])
+        if 'tags' in include:
+            item['tags'] = tags.get(row['id'], [])
+        items.append(item)
+    return items
+
+
+def _list_filters():
+    """Current user's notes matching ?search= and ?tags= (shared by the list and its facets)"""
+    filters = [Note.user_id == current_user.id]
+    search = request.args.get('search')
+    if search:
+        filters.append(db.or_(
+            Note.title.ilike(f'%{search}%'),
+            Note.content.ilike(f'%{search}%')
+        ))
+    tags = parse_tags(request.args.get('tags', ''))
+    if tags:
+        filters.append(Note.id.in_(tagged_notes_query(current_user.id, tags,
+                                                       request.args.get('tag_match', 'all'))))
+    return filters
+
+
+def _facet_filters():
+    """Selected facet values: ?category=, ?visibility=public|private, ?attachments=yes|no"""
+    filters = []
+    category_id = request.args.get('category')
+    if category_id:
+        filters.append(Note.category_id == category_id)
+    visibility = request.args.get('visibility')
+    if visibility in ('public', 'private'):
+        filters.append(Note.is_public == (visibility == 'public'))
+    attachments = request.args.get('attachments')
+    if attachments in ('yes', 'no'):
+        has_attachments = exists().where(Attachment.note_id == Note.id)
+        filters.append(has_attachments if attachments == 'yes' else ~has_attachments)
+    return filters
+
+
+def note_facets(filters):
+    """
+    Counts per category, visibility and attachments for the notes matching
+    filters, from a single grouped aggregate query
+    """
+    has_attachments = case((exists().where(Attachment.note_id == Note.id), 1), else_=0)
+    rows = db.session.query(Note.category_id, Note.is_public, has_attachments, func.count(Note.id))\
+        .filter(*filters)\
+        .group_by(Note.category_id, Note.is_public, has_attachments).all()
+    
+    facets = {
+        'total': 0,
+        'category': {},
+        'visibility': {'public': 0, 'private': 0},
+        'attachments': {'yes': 0, 'no': 0}
+    }
+    for category_id, is_public, with_attachments, count in rows:
+        facets['total'] += count
+        facets['category'][category_id] = facets['category'].get(category_id, 0) + count
+        facets['visibility']['public' if is_public else 'private'] += count
+        facets['attachments']['yes' if with_attachments else 'no'] += count
+    return facets
+
+
+def _notes_json_page(page, per_page):
+    """Paginated JSON list of the current user's notes with a sparse fieldset"""
+    fields, include = _requested_fieldset(DEFAULT_LIST_FIELDS, NOTE_RELATIONS)
+    list_filters = _list_filters()
+    query = db.session.query(*_fieldset_columns(fields, include))\
+        .select_from(Note).filter(*list_filters, *_facet_filters())
+    
+    paginated = query.order_by(Note.updated_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    data = {
+        'items': _serialize_rows(paginated.items, fields, include),
+        'total': paginated.total,
+        'page': paginated.page,
+        'pages': paginated.pages,
+        'has_prev': paginated.has_prev,
+        'has_next': paginated.has_next,
+        'prev_num': paginated.prev_num,
+        'next_num': paginated.next_num
+    }
+    # Facet counts ignore the selected facets so every option keeps its count
+    if request.args.get('facets'):
+        data['facets'] = note_facets(list_filters)
+    return jsonify(data)
+
+
+def _delete_notes(owner_id, note_ids):
+    """
+    Set-based delete of notes and their dependent rows in the current
+    transaction. Returns the attachment paths to remove after commit.
+    """
+    note_ids = list(note_ids)
+    file_paths = [row[0] for row in db.session.query(Attachment.file_path)
+                  .filter(Attachment.note_id.in_(note_ids))]
+    
+    # Counters: owner's notes and likes, plus every commenter's comments
+    public_count = Note.query.filter(Note.id.in_(note_ids), Note.is_public == True).count()
+    likes_count = Like.query.filter(Like.note_id.in_(note_ids)).count()
+    commenters = db.session.query(Comment.user_id, func.count(Comment.id))\
+        .filter(Comment.note_id.in_(note_ids)).group_by(Comment.user_id).all()
+    
+    # The bulk deletes skip the session events: log the removed comments and
+    # likes for everyone whose change log had them (their authors and the owner)
+    for model, entity in ((Comment, 'comment'), (Like, 'like')):
+        by_user = {}
+        for row_id, user_id in db.session.query(model.id, model.user_id).filter(model.note_id.in_(note_ids)):
+            for audience in {user_id, owner_id}:
+                by_user.setdefault(audience, []).append(row_id)
+        for user_id, ids in by_user.items():
+            record_changes(user_id, entity, ids, DELETE)
+    
+    Attachment.query.filter(Attachment.note_id.in_(note_ids)).delete(synchronize_session=False)
+    Like.query.filter(Like.note_id.in_(note_ids)).delete(synchronize_session=False)
+    Comment.query.filter(Comment.note_id.in_(note_ids)).delete(synchronize_session=False)
+    remove_note_tags(note_ids)
+    NoteRevision.query.filter(NoteRevision.note_id.in_(note_ids)).delete(synchronize_session=False)
+    NoteDailyStats.query.filter(NoteDailyStats.note_id.in_(note_ids)).delete(synchronize_session=False)
+    db.session.execute(note_sharing.delete().where(note_sharing.c.note_id.in_(note_ids)))
+    Note.query.filter(Note.id.in_(note_ids)).delete(synchronize_session=False)
+    record_changes(owner_id, 'note', note_ids, DELETE)
+    
+    UserStats.bump(owner_id, note_count=-len(note_ids), public_note_count=-public_count,
+                   likes_received=-likes_count)
+    for user_id, count in commenters:
+        UserStats.bump(user_id, comments_made=-count)
+    
+    return file_paths
+
 
 @notes_bp.route('/notes/table')
 @login_required
@@ -18,74 +258,32 @@ def notes_table():
     format_type = request.args.get('format', 'html')
     per_page = request.args.get('per_page', 25, type=int)
     
+    # JSON response for AJAX (only the requested fields are selected)
+    if format_type == 'json':
+        return _notes_json_page(page, per_page)
+    
     notes_query = Note.query.filter_by(user_id=current_user.id)\
         .options(
             joinedload(Note.category),
             joinedload(Note.attachments),
-            joinedload(Note.likes)
-        )
+            joinedload(Note.likes),
+            selectinload(Note.tags)
+        )\
+        .order_by(Note.updated_at.desc())
     
-    # Apply filters from URL if AJAX request
-    if format_type == 'json':
-        category_id = request.args.get('category')
-        search = request.args.get('search')
-        
-        if category_id:
-            notes_query = notes_query.filter_by(category_id=category_id)
-        
-        if search:
-            notes_query = notes_query.filter(
-                db.or_(
-                    Note.title.ilike(f'%{search}%'),
-                    Note.content.ilike(f'%{search}%')
-                )
-            )
-    
-    notes_query = notes_query.order_by(Note.updated_at.desc())
-    notes_paginated = notes_query.paginate(page=page, per_page=per_page, error_out=False)
+    # Enlaces /notes/table?tags=x desde las etiquetas de una nota
+    list_filters = _list_filters()
+    notes_query = notes_query.filter(*list_filters)
     
-    # Pre-cálculos
-    for note in notes_paginated.items:
-        note.content_preview = note.content[:150] + ('...' if len(note.content) > 150 else '')
-        note.attachments_count = len(note.attachments)
-        note.likes_count = len(note.likes)
+    notes_paginated = notes_query.paginate(page=page, per_page=per_page, error_out=False)
     
     # Usar el helper
     categories_data = categories_to_dict()
-    
-    # JSON response for AJAX
-    if format_type == 'json':
-        notes_data = []
-        for note in notes_paginated.items:
-            notes_data.append({
-                'id': note.id,
-                'title': note.title,
-                'content': note.content,
-                'content_preview': note.content_preview,
-                'created_at': note.created_at.isoformat(),
-                'updated_at': note.updated_at.isoformat(),
-                'category_id': note.category_id,
-                'category': category_to_dict(note.category),
-                'attachments_count': note.attachments_count,
-                'attachments': [{'id': a.id, 'filename': a.filename, 'file_type': a.file_type} for a in note.attachments],
-                'likes_count': note.likes_count,
-                'user_id': note.user_id
-            })
-        
-        return jsonify({
-            'items': notes_data,
-            'total': notes_paginated.total,
-            'page': notes_paginated.page,
-            'pages': notes_paginated.pages,
-            'has_prev': notes_paginated.has_prev,
-            'has_next': notes_paginated.has_next,
-            'prev_num': notes_paginated.prev_num,
-            'next_num': notes_paginated.next_num
-        })
+    facets = note_facets(list_filters)
     
     # Convertir notas paginadas a diccionario
     notes_data = {
-        'items': [note.to_dict() for note in notes_paginated.items],
+        'items': [note_dict(note) for note in notes_paginated.items],
         'total': notes_paginated.total,
         'page': notes_paginated.page,
         'pages': notes_paginated.pages,
@@ -95,7 +293,7 @@ def notes_table():
         'next_num': notes_paginated.next_num
     }
     
-    return render_template('notes_table.html', notes=notes_data, categories=categories_data)
+    return render_template('notes_table.html', notes=notes_data, categories=categories_data, facets=facets)
 
 @notes_bp.route('/notes/keep')
 @login_required
@@ -104,58 +302,27 @@ def notes_keep():
     format_type = request.args.get('format', 'html')
     per_page = 12
     
+    # Si es una petición JSON (para AJAX/Vue)
+    if format_type == 'json':
+        return _notes_json_page(page, per_page)
+    
     notes_query = Note.query.filter_by(user_id=current_user.id)\
         .options(
             joinedload(Note.category),
             joinedload(Note.attachments),
-            joinedload(Note.likes)
+            joinedload(Note.likes),
+            selectinload(Note.tags)
         )\
         .order_by(Note.updated_at.desc())
     
     notes_paginated = notes_query.paginate(page=page, per_page=per_page, error_out=False)
     
-    # Pre-cálculos
-    for note in notes_paginated.items:
-        note.content_preview = note.content[:150] + ('...' if len(note.content) > 150 else '')
-        note.attachments_count = len(note.attachments)
-        note.likes_count = len(note.likes)
-    
     # Usar el helper
     categories_data = categories_to_dict()
     
-    # Si es una petición JSON (para AJAX/Vue)
-    if format_type == 'json':
-        notes_data = []
-        for note in notes_paginated.items:
-            notes_data.append({
-                'id': note.id,
-                'title': note.title,
-                'content': note.content,
-                'content_preview': note.content_preview,
-                'created_at': note.created_at.isoformat(),
-                'updated_at': note.updated_at.isoformat(),
-                'category_id': note.category_id,
-                'category': category_to_dict(note.category),
-                'attachments_count': note.attachments_count,
-                'attachments': [{'id': a.id, 'filename': a.filename, 'file_type': a.file_type} for a in note.attachments],
-                'likes_count': note.likes_count,
-                'user_id': note.user_id
-            })
-        
-        return jsonify({
-            'items': notes_data,
-            'total': notes_paginated.total,
-            'page': notes_paginated.page,
-            'pages': notes_paginated.pages,
-            'has_prev': notes_paginated.has_prev,
-            'has_next': notes_paginated.has_next,
-            'prev_num': notes_paginated.prev_num,
-            'next_num': notes_paginated.next_num
-        })
-    
     # Convertir notas paginadas a diccionario
     notes_data = {
-        'items': [note.to_dict() for note in notes_paginated.items],
+        'items': [note_dict(note) for note in notes_paginated.items],
         'total': notes_paginated.total,
         'page': notes_paginated.page,
         'pages': notes_paginated.pages,
@@ -185,7 +352,11 @@ def create_note():
             is_public=is_public
         )
         db.session.add(new_note)
+        set_note_tags(new_note, request.form.get('tags', ''))
+        UserStats.bump(current_user.id, note_count=1, public_note_count=1 if is_public else 0)
         db.session.commit()
+        record_revision(new_note, current_user.id)
+        rendered_html(new_note.content)
         
         # Handle file uploads
         if 'attachments' in request.files:
@@ -219,6 +390,15 @@ def create_note():
                 flash('Some files were not uploaded because their extension is not allowed.', 'warning')
         
         db.session.commit()
+        
+        # New public notes reach followers' feeds through the author channel
+        if new_note.is_public:
+            publish(author_channel(current_user.id), 'note', {
+                'note_id': new_note.id,
+                'title': new_note.title,
+                'author': current_user.username
+            })
+        
         flash('Note created successfully!', 'success')
         return redirect(url_for('notes.notes_table'))
     
@@ -234,10 +414,18 @@ def edit_note(note_id):
         return redirect(url_for('notes.notes_table'))
     
     if request.method == 'POST':
+        previous = (note.title, note.content)
         note.title = request.form['title']
         note.content = request.form['content']
         note.category_id = request.form['category_id']
-        note.is_public = 'is_public' in request.form
+        
+        is_public = 'is_public' in request.form
+        if is_public != bool(note.is_public):
+            UserStats.bump(note.user_id, public_note_count=1 if is_public else -1)
+        note.is_public = is_public
+        set_note_tags(note, request.form.get('tags', ''))
+        record_revision(note, current_user.id, previous)
+        rendered_html(note.content)
         
         # Handle new file uploads
         if 'attachments' in request.files:
@@ -271,28 +459,40 @@ def edit_note(note_id):
                 flash('Some files were not uploaded because their extension is not allowed.', 'warning')
         
         db.session.commit()
+        
+        publish([author_channel(note.user_id)] if note.is_public else [], 'note_updated', {
+            'note_id': note.id
+        })
+        
         flash('Note updated successfully!', 'success')
         return redirect(url_for('notes.view_note', note_id=note.id))
     
     categories = Category.query.all()
-    return render_template('edit_note.html', note=note, categories=categories)
+    return render_template('edit_note.html', note=note, categories=categories, version=note_version(note.id, note.updated_at))
 
 @notes_bp.route('/notes/<int:note_id>')
 @login_required
 def view_note(note_id):
     note = Note.query.get_or_404(note_id)
     
-    # Allow viewing if it's the user's own note or if it's public
-    if note.author != current_user and not note.is_public:
+    # Allow viewing if it's the user's own note, public or shared with the user
+    if not can_access_note(note.id):
         flash('You do not have permission to view this note.', 'error')
         return redirect(url_for('notes.notes_table'))
     
+    # Markdown -> HTML once per content, stored by content hash
+    content_html = rendered_html(note.content)
+    
     # Increment view count if it's not the author viewing
     if note.author != current_user:
-        note.view_count += 1
-        db.session.commit()
+        # Keep updated_at (ETag, fragment keys): a view is not an edit
+        Note.query.filter_by(id=note.id).update(
+            {Note.view_count: Note.view_count + 1, Note.updated_at: Note.updated_at},
+            synchronize_session='evaluate')
+        NoteDailyStats.bump(note.id, note.user_id, datetime.utcnow().date(), views=1)
+    db.session.commit()
     
-    return render_template('view_note.html', note=note)
+    return render_template('view_note.html', note=note, content_html=content_html)
 
 @notes_bp.route('/notes/<int:note_id>/delete', methods=['POST'])
 @login_required
@@ -302,26 +502,546 @@ def delete_note(note_id):
         flash('You do not have permission to delete this note.', 'error')
         return redirect(url_for('notes.notes_table'))
     
-    # Delete associated files
-    for attachment in note.attachments:
-        try:
-            if os.path.exists(attachment.file_path):
-                os.remove(attachment.file_path)
-        except Exception as e:
-            current_app.logger.error(f'Error deleting file {attachment.file_path}: {e}')
-    
-    db.session.delete(note)
+    note_id = note.id
+    file_paths = _delete_notes(note.user_id, [note_id])
     db.session.commit()
+    
+    publish([], 'note_deleted', {'note_id': note_id})
+    
+    # Associated files are removed in the background
+    schedule_removal(file_paths)
+    
     flash('Note deleted successfully!', 'success')
     return redirect(url_for('notes.notes_table'))
 
+@notes_bp.route('/api/notes/<int:note_id>')
+@login_required
+def note_detail(note_id):
+    """Full note (or a sparse fieldset of it), loaded lazily when a card is opened"""
+    if not can_access_note(note_id):
+        exists = db.session.query(Note.id).filter_by(id=note_id).first()
+        return jsonify({'error': 'Note not found' if exists is None else 'Forbidden'}), 404 if exists is None else 403
+    
+    fields, include = _requested_fieldset(NOTE_FIELDS, NOTE_RELATIONS)
+    row = db.session.query(*_fieldset_columns(fields, include), Note.updated_at.label('_updated_at'))\
+        .select_from(Note).filter(Note.id == note_id).first()
+    response = jsonify(_serialize_rows([row], fields, include)[0])
+    response.set_etag(note_version(note_id, row._updated_at))
+    return response
+
+def note_version(note_id, updated_at):
+    """Version token (ETag) of a note: changes on every saved write"""
+    stamp = updated_at.isoformat() if updated_at else ''
+    return hashlib.md5(f'{note_id}:{stamp}'.encode()).hexdigest()[:16]
+
+def _field_type_error(data):
+    """Error message if a note field in data has the wrong JSON type, else None"""
+    for field in ('title', 'content'):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return f'{field} must be a string'
+    category_id = data.get('category_id')
+    if 'category_id' in data and (isinstance(category_id, bool) or not isinstance(category_id, int)):
+        return 'category_id must be an integer'
+    if 'is_public' in data and not isinstance(data['is_public'], bool):
+        return 'is_public must be a boolean'
+    tags = data.get('tags')
+    if tags is not None and not isinstance(tags, str) and \
+            not (isinstance(tags, list) and all(isinstance(tag, str) for tag in tags)):
+        return 'tags must be a string or a list of strings'
+    return None
+
+def _apply_note_changes(note, data):
+    """
+    Write the PATCH_FIELDS present in data to the note (no commit).
+    Returns (changed, error message or None); nothing is written when a
+    field has the wrong type.
+    """
+    changed = False
+    error = _field_type_error(data)
+    if error:
+        return changed, error
+    
+    if 'title' in data:
+        title = (data['title'] or '').strip()
+        if not title or len(title) > 200:
+            return changed, 'Invalid title'
+        changed |= title != note.title
+        note.title = title
+    
+    content = data.get('content')
+    if 'content_delta' in data:
+        try:
+            content = apply_delta(note.content, data['content_delta'])
+        except (TypeError, IndexError, ValueError):
+            return changed, 'Invalid content_delta'
+    if content is not None:
+        changed |= content != note.content
+        note.content = content
+    
+    if 'category_id' in data and data['category_id'] != note.category_id:
+        if db.session.get(Category, data['category_id']) is None:
+            return changed, 'Invalid category'
+        note.category_id = data['category_id']
+        changed = True
+    
+    if 'is_public' in data and bool(data['is_public']) != bool(note.is_public):
+        note.is_public = bool(data['is_public'])
+        if note.id is not None:
+            UserStats.bump(note.user_id, public_note_count=1 if note.is_public else -1)
+        changed = True
+    
+    if 'tags' in data:
+        changed |= set_note_tags(note, data['tags'])
+    
+    return changed, None
+
+@notes_bp.route('/api/notes/<int:note_id>', methods=['PATCH'])
+@login_required
+def patch_note(note_id):
+    """
+    Partial update for autosave. Only the fields sent are written; content
+    can also come as `content_delta` against the version in If-Match. A stale
+    If-Match gets a 409 with the current note so the client can merge.
+    """
+    note = Note.query.get_or_404(note_id)
+    if note.user_id != current_user.id:
+        return jsonify({'error': 'You do not have permission to edit this note'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    unknown = sorted(set(data) - set(PATCH_FIELDS))
+    if unknown:
+        return jsonify({'error': f'Unknown fields: {", ".join(unknown)}'}), 400
+    
+    version = note_version(note.id, note.updated_at)
+    # Weak comparison: compression.py marks the ETag of gzip/br responses as W/
+    if request.if_match and not request.if_match.contains_weak(version):
+        return jsonify({
+            'error': 'The note was modified since your last save',
+            'version': version,
+            'note': {'title': note.title, 'content': note.content,
+                     'updated_at': note.updated_at.isoformat() if note.updated_at else None}
+        }), 409
+    if 'content_delta' in data and not request.if_match:
+        return jsonify({'error': 'content_delta requires an If-Match version'}), 428
+    
+    previous = (note.title, note.content)
+    changed, error = _apply_note_changes(note, data)
+    if error:
+        db.session.rollback()
+        return jsonify({'error': error}), 400
+    
+    # Nothing changed: no write, same version
+    if not changed:
+        db.session.rollback()
+        response = jsonify({'saved': False, 'version': version})
+        response.set_etag(version)
+        return response
+    
+    note.updated_at = datetime.utcnow()
+    revision = record_revision(note, current_user.id, previous,
+                               coalesce_seconds=current_app.config.get('AUTOSAVE_COALESCE_SECONDS', 60))
+    new_revision = revision is not None and revision.id is None
+    db.session.commit()
+    
+    # Keystroke saves folded into the same revision don't notify anyone
+    if new_revision:
+        publish([author_channel(note.user_id)] if note.is_public else [], 'note_updated', {
+            'note_id': note.id
+        })
+    
+    version = note_version(note.id, note.updated_at)
+    response = jsonify({
+        'saved': True,
+        'version': version,
+        'updated_at': note.updated_at.isoformat(),
+        'revision': revision.number if revision else None
+    })
+    response.set_etag(version)
+    return response
+
+def _sync_records(note_query):
+    rows = note_query.with_entities(*_fieldset_columns(SYNC_FIELDS, NOTE_RELATIONS)).all()
+    return _serialize_rows(rows, SYNC_FIELDS, NOTE_RELATIONS)
+
+@notes_bp.route('/api/notes/sync')
+@login_required
+def sync_pull():
+    """
+    Pull side of the offline sync protocol. Without ?cursor= it pages
+    through a snapshot of the user's notes (?after_id=); keep the cursor of
+    the first page. With ?cursor= only the notes changed since then come
+    back, plus the ids of deleted ones. 410 when the cursor predates the
+    change-log retention: drop the local store and take a new snapshot.
+    """
+    limit = min(max(request.args.get('limit', SYNC_BATCH_SIZE, type=int), 1), SYNC_BATCH_SIZE)
+    cursor = request.args.get('cursor', type=int)
+    own_notes = Note.query.filter(Note.user_id == current_user.id)
+    
+    if cursor is None:
+        # Taken before reading: anything written meanwhile comes in the next delta
+        sequence, _ = latest_change(current_user.id)
+        after_id = request.args.get('after_id', 0, type=int)
+        notes = _sync_records(own_notes.filter(Note.id > after_id).order_by(Note.id).limit(limit + 1))
+        has_more = len(notes) > limit
+        notes = notes[:limit]
+        return jsonify({
+            'snapshot': True,
+            'notes': notes,
+            'deleted': [],
+            'cursor': sequence,
+            'after_id': notes[-1]['id'] if has_more else None,
+            'has_more': has_more
+        })
+    
+    if is_expired(current_user.id, cursor):
+        return jsonify({'error': 'Cursor expired, full resync required', 'resync': True}), 410
+    
+    entries = changes_after(current_user.id, cursor, limit + 1, ['note'])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    changed_ids = {entry.entity_id for entry in entries}
+    notes = _sync_records(own_notes.filter(Note.id.in_(changed_ids))) if changed_ids else []
+    return jsonify({
+        'snapshot': False,
+        'notes': notes,
+        'deleted': sorted(changed_ids - {note['id'] for note in notes}),
+        'cursor': entries[-1].id if entries else cursor,
+        'has_more': has_more
+    })
+
+def _sync_current(note):
+    return {
+        'title': note.title,
+        'content': note.content,
+        'category_id': note.category_id,
+        'is_public': bool(note.is_public),
+        'tags': [tag.name for tag in note.tags]
+    }
+
+def _merge_changes(note, base, changes):
+    """
+    Per-field conflict resolution for a queued update. A field is applied
+    when the server still has the value the client started from (base) or
+    already has the same value. When both sides changed it, content is
+    merged by lines if the edits don't overlap; otherwise the server value
+    wins and is reported back as a conflict.
+    Returns (fields to apply, {field: server value}, merged field names).
+    """
+    current = _sync_current(note)
+    apply, conflicts, merged = {}, {}, []
+    for field, value in changes.items():
+        server = current[field]
+        if field == 'tags':
+            value, server = parse_tags(value), sorted(server)
+            known = sorted(parse_tags(base[field])) if field in base else None
+            same = sorted(value) == server
+        else:
+            known = base.get(field, server)
+            same = value == server
+        if same:
+            continue
+        if field not in base or known == server:
+            apply[field] = value
+        elif field == 'content':
+            content = merge_lines(base['content'], value, server)
+            if content is None:
+                conflicts[field] = server
+            else:
+                apply[field] = content
+                merged.append(field)
+        else:
+            conflicts[field] = server
+    return apply, conflicts, merged
+
+def _mutation_error(mutation):
+    """Shape and type check of a sync mutation's changes and base"""
+    changes, base = mutation.get('changes') or {}, mutation.get('base') or {}
+    if not isinstance(changes, dict) or not isinstance(base, dict):
+        return 'changes and base must be objects'
+    unknown = sorted(set(changes) - set(SYNC_MUTABLE_FIELDS))
+    if unknown:
+        return f'Unknown fields: {", ".join(unknown)}'
+    return _field_type_error(changes) or _field_type_error(base)
+
+def _push_create(mutation):
+    client_id = str(mutation.get('client_id') or '')[:64]
+    if not client_id:
+        return {'status': 'error', 'error': 'client_id is required'}
+    existing = Note.query.filter_by(user_id=current_user.id, client_id=client_id).first()
+    if existing is not None:
+        # Retried push: the note was already created
+        return {'status': 'applied', 'id': existing.id}
+    
+    changes = mutation.get('changes') or {}
+    note = Note(author=current_user, client_id=client_id, title='', content='', is_public=False)
+    with db.session.no_autoflush:
+        changed, error = _apply_note_changes(note, {'title': '', **changes})
+    if error or note.category_id is None:
+        db.session.rollback()
+        return {'status': 'error', 'error': error or 'Invalid category'}
+    db.session.add(note)
+    UserStats.bump(current_user.id, note_count=1, public_note_count=1 if note.is_public else 0)
+    db.session.commit()
+    record_revision(note, current_user.id)
+    db.session.commit()
+    rendered_html(note.content)
+    
+    if note.is_public:
+        publish(author_channel(current_user.id), 'note', {
+            'note_id': note.id,
+            'title': note.title,
+            'author': current_user.username
+        })
+    return {'status': 'applied', 'id': note.id}
+
+def _push_update(note, mutation):
+    changes = mutation.get('changes') or {}
+    base = mutation.get('base') or {}
+    apply, conflicts, merged = _merge_changes(note, base, changes)
+    if not apply:
+        return {'status': 'conflict' if conflicts else 'noop', 'id': note.id, 'conflicts': conflicts}
+    
+    previous = (note.title, note.content)
+    changed, error = _apply_note_changes(note, apply)
+    if error:
+        db.session.rollback()
+        return {'status': 'error', 'id': note.id, 'error': error}
+    note.updated_at = datetime.utcnow()
+    record_revision(note, current_user.id, previous,
+                    coalesce_seconds=current_app.config.get('AUTOSAVE_COALESCE_SECONDS', 60))
+    db.session.commit()
+    return {'status': 'conflict' if conflicts else 'applied', 'id': note.id,
+            'conflicts': conflicts, 'merged': merged}
+
+@notes_bp.route('/api/notes/sync', methods=['POST'])
+@login_required
+def sync_push():
+    """
+    Push side of the offline sync protocol: a batch of queued local
+    mutations, applied in order and each committed on its own.
+    {"mutations": [{"op": "create", "client_id": "...", "changes": {...}},
+                   {"op": "update", "id": 1, "base": {...}, "changes": {...}},
+                   {"op": "delete", "id": 2}]}
+    Every result carries the note's current record so the client can
+    replace its local copy.
+    """
+    data = request.get_json(silent=True) or {}
+    mutations = data.get('mutations')
+    if not isinstance(mutations, list):
+        return jsonify({'error': 'mutations must be a list'}), 400
+    if len(mutations) > SYNC_MAX_MUTATIONS:
+        return jsonify({'error': f'At most {SYNC_MAX_MUTATIONS} mutations per request'}), 400
+    
+    results = []
+    deleted = []
+    for mutation in mutations:
+        if not isinstance(mutation, dict):
+            results.append({'status': 'error', 'error': 'Invalid mutation'})
+            continue
+        op = mutation.get('op')
+        error = _mutation_error(mutation)
+        if error:
+            result = {'status': 'error', 'error': error}
+        elif op == 'create':
+            result = _push_create(mutation)
+        elif op in ('update', 'delete'):
+            note = db.session.get(Note, mutation.get('id') or 0)
+            if note is None:
+                # Deleted on the server: the update has nowhere to go
+                result = {'status': 'deleted', 'id': mutation.get('id')}
+            elif note.user_id != current_user.id:
+                result = {'status': 'error', 'id': note.id, 'error': 'Forbidden'}
+            elif op == 'delete':
+                note_id = note.id
+                file_paths = _delete_notes(current_user.id, [note_id])
+                db.session.commit()
+                schedule_removal(file_paths)
+                deleted.append(note_id)
+                result = {'status': 'applied', 'id': note_id}
+            else:
+                result = _push_update(note, mutation)
+        else:
+            result = {'status': 'error', 'error': 'op must be create, update or delete'}
+        if 'mutation_id' in mutation:
+            result['mutation_id'] = mutation['mutation_id']
+        results.append(result)
+    
+    if deleted:
+        publish([], 'note_deleted', {'note_ids': deleted})
+    
+    ids = {result['id'] for result in results if result.get('id') and result['status'] != 'deleted'}
+    records = {note['id']: note for note in
+               _sync_records(Note.query.filter(Note.id.in_(ids), Note.user_id == current_user.id))} if ids else {}
+    for result in results:
+        if result.get('id') in records:
+            result['note'] = records[result['id']]
+    return jsonify({'results': results})
+
+def _own_note_or_error(note_id):
+    note = Note.query.get_or_404(note_id)
+    if note.user_id != current_user.id:
+        return None, (jsonify({'error': 'You do not have permission to access this note'}), 403)
+    return note, None
+
+@notes_bp.route('/api/notes/<int:note_id>/revisions')
+@login_required
+def note_revisions(note_id):
+    note, error = _own_note_or_error(note_id)
+    if error:
+        return error
+    revisions = NoteRevision.query.filter_by(note_id=note.id)\
+        .order_by(NoteRevision.number.desc()).all()
+    return jsonify([revision.to_dict() for revision in revisions])
+
+@notes_bp.route('/api/notes/<int:note_id>/revisions/<int:number>')
+@login_required
+def note_revision(note_id, number):
+    note, error = _own_note_or_error(note_id)
+    if error:
+        return error
+    revision = NoteRevision.query.filter_by(note_id=note.id, number=number).first_or_404()
+    data = revision.to_dict()
+    data['content'] = get_revision_content(revision)
+    return jsonify(data)
+
+@notes_bp.route('/api/notes/<int:note_id>/revisions/<int:number>/restore', methods=['POST'])
+@login_required
+def restore_note_revision(note_id, number):
+    """Vuelve a una revisión anterior guardándola como una revisión nueva"""
+    note, error = _own_note_or_error(note_id)
+    if error:
+        return error
+    revision = NoteRevision.query.filter_by(note_id=note.id, number=number).first_or_404()
+    
+    note.title = revision.title
+    note.content = get_revision_content(revision)
+    restored = record_revision(note, current_user.id)
+    db.session.commit()
+    
+    publish([author_channel(note.user_id)] if note.is_public else [], 'note_updated', {
+        'note_id': note.id
+    })
+    return jsonify({
+        'success': True,
+        'revision': restored.to_dict() if restored else None
+    })
+
+@notes_bp.route('/api/notes/facets')
+@login_required
+def notes_facets():
+    """Facet counts for the current ?search= and ?tags= without loading any note"""
+    return jsonify(note_facets(_list_filters()))
+
+@notes_bp.route('/api/tags')
+@login_required
+def list_tags():
+    """Etiquetas del usuario con su número de notas (?prefix= para autocompletar)"""
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    tags = autocomplete(current_user.id, request.args.get('prefix', ''), limit=limit)
+    return jsonify([tag.to_dict() for tag in tags])
+
+@notes_bp.route('/api/notes/bulk', methods=['POST'])
+@login_required
+def bulk_notes():
+    """Apply one action (delete, move, set_public, share) to many notes at once"""
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    ids = data.get('ids', [])
+    max_notes = current_app.config.get('BULK_MAX_NOTES', 100)
+    
+    if action not in BULK_ACTIONS:
+        return jsonify({'error': f'Unknown action. Use one of: {", ".join(BULK_ACTIONS)}'}), 400
+    if not isinstance(ids, list) or not all(isinstance(note_id, int) and not isinstance(note_id, bool)
+                                            for note_id in ids):
+        return jsonify({'error': 'ids must be a list of note ids'}), 400
+    note_ids = set(ids)
+    if not note_ids:
+        return jsonify({'error': 'No notes selected'}), 400
+    if len(note_ids) > max_notes:
+        return jsonify({'error': f'At most {max_notes} notes per request'}), 400
+    
+    # Ownership check for every note in one query
+    owned = dict(db.session.query(Note.id, Note.is_public)
+                 .filter(Note.id.in_(note_ids), Note.user_id == current_user.id).all())
+    forbidden = sorted(note_ids - owned.keys())
+    if forbidden:
+        return jsonify({'error': 'You do not have permission to modify some notes', 'ids': forbidden}), 403
+    
+    file_paths, shared = [], []
+    if action == 'delete':
+        file_paths = _delete_notes(current_user.id, owned.keys())
+    
+    elif action == 'move':
+        category_id = data.get('category_id')
+        if isinstance(category_id, bool) or not isinstance(category_id, int) or \
+                db.session.get(Category, category_id) is None:
+            return jsonify({'error': 'Invalid category'}), 400
+        Note.query.filter(Note.id.in_(owned.keys()))\
+            .update({Note.category_id: category_id}, synchronize_session=False)
+        record_changes(current_user.id, 'note', owned.keys(), UPDATE)
+    
+    elif action == 'set_public':
+        is_public = data.get('is_public')
+        if not isinstance(is_public, bool):
+            return jsonify({'error': 'is_public must be a boolean'}), 400
+        changed = sum(1 for value in owned.values() if bool(value) != is_public)
+        Note.query.filter(Note.id.in_(owned.keys()))\
+            .update({Note.is_public: is_public}, synchronize_session=False)
+        record_changes(current_user.id, 'note', owned.keys(), UPDATE)
+        UserStats.bump(current_user.id, public_note_count=changed if is_public else -changed)
+    
+    elif action == 'share':
+        user_ids = data.get('user_ids', [])
+        if not isinstance(user_ids, list) or not all(isinstance(user_id, int) and not isinstance(user_id, bool)
+                                                     for user_id in user_ids):
+            return jsonify({'error': 'user_ids must be a list of user ids'}), 400
+        if not user_ids:
+            return jsonify({'error': 'No users to share with'}), 400
+        shared = share_notes(owned.keys(), user_ids, current_user.id)
+    
+    db.session.commit()
+    schedule_removal(file_paths)
+    
+    publish([], 'note_deleted' if action == 'delete' else 'note_updated', {
+        'note_ids': sorted(owned)
+    })
+    # Same event as the single-note share endpoint, to the users who just gained access
+    if shared:
+        recipients = {}
+        for note_id, user_id in shared:
+            recipients.setdefault(note_id, []).append(user_id)
+        titles = dict(db.session.query(Note.id, Note.title).filter(Note.id.in_(recipients)))
+        for note_id, user_ids in recipients.items():
+            publish([user_channel(user_id) for user_id in user_ids], 'share', {
+                'note_id': note_id,
+                'title': titles.get(note_id, ''),
+                'author': current_user.username
+            })
+    
+    return jsonify({
+        'success': True,
+        'action': action,
+        'affected': len(owned)
+    })
+
 @notes_bp.route('/notes/<int:note_id>/like', methods=['POST'])
 @login_required
 def like_note(note_id):
     note = Note.query.get_or_404(note_id)
-    like = Like(note_id=note.id)
+    if not can_access_note(note.id) or note.is_liked_by(current_user):
+        return redirect(url_for('notes.view_note', note_id=note.id))
+    like = Like(note_id=note.id, user_id=current_user.id)
     db.session.add(like)
+    UserStats.bump(note.user_id, likes_received=1)
+    NoteDailyStats.bump(note.id, note.user_id, datetime.utcnow().date(), likes=1)
     db.session.commit()
+    
+    publish([note_channel(note.id), user_channel(note.user_id)], 'like', {
+        'note_id': note.id,
+        'user_id': current_user.id,
+        'liked': True,
+        'likes_count': len(note.likes)
+    })
     return redirect(url_for('notes.view_note', note_id=note.id))
 
 @notes_bp.route('/notes/<int:note_id>/attachment/<int:attachment_id>/delete', methods=['POST'])
@@ -350,4 +1070,6 @@ def delete_attachment(note_id, attachment_id):
 @notes_bp.route('/uploads/<filename>')
 @login_required
 def download_file(filename):
+    if not can_access_attachment(filename):
+        abort(404)
     return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
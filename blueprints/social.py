@@ -1,16 +1,23 @@
 from flask import Blueprint, request, jsonify, render_template, redirect, url_for, flash
 from flask_login import login_required, current_user
 from extensions import db
-from models import Note, Like, Comment, Badge, User
+from models import Note, Like, Comment, Badge, User, UserStats, NoteDailyStats, note_sharing
 from datetime import datetime
+from sqlalchemy.orm import joinedload
+from events import publish, user_channel, note_channel
+from sharing import can_access_note, share_notes, unshare_notes
+from ratelimit import rate_limit
 
 social_bp = Blueprint('social', __name__)
 
 @social_bp.route('/api/notes/<int:note_id>/like', methods=['POST'])
 @login_required
+@rate_limit('like')
 def toggle_like(note_id):
     """Toggle like on a note"""
     note = Note.query.get_or_404(note_id)
+    if not can_access_note(note.id):
+        return jsonify({'error': 'No tienes acceso a esta nota'}), 403
     
     # Check if user already liked this note
     existing_like = Like.query.filter_by(note_id=note_id, user_id=current_user.id).first()
@@ -18,12 +25,16 @@ def toggle_like(note_id):
     if existing_like:
         # Unlike
         db.session.delete(existing_like)
+        UserStats.bump(note.user_id, likes_received=-1)
+        NoteDailyStats.bump(note.id, note.user_id, existing_like.created_at.date(), likes=-1)
         liked = False
         message = "Like removido"
     else:
         # Like
         new_like = Like(note_id=note_id, user_id=current_user.id)
         db.session.add(new_like)
+        UserStats.bump(note.user_id, likes_received=1)
+        NoteDailyStats.bump(note.id, note.user_id, datetime.utcnow().date(), likes=1)
         liked = True
         message = "¡Te gusta esta nota!"
         
@@ -39,18 +50,31 @@ def toggle_like(note_id):
         newly_awarded = note.author.check_and_award_badges()
         db.session.commit()
     
+    likes_count = len(note.likes)
+    
+    # Notify open tabs watching the note and the note author
+    publish([note_channel(note.id), user_channel(note.user_id)], 'like', {
+        'note_id': note.id,
+        'user_id': current_user.id,
+        'liked': liked,
+        'likes_count': likes_count
+    })
+    
     return jsonify({
         'success': True,
         'liked': liked,
-        'likes_count': len(note.likes),
+        'likes_count': likes_count,
         'message': message
     })
 
 @social_bp.route('/api/notes/<int:note_id>/comments', methods=['GET', 'POST'])
 @login_required
+@rate_limit('comment', methods=('POST',))
 def handle_comments(note_id):
     """Get or create comments for a note"""
     note = Note.query.get_or_404(note_id)
+    if not can_access_note(note.id):
+        return jsonify({'error': 'No tienes acceso a esta nota'}), 403
     
     if request.method == 'POST':
         data = request.get_json()
@@ -68,6 +92,8 @@ def handle_comments(note_id):
             parent_id=parent_id
         )
         db.session.add(comment)
+        UserStats.bump(current_user.id, comments_made=1)
+        NoteDailyStats.bump(note.id, note.user_id, datetime.utcnow().date(), comments=1)
         
         # Award reputation points
         current_user.reputation_points += 2
@@ -86,9 +112,15 @@ def handle_comments(note_id):
         
         db.session.commit()
         
+        comment_data = comment.to_dict()
+        publish([note_channel(note.id), user_channel(note.user_id)], 'comment', {
+            'note_id': note.id,
+            'comment': comment_data
+        })
+        
         return jsonify({
             'success': True,
-            'comment': comment.to_dict(),
+            'comment': comment_data,
             'message': 'Comentario agregado exitosamente'
         })
     
@@ -105,6 +137,8 @@ def handle_comments(note_id):
 def get_comment_replies(comment_id):
     """Get replies for a specific comment"""
     comment = Comment.query.get_or_404(comment_id)
+    if not can_access_note(comment.note_id):
+        return jsonify({'error': 'No tienes acceso a esta nota'}), 403
     replies = comment.replies.order_by(Comment.created_at.asc()).all()
     
     return jsonify({
@@ -120,14 +154,74 @@ def delete_comment(comment_id):
     if comment.author != current_user:
         return jsonify({'error': 'No tienes permiso para eliminar este comentario'}), 403
     
+    note_id = comment.note_id
     db.session.delete(comment)
+    UserStats.bump(comment.user_id, comments_made=-1)
+    NoteDailyStats.bump(note_id, comment.note.user_id, comment.created_at.date(), comments=-1)
     db.session.commit()
     
+    publish(note_channel(note_id), 'comment_deleted', {
+        'note_id': note_id,
+        'comment_id': comment_id
+    })
+    
     return jsonify({
         'success': True,
         'message': 'Comentario eliminado'
     })
 
+@social_bp.route('/api/notes/<int:note_id>/share', methods=['GET', 'POST', 'DELETE'])
+@login_required
+def handle_note_shares(note_id):
+    """List, add or remove the users a note is shared with (author only)"""
+    note = Note.query.get_or_404(note_id)
+    if note.user_id != current_user.id:
+        return jsonify({'error': 'Solo el autor puede compartir esta nota'}), 403
+    
+    if request.method == 'GET':
+        rows = db.session.query(User.id, User.username, note_sharing.c.shared_at)\
+            .join(note_sharing, note_sharing.c.user_id == User.id)\
+            .filter(note_sharing.c.note_id == note.id)\
+            .order_by(note_sharing.c.shared_at.desc()).all()
+        return jsonify({
+            'shared_with': [
+                {'id': user_id, 'username': username, 'shared_at': shared_at.isoformat() if shared_at else None}
+                for user_id, username, shared_at in rows
+            ]
+        })
+    
+    data = request.get_json(silent=True) or {}
+    user_ids = {int(user_id) for user_id in data.get('user_ids', []) if str(user_id).isdigit()}
+    usernames = [name for name in data.get('usernames', []) if name]
+    if usernames:
+        user_ids.update(row[0] for row in db.session.query(User.id).filter(User.username.in_(usernames)))
+    if not user_ids:
+        return jsonify({'error': 'Indica al menos un usuario'}), 400
+    
+    shared_ids = []
+    if request.method == 'POST':
+        shared_ids = [user_id for _, user_id in share_notes([note.id], user_ids, current_user.id)]
+        changed = len(shared_ids)
+        message = f'Nota compartida con {changed} usuario(s)'
+    else:
+        changed = unshare_notes([note.id], user_ids)
+        message = f'Se dejó de compartir con {changed} usuario(s)'
+    db.session.commit()
+    
+    # Only users who just gained access (not the owner or existing shares)
+    if shared_ids:
+        publish([user_channel(user_id) for user_id in shared_ids], 'share', {
+            'note_id': note.id,
+            'title': note.title,
+            'author': current_user.username
+        })
+    
+    return jsonify({
+        'success': True,
+        'changed': changed,
+        'message': message
+    })
+
 @social_bp.route('/badges')
 @login_required
 def list_badges():
@@ -141,7 +235,8 @@ def list_badges():
 @login_required
 def leaderboard():
     """Show reputation leaderboard"""
-    top_users = User.query.order_by(User.reputation_points.desc()).limit(50).all()
+    top_users = User.query.options(joinedload(User.stats))\
+        .order_by(User.reputation_points.desc()).limit(50).all()
     
     # Update all users' reputation (could be optimized with background tasks)
     for user in top_users:
@@ -0,0 +1,121 @@
+from flask import Blueprint, Response, request, current_app, jsonify
+from flask_login import login_required, current_user
+import json
+import time
+from extensions import db
+from models import Note, followers
+from events import get_broker, user_channel, note_channel, author_channel
+from sharing import access_filter
+from changelog import ENTITIES, latest_change, changes_after, is_expired
+
+stream_bp = Blueprint('stream', __name__)
+
+MAX_NOTE_CHANNELS = 50
+MAX_CHANGES = 1000
+
+
+def _format_sse(event_type, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _requested_note_ids():
+    raw = request.args.get('notes', '')
+    note_ids = []
+    for part in raw.split(','):
+        if part.strip().isdigit():
+            note_ids.append(int(part))
+    return note_ids[:MAX_NOTE_CHANNELS]
+
+
+@stream_bp.route('/api/stream')
+@login_required
+def event_stream():
+    """
+    Canal Server-Sent Events multiplexado: una sola conexión recibe los
+    eventos del propio usuario, de los autores que sigue y de las notas
+    indicadas en ?notes=1,2,3. Pensado para servirse con un worker asíncrono
+    (gevent/eventlet) para que las conexiones abiertas no ocupen un worker.
+    """
+    channels = [user_channel(current_user.id)]
+
+    followed_ids = db.session.query(followers.c.followed_id)\
+        .filter(followers.c.follower_id == current_user.id).all()
+    channels.extend(author_channel(row[0]) for row in followed_ids)
+
+    note_ids = _requested_note_ids()
+    if note_ids:
+        visible_ids = db.session.query(Note.id).filter(
+            Note.id.in_(note_ids), access_filter(current_user.id)
+        ).all()
+        channels.extend(note_channel(row[0]) for row in visible_ids)
+
+    heartbeat = current_app.config.get('STREAM_HEARTBEAT_SECONDS', 15)
+    max_seconds = current_app.config.get('STREAM_MAX_SECONDS', 300)
+    queue_size = current_app.config.get('STREAM_QUEUE_SIZE', 100)
+
+    broker = get_broker()
+    subscription = broker.subscribe(channels, maxsize=queue_size)
+
+    # Liberar la conexión a la base de datos antes de empezar a transmitir
+    db.session.remove()
+
+    def generate():
+        started = time.monotonic()
+        try:
+            yield f'retry: {int(heartbeat * 1000)}\n\n'
+            yield _format_sse('ready', {'channels': len(channels)})
+            while time.monotonic() - started < max_seconds:
+                event = subscription.get(timeout=heartbeat)
+                if subscription.overflowed:
+                    # El cliente va retrasado: pedirle que recargue en lugar de
+                    # seguir acumulando eventos en memoria
+                    subscription.overflowed = False
+                    yield _format_sse('resync', {})
+                if event is None:
+                    yield ': ping\n\n'
+                    continue
+                yield _format_sse(event['type'], event['data'], event['id'])
+        finally:
+            broker.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@stream_bp.route('/api/changes')
+@login_required
+def list_changes():
+    """
+    Registro de cambios incremental: ?since=<cursor>&limit=&entities=note,task.
+    Sin since solo devuelve el cursor actual, para empezar a sincronizar
+    después de una carga completa. Si el cursor es anterior a lo que ya ha
+    borrado la retención, 410 y hay que volver a cargar todo.
+    """
+    since = request.args.get('since', type=int)
+    if since is None:
+        sequence, _ = latest_change(current_user.id)
+        return jsonify({'changes': [], 'cursor': sequence, 'has_more': False})
+    if is_expired(current_user.id, since):
+        return jsonify({'error': 'Cursor expired, full resync required', 'resync': True}), 410
+
+    entities = [entity for entity in request.args.get('entities', '').split(',') if entity]
+    unknown = set(entities) - set(ENTITIES)
+    if unknown:
+        return jsonify({'error': f'Unknown entities. Use: {", ".join(ENTITIES)}'}), 400
+    limit = min(max(request.args.get('limit', 500, type=int), 1), MAX_CHANGES)
+
+    changes = changes_after(current_user.id, since, limit + 1, entities)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    return jsonify({
+        'changes': [change.to_dict() for change in changes],
+        'cursor': changes[-1].id if changes else since,
+        'has_more': has_more
+    })
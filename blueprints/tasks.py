@@ -1,11 +1,17 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from extensions import db
-from models import Task
-from datetime import datetime
+from models import Task, TaskOccurrence
+from datetime import datetime, timedelta
+from scheduler import notify_task
+from recurrence import PRESETS, normalize_rule, is_occurrence, local_now
+from changelog import UPDATE, record_changes
 
 tasks_bp = Blueprint('tasks', __name__)
 
+TASK_VIEWS = ('all', 'upcoming', 'overdue')
+OCCURRENCE_STATUSES = ('pending', 'completed', 'skipped')
+
 @tasks_bp.route('/tasks')
 @login_required
 def list_tasks():
@@ -19,6 +25,7 @@ def create_task():
     description = request.form.get('description')
     due_date_str = request.form.get('due_date')
     priority = request.form.get('priority', 1, type=int)
+    recurrence = request.form.get('recurrence', '')
     
     if not title:
         flash('Title is required', 'error')
@@ -28,15 +35,29 @@ def create_task():
     if due_date_str:
         due_date = datetime.fromisoformat(due_date_str)
     
+    recurrence_rule = None
+    rule = request.form.get('rrule', '').strip() if recurrence == 'custom' else PRESETS.get(recurrence)
+    if rule:
+        if due_date is None:
+            flash('Recurring tasks need a due date', 'error')
+            return redirect(url_for('tasks.list_tasks'))
+        try:
+            recurrence_rule = normalize_rule(rule)
+        except ValueError as e:
+            flash(f'Invalid recurrence rule: {e}', 'error')
+            return redirect(url_for('tasks.list_tasks'))
+    
     new_task = Task(
         title=title,
         description=description,
         due_date=due_date,
         priority=priority,
+        recurrence_rule=recurrence_rule,
         user=current_user
     )
     db.session.add(new_task)
     db.session.commit()
+    notify_task(new_task)
     
     flash('Task created successfully!', 'success')
     return redirect(url_for('tasks.list_tasks'))
@@ -48,8 +69,14 @@ def toggle_task(task_id):
     if task.user_id != current_user.id:
         return jsonify({'error': 'Unauthorized'}), 403
     
-    task.status = 'completed' if task.status == 'pending' else 'pending'
+    if task.status != 'completed':
+        task.status = 'completed'
+    elif task.due_date and task.due_date < local_now():
+        task.status = 'overdue'
+    else:
+        task.status = 'pending'
     db.session.commit()
+    notify_task(task)
     return jsonify({'status': task.status})
 
 @tasks_bp.route('/tasks/<int:task_id>/delete', methods=['POST'])
@@ -64,3 +91,87 @@ def delete_task(task_id):
     db.session.commit()
     flash('Task deleted', 'info')
     return redirect(url_for('tasks.list_tasks'))
+
+@tasks_bp.route('/api/tasks/<int:task_id>/occurrences', methods=['POST'])
+@login_required
+def set_occurrence_status(task_id):
+    """
+    Complete or skip one occurrence of a recurring task:
+    {"occurrence": "2026-10-19T09:00:00", "status": "completed"}.
+    Only exceptions are stored; "pending" removes the exception.
+    """
+    task = Task.query.get_or_404(task_id)
+    if task.user_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    if not task.recurrence_rule:
+        return jsonify({'error': 'Task is not recurring'}), 400
+    
+    data = request.get_json(silent=True) or {}
+    status = data.get('status', 'completed')
+    if status not in OCCURRENCE_STATUSES:
+        return jsonify({'error': f'Status must be one of: {", ".join(OCCURRENCE_STATUSES)}'}), 400
+    try:
+        occurrence = datetime.fromisoformat(data.get('occurrence') or '')
+    except ValueError:
+        return jsonify({'error': 'Invalid occurrence date'}), 400
+    if not is_occurrence(task.recurrence_rule, task.due_date, occurrence):
+        return jsonify({'error': 'Not an occurrence of this task'}), 400
+    
+    exception = TaskOccurrence.query.get((task.id, occurrence))
+    if status == 'pending':
+        if exception is not None:
+            db.session.delete(exception)
+    elif exception is None:
+        db.session.add(TaskOccurrence(task_id=task.id, occurrence=occurrence, status=status))
+    else:
+        exception.status = status
+    # Skipped occurrences are EXDATEs in the ICS feed
+    record_changes(task.user_id, 'task', [task.id], UPDATE)
+    db.session.commit()
+    return jsonify({'occurrence': occurrence.isoformat(), 'status': status})
+
+@tasks_bp.route('/api/tasks')
+@login_required
+def api_tasks():
+    """
+    Filtered, paginated tasks: ?view=upcoming&days=7, ?view=overdue,
+    ?priority=1..3 and ?status=. Each filter maps to a (user_id, ...) index.
+    """
+    view = request.args.get('view', 'all')
+    if view not in TASK_VIEWS:
+        return jsonify({'error': f'Unknown view. Use one of: {", ".join(TASK_VIEWS)}'}), 400
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 25, type=int), 100)
+    now = local_now()
+    
+    query = Task.query.filter(Task.user_id == current_user.id)
+    if view == 'upcoming':
+        days = min(max(request.args.get('days', 7, type=int), 1), 365)
+        query = query.filter(Task.status == 'pending',
+                             Task.due_date >= now,
+                             Task.due_date <= now + timedelta(days=days))
+    elif view == 'overdue':
+        # Includes pending tasks the scheduler has not marked yet; a recurring
+        # task's due_date is only its first occurrence
+        query = query.filter(Task.status.in_(('pending', 'overdue')), Task.due_date < now,
+                             Task.recurrence_rule.is_(None))
+    
+    status = request.args.get('status')
+    if status:
+        query = query.filter(Task.status == status)
+    priority = request.args.get('priority', type=int)
+    if priority:
+        query = query.filter(Task.priority == priority)
+    
+    paginated = query.order_by(Task.due_date.asc(), Task.priority.desc())\
+        .paginate(page=page, per_page=per_page, error_out=False)
+    return jsonify({
+        'items': [task.to_dict() for task in paginated.items],
+        'total': paginated.total,
+        'page': paginated.page,
+        'pages': paginated.pages,
+        'has_prev': paginated.has_prev,
+        'has_next': paginated.has_next,
+        'prev_num': paginated.prev_num,
+        'next_num': paginated.next_num
+    })
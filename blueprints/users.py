@@ -3,6 +3,11 @@ from flask_login import login_required, current_user
 from extensions import db
 from models import User, Note
 from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
+from events import publish, user_channel
+from suggestions import get_suggestions, discard_suggestion
+from helpers import follow_status_for
+from ratelimit import rate_limit
 
 users_bp = Blueprint('users', __name__)
 
@@ -14,7 +19,7 @@ def users_list():
     page = request.args.get('page', 1, type=int)
     per_page = 12
     
-    query = User.query
+    query = User.query.options(joinedload(User.stats))
     if search:
         query = query.filter(or_(
             User.username.contains(search),
@@ -25,24 +30,27 @@ def users_list():
         page=page, per_page=per_page, error_out=False
     )
     
-    return render_template('users/list.html', users=users, search=search)
+    follow_status = follow_status_for([user.id for user in users.items])
+    
+    return render_template('users/list.html', users=users, search=search, follow_status=follow_status)
 
 @users_bp.route('/users/<int:user_id>')
 @login_required
 def user_profile(user_id):
     """Perfil de usuario"""
-    user = User.query.get_or_404(user_id)
+    user = User.query.options(joinedload(User.stats)).filter_by(id=user_id).first_or_404()
     
     # Obtener notas públicas del usuario
     notes = Note.query.filter_by(user_id=user_id, is_public=True).order_by(Note.created_at.desc()).limit(10).all()
     
     # Verificar si el usuario actual sigue a este usuario
-    is_following = current_user.is_following(user) if current_user.is_authenticated else False
+    follow_status = follow_status_for([user.id])[user.id]
     
     return render_template('users/profile.html', 
                          user=user, 
                          notes=notes, 
-                         is_following=is_following)
+                         is_following=follow_status['following'],
+                         follows_you=follow_status['followed_by'])
 
 @users_bp.route('/users/<int:user_id>/followers')
 @login_required
@@ -52,11 +60,13 @@ def user_followers(user_id):
     page = request.args.get('page', 1, type=int)
     per_page = 20
     
-    followers = user.followers.paginate(
+    followers = user.followers.options(joinedload(User.stats)).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
-    return render_template('users/followers.html', user=user, followers=followers)
+    follow_status = follow_status_for([follower.id for follower in followers.items])
+    
+    return render_template('users/followers.html', user=user, followers=followers, follow_status=follow_status)
 
 @users_bp.route('/users/<int:user_id>/following')
 @login_required
@@ -66,14 +76,17 @@ def user_following(user_id):
     page = request.args.get('page', 1, type=int)
     per_page = 20
     
-    following = user.followed.paginate(
+    following = user.followed.options(joinedload(User.stats)).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
-    return render_template('users/following.html', user=user, following=following)
+    follow_status = follow_status_for([followed_user.id for followed_user in following.items])
+    
+    return render_template('users/following.html', user=user, following=following, follow_status=follow_status)
 
 @users_bp.route('/api/users/<int:user_id>/follow', methods=['POST'])
 @login_required
+@rate_limit('follow')
 def follow_user(user_id):
     """Seguir a un usuario"""
     if user_id == current_user.id:
@@ -85,8 +98,14 @@ def follow_user(user_id):
         return jsonify({'error': 'Ya sigues a este usuario'}), 400
     
     current_user.follow(user)
+    discard_suggestion(current_user.id, user.id)
     db.session.commit()
     
+    publish(user_channel(user.id), 'follow', {
+        'follower_id': current_user.id,
+        'follower_username': current_user.username
+    })
+    
     return jsonify({
         'success': True,
         'message': f'Ahora sigues a {user.username}',
@@ -95,6 +114,7 @@ def follow_user(user_id):
 
 @users_bp.route('/api/users/<int:user_id>/unfollow', methods=['POST'])
 @login_required
+@rate_limit('follow')
 def unfollow_user(user_id):
     """Dejar de seguir a un usuario"""
     if user_id == current_user.id:
@@ -114,15 +134,23 @@ def unfollow_user(user_id):
         'followers_count': user.get_followers_count()
     })
 
+@users_bp.route('/api/users/follow-status')
+@login_required
+def follow_status():
+    """Estado de seguimiento para una lista de usuarios (?ids=1,2,3)"""
+    user_ids = [int(part) for part in request.args.get('ids', '').split(',') if part.strip().isdigit()]
+    if len(user_ids) > 100:
+        return jsonify({'error': 'Máximo 100 usuarios por petición'}), 400
+    
+    status = follow_status_for(user_ids)
+    return jsonify({str(user_id): flags for user_id, flags in status.items()})
+
 @users_bp.route('/api/users/suggestions')
 @login_required
 def user_suggestions():
     """Sugerencias de usuarios para seguir"""
-    # Usuarios que no sigue actualmente
-    following_ids = [user.id for user in current_user.followed.all()]
-    following_ids.append(current_user.id)  # Excluir a sí mismo
-    
-    suggested_users = User.query.filter(~User.id.in_(following_ids)).limit(5).all()
+    # Top-K precalculado por `flask compute-suggestions`
+    suggested_users = get_suggestions(current_user.id, limit=5)
     
     return jsonify([user.to_dict() for user in suggested_users])
 
@@ -0,0 +1,156 @@
+# cache.py
+"""
+Caché de fragmentos renderizados y de páginas comunes a todos los usuarios.
+
+- `fragment_cache`: HTML de tarjetas de notas (y sus dicts serializados),
+  con claves que incluyen el id de la nota, su `updated_at` y una generación
+  por nota que se incrementa con los eventos de likes/comentarios.
+- `page_cache`: bloques idénticos para todos los usuarios, como la rejilla
+  de /discover, que se vacía cuando se crea, edita o borra una nota.
+- `occurrence_cache`: expansiones de tareas recurrentes por ventana del
+  calendario (recurrence.py).
+
+Todas son LRU acotadas por número de entradas y cuentan hits/misses. Son
+por proceso: cada worker mantiene la suya y solo recibe las invalidaciones
+del bus de eventos de su propio proceso. Por eso fragment_cache y
+page_cache llevan además TTL (FRAGMENT_CACHE_TTL, PAGE_CACHE_TTL): un like
+o un comentario atendido por otro worker no cambia updated_at, y sus
+contadores se ven como mucho ese tiempo desfasados.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+import events
+
+_MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, name, max_entries=1000, ttl=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and self.ttl is not None and entry[1] < time.monotonic():
+                del self._data[key]
+                entry = _MISSING
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'name': self.name,
+            'entries': len(self._data),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
+
+
+fragment_cache = LRUCache('fragments', max_entries=2000, ttl=30)
+page_cache = LRUCache('pages', max_entries=50, ttl=60)
+occurrence_cache = LRUCache('occurrences', max_entries=1000)
+
+# Generación por nota: cambia cuando algo que no toca updated_at (likes,
+# comentarios) altera la tarjeta
+_note_generations = {}
+_generations_lock = threading.Lock()
+
+
+def note_generation(note_id):
+    return _note_generations.get(note_id, 0)
+
+
+def invalidate_note(note_id):
+    with _generations_lock:
+        _note_generations[note_id] = _note_generations.get(note_id, 0) + 1
+
+
+def note_key(kind, note, *extra):
+    """Clave de fragmento versionada por updated_at y generación de la nota"""
+    updated = note.updated_at.isoformat() if note.updated_at else None
+    return (kind, note.id, updated, note_generation(note.id)) + extra
+
+
+def cached_fragment(*key_parts, caller=None):
+    """
+    Uso en plantillas:
+        {% call cached_fragment('feed-card', note.id, note.updated_at) %}...{% endcall %}
+    """
+    key = ('fragment',) + key_parts
+    html = fragment_cache.get(key)
+    if html is None:
+        html = Markup(caller())
+        fragment_cache.set(key, html)
+    return html
+
+
+def note_dict(note):
+    """Note.to_dict() cacheado (tarjetas de las vistas Vue)"""
+    key = note_key('note-dict', note, note.view_count)
+    data = fragment_cache.get(key)
+    if data is None:
+        data = note.to_dict()
+        fragment_cache.set(key, data)
+    return data
+
+
+def _on_event(event_type, data):
+    if event_type in ('like', 'comment', 'comment_deleted') and data.get('note_id'):
+        invalidate_note(data['note_id'])
+    if event_type in ('note', 'note_updated', 'note_deleted'):
+        for note_id in data.get('note_ids') or [data.get('note_id')]:
+            if note_id:
+                invalidate_note(note_id)
+        page_cache.clear()
+
+
+def all_stats():
+    return [fragment_cache.stats(), page_cache.stats(), occurrence_cache.stats()]
+
+
+def init_app(app):
+    fragment_cache.max_entries = app.config.get('FRAGMENT_CACHE_SIZE', fragment_cache.max_entries)
+    fragment_cache.ttl = app.config.get('FRAGMENT_CACHE_TTL', fragment_cache.ttl)
+    page_cache.max_entries = app.config.get('PAGE_CACHE_SIZE', page_cache.max_entries)
+    page_cache.ttl = app.config.get('PAGE_CACHE_TTL', page_cache.ttl)
+    app.jinja_env.globals['cached_fragment'] = cached_fragment
+    app.jinja_env.globals['note_generation'] = note_generation
+
+
+events.add_listener(_on_event)
@@ -0,0 +1,176 @@
+# changelog.py
+"""
+Registro de cambios (change data capture) de notas, tareas y entidades
+sociales: comentarios, likes y seguimientos.
+
+Cada alta, modificación o baja añade filas a change_log con un número de
+secuencia creciente (el id), el usuario al que le interesa el cambio y la
+entidad afectada. Un comentario o un like se registra para su autor y para
+el autor de la nota; un seguimiento, como 'follow' para quien sigue y como
+'follower' para el seguido.
+
+Los cambios hechos con el ORM se recogen en el evento after_flush de la
+sesión, dentro de la misma transacción; las operaciones por lotes
+(query.update / query.delete) no pasan por la sesión y llaman a
+record_changes() explícitamente. Al borrar una nota, _delete_notes registra
+también la baja de sus comentarios y likes para sus autores y el dueño.
+
+Las columnas que cambian sin que cambie el contenido (contador de visitas,
+updated_at, marca del recordatorio) no generan entradas.
+
+Consumidores: /api/changes?since= (sincronización incremental) y el feed
+ICS (ics.py). `compact_changes()` aplica la retención: deja solo la última
+entrada de cada entidad y borra las anteriores a CHANGE_LOG_RETENTION_DAYS;
+la secuencia más alta borrada queda como horizonte del usuario y los
+cursores anteriores reciben 410 para que resincronicen.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import ChangeLog, ChangeLogHorizon, Note, Task, Comment, Like, User
+
+INSERT, UPDATE, DELETE = 'insert', 'update', 'delete'
+ENTITIES = ('note', 'task', 'comment', 'like', 'follow', 'follower')
+
+# modelo -> (entidad, columnas que no cuentan como cambio, relaciones que sí)
+TRACKED = {
+    Note: ('note', {'view_count', 'updated_at'}, ('tags',)),
+    Task: ('task', {'reminded_at'}, ()),
+    Comment: ('comment', {'updated_at'}, ()),
+    Like: ('like', set(), ())
+}
+
+
+def _rows(user_id, entity, entity_ids, op, now):
+    return [{'user_id': user_id, 'entity': entity, 'entity_id': entity_id, 'op': op, 'created_at': now}
+            for entity_id in entity_ids]
+
+
+def record_changes(user_id, entity, entity_ids, op):
+    """Registra cambios hechos por lotes, fuera de los eventos de sesión. No hace commit."""
+    rows = _rows(user_id, entity, entity_ids, op, datetime.utcnow())
+    if rows:
+        db.session.execute(ChangeLog.__table__.insert(), rows)
+
+
+def _has_changes(obj, ignored, relations):
+    state = inspect(obj)
+    keys = [attr.key for attr in state.mapper.column_attrs if attr.key not in ignored]
+    return any(state.attrs[key].history.has_changes() for key in [*keys, *relations])
+
+
+def _audience(session, obj):
+    """Usuarios cuyo registro recibe el cambio"""
+    user_ids = {obj.user_id}
+    if isinstance(obj, (Comment, Like)):
+        with session.no_autoflush:
+            note = session.get(Note, obj.note_id)
+        if note is not None:
+            user_ids.add(note.user_id)
+    return user_ids
+
+
+def _follow_rows(user, now):
+    """Altas y bajas en la colección dinámica User.followed"""
+    history = inspect(user).attrs.followed.history
+    rows = []
+    for op, users in ((INSERT, history.added), (DELETE, history.deleted)):
+        for followed in users:
+            rows.extend(_rows(user.id, 'follow', [followed.id], op, now))
+            rows.extend(_rows(followed.id, 'follower', [user.id], op, now))
+    return rows
+
+
+@event.listens_for(Session, 'after_flush')
+def _log_flush(session, flush_context):
+    now = datetime.utcnow()
+    rows = []
+    for op, objects in ((INSERT, session.new), (UPDATE, session.dirty), (DELETE, session.deleted)):
+        for obj in objects:
+            if op == UPDATE and isinstance(obj, User):
+                rows.extend(_follow_rows(obj, now))
+                continue
+            tracked = TRACKED.get(type(obj))
+            if tracked is None:
+                continue
+            entity, ignored, relations = tracked
+            if op == UPDATE and not _has_changes(obj, ignored, relations):
+                continue
+            for user_id in _audience(session, obj):
+                rows.extend(_rows(user_id, entity, [obj.id], op, now))
+    if rows:
+        session.connection().execute(ChangeLog.__table__.insert(), rows)
+
+
+def horizon(user_id):
+    row = db.session.get(ChangeLogHorizon, user_id)
+    return row.sequence if row else 0
+
+
+def is_expired(user_id, since):
+    """El cursor es anterior a entradas ya borradas por la retención"""
+    return since < horizon(user_id)
+
+
+def latest_change(user_id):
+    """(secuencia, momento) del último cambio del usuario; (horizonte, None) si no quedan"""
+    row = db.session.query(ChangeLog.id, ChangeLog.created_at)\
+        .filter(ChangeLog.user_id == user_id)\
+        .order_by(ChangeLog.id.desc()).first()
+    return (row.id, row.created_at) if row else (horizon(user_id), None)
+
+
+def changes_after(user_id, since, limit, entities=None):
+    """Entradas del usuario posteriores a `since`, en orden de secuencia"""
+    query = ChangeLog.query.filter(ChangeLog.user_id == user_id, ChangeLog.id > since)
+    if entities:
+        query = query.filter(ChangeLog.entity.in_(entities))
+    return query.order_by(ChangeLog.id).limit(limit).all()
+
+
+def changes_since(user_id, since, entities=None):
+    """
+    Estado neto de lo cambiado tras la secuencia `since`:
+    {entidad: {id: 'upsert' | 'delete'}}. Una baja gana a lo anterior y un
+    alta posterior a una baja vuelve a contar como upsert.
+    """
+    query = db.session.query(ChangeLog.entity, ChangeLog.entity_id, ChangeLog.op)\
+        .filter(ChangeLog.user_id == user_id, ChangeLog.id > since)
+    if entities:
+        query = query.filter(ChangeLog.entity.in_(entities))
+    result = {}
+    for entity, entity_id, op in query.order_by(ChangeLog.id):
+        result.setdefault(entity, {})[entity_id] = DELETE if op == DELETE else 'upsert'
+    return result
+
+
+def compact_changes(keep_days=30):
+    """
+    Retención del registro:
+    1. Compacta: de cada entidad solo hace falta la última entrada, porque
+       los consumidores aplican el estado actual. No cambia el resultado
+       para ningún cursor.
+    2. Caduca: borra las entradas anteriores a keep_days y guarda por
+       usuario la secuencia más alta borrada como horizonte.
+    Devuelve (compactadas, caducadas).
+    """
+    latest = db.session.query(db.func.max(ChangeLog.id))\
+        .group_by(ChangeLog.user_id, ChangeLog.entity, ChangeLog.entity_id)
+    compacted = ChangeLog.query.filter(ChangeLog.id.notin_(latest.scalar_subquery()))\
+        .delete(synchronize_session=False)
+
+    cutoff = datetime.utcnow() - timedelta(days=keep_days)
+    expired_by_user = db.session.query(ChangeLog.user_id, db.func.max(ChangeLog.id))\
+        .filter(ChangeLog.created_at < cutoff).group_by(ChangeLog.user_id).all()
+    for user_id, sequence in expired_by_user:
+        row = db.session.get(ChangeLogHorizon, user_id)
+        if row is None:
+            db.session.add(ChangeLogHorizon(user_id=user_id, sequence=sequence))
+        else:
+            row.sequence = max(row.sequence, sequence)
+    expired = ChangeLog.query.filter(ChangeLog.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return compacted, expired
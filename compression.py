@@ -0,0 +1,186 @@
+# compression.py
+"""
+Compresión de respuestas (gzip y, si está instalado el paquete `brotli`, br).
+
+- Respuestas dinámicas: se comprimen al vuelo si superan COMPRESS_MIN_SIZE
+  y su tipo está en COMPRESS_MIMETYPES. Los streams (SSE) no se tocan.
+- Estáticos: `flask build-assets` genera en static/dist copias con hash en el
+  nombre más sus variantes .gz/.br; si el cliente las acepta se sirven
+  directamente sin comprimir en cada petición.
+"""
+import gzip
+import json
+import mimetypes
+import os
+import shutil
+
+import click
+from flask import current_app, request, send_file
+from werkzeug.security import safe_join
+
+from assets import file_hash
+
+try:
+    import brotli
+except ImportError:  # dependencia opcional
+    brotli = None
+
+DEFAULT_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml'
+}
+DIST_FOLDER = 'dist'
+MANIFEST_NAME = 'manifest.json'
+ASSET_FOLDERS = ('js', 'css')
+
+
+def _accepted_encodings():
+    """Codificaciones aceptadas (q > 0), de mayor a menor calidad; a igualdad, br primero"""
+    supported = (['br'] if brotli is not None else []) + ['gzip']
+    qualities = {encoding: request.accept_encodings[encoding] for encoding in supported}
+    accepted = [encoding for encoding in supported if qualities[encoding] > 0]
+    return sorted(accepted, key=lambda encoding: -qualities[encoding])
+
+
+def _compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level + 2, 11))
+    return gzip.compress(data, compresslevel=level)
+
+
+def _compress_response(response):
+    config = current_app.config
+
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers):
+        return response
+    if response.mimetype not in config.get('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < config.get('COMPRESS_MIN_SIZE', 500):
+        return response
+
+    encodings = _accepted_encodings()
+    if not encodings:
+        return response
+
+    encoding = encodings[0]
+    response.set_data(_compress(data, encoding, config.get('COMPRESS_LEVEL', 6)))
+    response.headers['Content-Encoding'] = encoding
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        # La representación comprimida es distinta: ETag débil
+        response.headers['ETag'] = 'W/' + etag
+    return response
+
+
+def _serve_precompressed():
+    """Sirve static/dist/<fichero>.br|.gz si existe y el cliente lo acepta"""
+    if request.endpoint != 'static':
+        return None
+    filename = request.view_args.get('filename', '')
+    if not filename.startswith(DIST_FOLDER + '/'):
+        return None
+
+    # safe_join descarta '..' y rutas absolutas: nada fuera de static/
+    path = safe_join(current_app.static_folder, filename)
+    if path is None:
+        return None
+    suffixes = {'br': '.br', 'gzip': '.gz'}
+    for encoding in _accepted_encodings():
+        variant = path + suffixes[encoding]
+        if os.path.isfile(variant):
+            response = send_file(variant, mimetype=_guess_mimetype(filename), conditional=True)
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return response
+    return None
+
+
+def _guess_mimetype(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def build_assets(static_folder, level=9):
+    """
+    Copia static/js y static/css a static/dist con el hash en el nombre,
+    genera variantes .gz/.br y escribe el manifest lógico -> con hash.
+    """
+    dist = os.path.join(static_folder, DIST_FOLDER)
+    shutil.rmtree(dist, ignore_errors=True)
+    manifest = {}
+    for folder in ASSET_FOLDERS:
+        source_dir = os.path.join(static_folder, folder)
+        if not os.path.isdir(source_dir):
+            continue
+        for name in sorted(os.listdir(source_dir)):
+            source = os.path.join(source_dir, name)
+            if not os.path.isfile(source):
+                continue
+            stem, ext = os.path.splitext(name)
+            hashed = f'{folder}/{stem}.{file_hash(source)}{ext}'
+            target = os.path.join(dist, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(source, 'rb') as f:
+                data = f.read()
+            with open(target, 'wb') as f:
+                f.write(data)
+            with open(target + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=level))
+            if brotli is not None:
+                with open(target + '.br', 'wb') as f:
+                    f.write(brotli.compress(data, quality=11))
+            manifest[f'{folder}/{name}'] = f'{DIST_FOLDER}/{hashed}'
+    with open(os.path.join(dist, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+MEASURED_PAGES = (
+    '/notes/table', '/notes/table?format=json', '/notes/keep', '/notes/keep?format=json',
+    '/feed', '/discover', '/users', '/leaderboard', '/tasks', '/api/calendar-events'
+)
+
+
+def measure_pages(app, user_id, pages=MEASURED_PAGES):
+    """Bytes en la red de las páginas principales sin comprimir y comprimidas"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+    encodings = ['identity', 'gzip'] + (['br'] if brotli is not None else [])
+    results = []
+    for page in pages:
+        sizes = {}
+        for encoding in encodings:
+            response = client.get(page, headers={'Accept-Encoding': encoding})
+            sizes[encoding] = len(response.get_data())
+            response.close()
+        results.append((page, sizes))
+    return results
+
+
+def init_app(app):
+    app.before_request(_serve_precompressed)
+    app.after_request(_compress_response)
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Genera los estáticos con hash y sus variantes precomprimidas"""
+        manifest = build_assets(app.static_folder)
+        for logical, hashed in manifest.items():
+            print(f'{logical} -> {hashed}')
+
+    @app.cli.command('measure-pages')
+    @click.option('--user-id', type=int, required=True, help='Usuario con el que se piden las páginas')
+    def measure_pages_command(user_id):
+        """Mide los bytes transferidos de las páginas principales"""
+        for page, sizes in measure_pages(app, user_id):
+            identity = sizes['identity']
+            parts = [f'{encoding}={size}' for encoding, size in sizes.items()]
+            ratio = sizes['gzip'] / identity if identity else 1
+            print(f'{page:32} ' + ' '.join(parts) + f' (gzip {ratio:.0%})')
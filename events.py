@@ -0,0 +1,144 @@
+# events.py
+"""
+Bus de eventos en proceso (pub/sub) para notificaciones en tiempo real.
+
+Los write paths publican eventos en canales con nombre ('user:<id>',
+'note:<id>', 'author:<id>') y el endpoint de streaming se suscribe a varios
+canales con una sola conexión. El broker se puede sustituir por otro que
+implemente la misma interfaz (publish/subscribe/unsubscribe) mediante
+`set_broker()`, por ejemplo uno respaldado por un broker local.
+"""
+import itertools
+import threading
+from collections import deque
+
+
+class Subscription:
+    """
+    Cola acotada de eventos para una conexión. Si el cliente no consume lo
+    bastante rápido se descartan los eventos más antiguos y se marca la
+    suscripción como desbordada para que el cliente se resincronice.
+    """
+
+    def __init__(self, channels, maxsize=100):
+        self.channels = set(channels)
+        self._queue = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.overflowed = False
+        self.closed = False
+
+    def put(self, event):
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.overflowed = True
+            self._queue.append(event)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Devuelve el siguiente evento o None si vence el timeout"""
+        with self._cond:
+            if not self._queue and not self.closed:
+                self._cond.wait(timeout)
+            if self._queue:
+                return self._queue.popleft()
+            return None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class InProcessBroker:
+    """Broker por defecto: reparte eventos entre suscriptores del mismo proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._ids = itertools.count(1)
+
+    def publish(self, channels, event):
+        """Entrega el evento una sola vez a cada suscripción de cualquiera de los canales"""
+        with self._lock:
+            subscribers = set()
+            for channel in channels:
+                subscribers.update(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+        return len(subscribers)
+
+    def subscribe(self, channels, maxsize=100):
+        subscription = Subscription(channels, maxsize=maxsize)
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[channel]
+
+    def next_id(self):
+        return next(self._ids)
+
+    def connection_count(self):
+        with self._lock:
+            return len({s for subs in self._channels.values() for s in subs})
+
+
+_broker = InProcessBroker()
+
+# Callbacks síncronos (p. ej. invalidación de cachés) llamados en cada publish
+_listeners = []
+
+
+def get_broker():
+    return _broker
+
+
+def set_broker(broker):
+    """
+    Sustituye el broker (debe ofrecer publish/subscribe/unsubscribe/next_id).
+    publish(channels, event) recibe la lista de canales del evento y lo
+    entrega una vez por suscripción aunque esté en varios.
+    """
+    global _broker
+    _broker = broker
+
+
+def add_listener(callback):
+    """Registra callback(event_type, data) para todos los eventos publicados"""
+    _listeners.append(callback)
+
+
+def publish(channels, event_type, data):
+    """
+    Publica un evento en uno o varios canales. Los eventos se deben publicar
+    después del commit para no notificar cambios que luego se revierten.
+    """
+    if isinstance(channels, str):
+        channels = [channels]
+    event = {'id': _broker.next_id(), 'type': event_type, 'data': data}
+    for callback in _listeners:
+        callback(event_type, data)
+    _broker.publish(channels, event)
+    return event
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def note_channel(note_id):
+    return f'note:{note_id}'
+
+
+def author_channel(user_id):
+    return f'author:{user_id}'
@@ -0,0 +1,52 @@
+# file_cleaner.py
+"""
+Borrado de ficheros adjuntos en segundo plano.
+
+Las peticiones encolan las rutas después del commit y un hilo daemon hace
+los os.remove, de modo que borrar muchas notas no bloquea la respuesta.
+"""
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _run():
+    while True:
+        path = _queue.get()
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            logger.error(f'Error deleting file {path}: {e}')
+        finally:
+            _queue.task_done()
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='file-cleaner', daemon=True)
+            _worker.start()
+
+
+def schedule_removal(paths):
+    """Encola rutas para borrarlas; llamar sólo después del commit"""
+    paths = [path for path in paths if path]
+    if not paths:
+        return
+    _ensure_worker()
+    for path in paths:
+        _queue.put(path)
+
+
+def wait_until_empty():
+    """Espera a que se procesen los borrados pendientes (scripts y apagado)"""
+    _queue.join()
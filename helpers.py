@@ -1,6 +1,7 @@
 # helpers.py
 from models import Category
-from flask import current_app
+from flask import current_app, g
+from flask_login import current_user
 import os
 
 def categories_to_dict():
@@ -28,4 +29,15 @@ def allowed_file(filename):
 
 def create_uploads_folder():
     if not os.path.exists(current_app.config['UPLOAD_FOLDER']):
-        os.makedirs(current_app.config['UPLOAD_FOLDER'])
\ No newline at end of file
+        os.makedirs(current_app.config['UPLOAD_FOLDER'])
+
+def follow_status_for(user_ids):
+    """
+    Estado de seguimiento del usuario actual respecto a varios usuarios,
+    memorizado durante la petición para no repetir consultas
+    """
+    memo = g.setdefault('follow_status', {})
+    missing = [user_id for user_id in set(user_ids) if user_id not in memo]
+    if missing:
+        memo.update(current_user.get_follow_status(missing))
+    return {user_id: memo[user_id] for user_id in user_ids}
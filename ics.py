@@ -0,0 +1,189 @@
+# ics.py
+"""
+Feed iCalendar (RFC 5545) con las notas y tareas de un usuario.
+
+Cada usuario tiene una URL secreta (/calendar/<token>.ics) para suscribirse
+desde Google Calendar, Outlook o Apple Calendar. El feed se genera como un
+stream leyendo las filas por lotes, sin montar el documento en memoria:
+
+- Notas: evento de día completo en la fecha de creación.
+- Tareas con fecha: evento en due_date; las recurrentes llevan su RRULE y
+  las ocurrencias omitidas como EXDATE. due_date es hora local
+  (recurrence.py), así que DTSTART y EXDATE van en hora flotante, sin Z:
+  el cliente las muestra a esa hora en su zona.
+
+La secuencia del registro de cambios (changelog.py) hace de ETag, así que
+un cliente que sondea cada pocos minutos recibe un 304 tras una sola
+consulta por índice. Con ?since=<secuencia> solo se envían las entidades
+cambiadas desde entonces; las borradas van con STATUS:CANCELLED.
+"""
+import secrets
+from datetime import datetime
+
+from flask import url_for
+
+from extensions import db
+from models import Note, Task, TaskOccurrence
+from changelog import DELETE, changes_since
+
+PRODID = '-//Notes App//Calendar Feed//ES'
+BATCH_SIZE = 500
+# PRIORITY de iCalendar: 1 alta, 5 media, 9 baja
+PRIORITIES = {3: 1, 2: 5, 1: 9}
+
+
+def generate_token():
+    return secrets.token_urlsafe(24)
+
+
+def escape_text(value):
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')\
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def fold(line, limit=75):
+    """Corta las líneas largas en trozos de como mucho `limit` octetos"""
+    if len(line.encode('utf-8')) <= limit:
+        return line + '\r\n'
+    parts = []
+    current, size = '', 0
+    for char in line:
+        width = len(char.encode('utf-8'))
+        if size + width > limit:
+            parts.append(current)
+            current, size = ' ', 1
+        current += char
+        size += width
+    parts.append(current)
+    return '\r\n'.join(parts) + '\r\n'
+
+
+def _utc(value):
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def _floating(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def _event(props):
+    return ''.join(fold(line) for line in ['BEGIN:VEVENT', *props, 'END:VEVENT'])
+
+
+def note_event(note, host):
+    summary = f'📝 {note.title}'
+    return _event([
+        f'UID:note-{note.id}@{host}',
+        f'DTSTAMP:{_utc(note.updated_at or note.created_at)}',
+        f'DTSTART;VALUE=DATE:{note.created_at:%Y%m%d}',
+        f'SUMMARY:{escape_text(summary)}',
+        f'DESCRIPTION:{escape_text((note.content or "")[:500])}',
+        f'URL:{url_for("notes.view_note", note_id=note.id, _external=True)}',
+        'TRANSP:TRANSPARENT'
+    ])
+
+
+def task_event(task, host, skipped=()):
+    done = task.status == 'completed'
+    props = [
+        f'UID:task-{task.id}@{host}',
+        f'DTSTAMP:{_utc(task.created_at)}',
+        f'DTSTART:{_floating(task.due_date)}',
+        f'SUMMARY:{escape_text(("✔ " if done else "") + task.title)}',
+        f'PRIORITY:{PRIORITIES.get(task.priority, 0)}'
+    ]
+    if task.description:
+        props.append(f'DESCRIPTION:{escape_text(task.description)}')
+    if task.recurrence_rule:
+        props.append(f'RRULE:{task.recurrence_rule}')
+        if skipped:
+            props.append('EXDATE:' + ','.join(_floating(occurrence) for occurrence in sorted(skipped)))
+    return _event(props)
+
+
+def cancelled_event(entity, entity_id, host, now):
+    return _event([
+        f'UID:{entity}-{entity_id}@{host}',
+        f'DTSTAMP:{_utc(now)}',
+        f'DTSTART:{_utc(now)}',
+        'STATUS:CANCELLED'
+    ])
+
+
+def _skipped_occurrences(task_ids):
+    skipped = {}
+    if task_ids:
+        for task_id, occurrence in db.session.query(TaskOccurrence.task_id, TaskOccurrence.occurrence)\
+                .filter(TaskOccurrence.task_id.in_(task_ids), TaskOccurrence.status == 'skipped'):
+            skipped.setdefault(task_id, []).append(occurrence)
+    return skipped
+
+
+def _batches(query, column, ids):
+    """Filas de query por lotes de ids (o todas, en orden de id, si ids es None)"""
+    if ids is None:
+        yield from query.order_by(column).yield_per(BATCH_SIZE)
+        return
+    ids = sorted(ids)
+    for i in range(0, len(ids), BATCH_SIZE):
+        yield from query.filter(column.in_(ids[i:i + BATCH_SIZE])).order_by(column)
+
+
+def _task_events(tasks, host, emitted):
+    batch = []
+    for task in tasks:
+        batch.append(task)
+        if len(batch) >= BATCH_SIZE:
+            yield from _task_batch(batch, host, emitted)
+            batch = []
+    yield from _task_batch(batch, host, emitted)
+
+
+def _task_batch(tasks, host, emitted):
+    skipped = _skipped_occurrences([task.id for task in tasks if task.recurrence_rule])
+    for task in tasks:
+        emitted.add(task.id)
+        yield task_event(task, host, skipped.get(task.id, ()))
+
+
+def feed(user, host, since=None, name=None):
+    """
+    Genera el calendario por trozos. Con since=None, completo; con una
+    secuencia, solo lo cambiado después (altas y cambios como eventos, bajas
+    y tareas que se han quedado sin fecha como cancelados).
+    """
+    yield ''.join(fold(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(name or user.username)}'
+    ])
+
+    note_ids = task_ids = None
+    if since is not None:
+        changed = changes_since(user.id, since, ('note', 'task'))
+        now = datetime.utcnow()
+        note_ids, task_ids = set(), set()
+        for entity, ids in (('note', note_ids), ('task', task_ids)):
+            for entity_id, op in changed.get(entity, {}).items():
+                if op == DELETE:
+                    yield cancelled_event(entity, entity_id, host, now)
+                else:
+                    ids.add(entity_id)
+
+    if note_ids is None or note_ids:
+        notes = Note.query.filter(Note.user_id == user.id)
+        for note in _batches(notes, Note.id, note_ids):
+            yield note_event(note, host)
+
+    if task_ids is None or task_ids:
+        tasks = Task.query.filter(Task.user_id == user.id, Task.due_date.isnot(None))
+        emitted = set()
+        yield from _task_events(_batches(tasks, Task.id, task_ids), host, emitted)
+        if task_ids:
+            for task_id in sorted(task_ids - emitted):
+                yield cancelled_event('task', task_id, host, datetime.utcnow())
+
+    yield 'END:VCALENDAR\r\n'
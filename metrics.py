@@ -0,0 +1,378 @@
+# metrics.py
+"""
+Métricas de peticiones en formato de exposición de Prometheus.
+
+Por cada endpoint (etiquetado con su blueprint) se cuentan las peticiones
+por método y estado, y se guardan histogramas de latencia, de tamaño de
+respuesta y de tiempo en la base de datos (eventos del engine de
+SQLAlchemy). Junto a ellas se publican los contadores de las cachés
+(cache.py), del limitador (ratelimit.py) y del pool de hashes
+(passwords.py); el ratio de aciertos sale de hits / (hits + misses).
+
+Varios workers: cada proceso acumula en memoria y vuelca su estado, como
+mucho cada METRICS_FLUSH_INTERVAL segundos, a METRICS_DIR/<pid>-<inicio>.json
+(escritura atómica con os.replace). GET /metrics suma los ficheros de todos
+los procesos, así que cualquier worker devuelve el total. El instante de
+arranque en el nombre evita que un proceso que reutiliza el pid pise el
+fichero de otro. En cada lectura los contadores e histogramas de los
+workers ya terminados se suman a METRICS_DIR/archive.json y sus ficheros se
+borran: los contadores no retroceden y el coste de /metrics no crece con
+los reinicios. Los gauges (cache_entries) solo suman los procesos vivos.
+`flask metrics-reset` borra todo. Tras un fork el hijo empieza de cero con
+un fichero nuevo.
+
+/metrics solo responde a las IPs de METRICS_ALLOWED_IPS (por defecto,
+localhost); para el resto es un 404. Detrás de un proxy local todas las
+peticiones llegan desde localhost: hay que aplicar ProxyFix o fijar
+METRICS_TOKEN, que exige además la cabecera
+"Authorization: Bearer <token>" (bearer_token en Prometheus).
+"""
+import fcntl
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+
+from flask import g, request, has_request_context, Response, abort
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+DB_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+ARCHIVE = 'archive.json'
+
+HELP = {
+    'http_requests_total': ('counter', 'Peticiones atendidas'),
+    'http_request_duration_seconds': ('histogram', 'Tiempo hasta tener la respuesta'),
+    'http_response_size_bytes': ('histogram', 'Tamaño del cuerpo enviado (sin streams)'),
+    'http_request_db_seconds': ('histogram', 'Tiempo en consultas SQL por petición'),
+    'http_request_db_queries_total': ('counter', 'Consultas SQL ejecutadas'),
+    'cache_hits_total': ('counter', 'Aciertos de caché'),
+    'cache_misses_total': ('counter', 'Fallos de caché'),
+    'cache_evictions_total': ('counter', 'Entradas expulsadas por tamaño'),
+    'cache_entries': ('gauge', 'Entradas en caché (suma de procesos)'),
+    'ratelimit_requests_total': ('counter', 'Decisiones del limitador'),
+    'password_hash_operations_total': ('counter', 'Hashes y verificaciones de contraseña'),
+    'password_hash_seconds_total': ('counter', 'Tiempo de CPU en hashes de contraseña'),
+    'password_hash_rejected_total': ('counter', 'Hashes rechazados con la cola llena')
+}
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.started = int(time.time() * 1000)
+        self.counters = {}
+        self.histograms = {}
+        self.last_flush = 0.0
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': list(buckets), 'counts': [0] * len(buckets),
+                                                    'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['counts'][i] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        """Estado serializable de este proceso, con los contadores de los demás módulos"""
+        with self._lock:
+            counters = [[name, list(labels), value] for (name, labels), value in self.counters.items()]
+            histograms = [[name, list(labels), dict(histogram, counts=list(histogram['counts']))]
+                          for (name, labels), histogram in self.histograms.items()]
+        return {'counters': counters + _collect(), 'histograms': histograms}
+
+
+registry = Registry()
+os.register_at_fork(after_in_child=registry.reset)
+
+
+def _collect():
+    """Contadores que llevan otros módulos, como valores absolutos de este proceso"""
+    import cache
+    import passwords
+    import ratelimit
+
+    rows = []
+    for stats in cache.all_stats():
+        labels = [['cache', stats['name']]]
+        for metric, field in (('cache_hits_total', 'hits'), ('cache_misses_total', 'misses'),
+                              ('cache_evictions_total', 'evictions'), ('cache_entries', 'entries')):
+            rows.append([metric, labels, stats[field]])
+    for key, value in ratelimit.limiter.counters.items():
+        if len(key) == 2:
+            rule, result = key
+            labels = [['rule', rule], ['scope', 'all'], ['result', result]]
+        else:
+            rule, scope, result = key
+            labels = [['rule', rule], ['scope', scope], ['result', result]]
+        rows.append(['ratelimit_requests_total', labels, value])
+    counters = passwords.hasher.counters
+    for kind in ('hash', 'verify'):
+        rows.append(['password_hash_operations_total', [['kind', kind]], counters[kind]])
+        rows.append(['password_hash_seconds_total', [['kind', kind]], counters[f'{kind}_seconds']])
+    rows.append(['password_hash_rejected_total', [], counters['rejected']])
+    return rows
+
+
+# --- Volcado y agregación entre procesos ---
+
+def flush(directory):
+    data = registry.snapshot()
+    path = os.path.join(directory, f'{registry.pid}-{registry.started}.json')
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+    registry.last_flush = time.monotonic()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _live_paths(paths):
+    """Ficheros de procesos vivos: el pid existe y es su arranque más reciente"""
+    latest = {}
+    for path in paths:
+        pid, _, started = os.path.basename(path)[:-len('.json')].partition('-')
+        try:
+            pid, started = int(pid), int(started or 0)
+        except ValueError:
+            continue
+        if started >= latest.get(pid, (-1, None))[0]:
+            latest[pid] = (started, path)
+    return {path for pid, (started, path) in latest.items() if _pid_alive(pid)}
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _accumulate(counters, histograms, snapshot, gauges=True):
+    for name, labels, value in snapshot['counters']:
+        if not gauges and HELP.get(name, ('',))[0] == 'gauge':
+            continue
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, histogram in snapshot['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        total = histograms.get(key)
+        if total is None:
+            histograms[key] = dict(histogram, counts=list(histogram['counts']))
+        else:
+            total['counts'] = [a + b for a, b in zip(total['counts'], histogram['counts'])]
+            total['sum'] += histogram['sum']
+            total['count'] += histogram['count']
+
+
+def _fold_dead(directory, archive, dead):
+    """
+    Suma los ficheros de procesos terminados al archivo y los borra. El
+    archivo anota los nombres que acaba de absorber: si el proceso muere
+    antes de borrarlos, la siguiente lectura los ignora y los borra.
+    """
+    counters, histograms = {}, {}
+    _accumulate(counters, histograms, archive, gauges=False)
+    for path in dead:
+        snapshot = _read(path)
+        if snapshot is not None:
+            _accumulate(counters, histograms, snapshot, gauges=False)
+    folded = {
+        'counters': [[name, list(map(list, labels)), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, list(map(list, labels)), histogram] for (name, labels), histogram in histograms.items()],
+        'merged': [os.path.basename(path) for path in dead]
+    }
+    path = os.path.join(directory, ARCHIVE)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(folded, f)
+    os.replace(f'{path}.tmp', path)
+    for path in dead:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return folded
+
+
+def aggregate(directory=None):
+    """
+    Suma las instantáneas de todos los procesos (o solo la de este). Los
+    contadores e histogramas de los procesos terminados se pasan al archivo
+    (archive.json) y sus ficheros se borran; los gauges solo cuentan los
+    procesos vivos.
+    """
+    counters, histograms = {}, {}
+    if not directory:
+        _accumulate(counters, histograms, registry.snapshot())
+        return counters, histograms
+
+    flush(directory)
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = _read(os.path.join(directory, ARCHIVE)) or {'counters': [], 'histograms': [], 'merged': []}
+        merged = set(archive.get('merged', ()))
+        paths = [path for path in glob.glob(os.path.join(directory, '*.json'))
+                 if os.path.basename(path) != ARCHIVE]
+        for path in paths:
+            if os.path.basename(path) in merged:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        paths = [path for path in paths if os.path.basename(path) not in merged]
+        live = _live_paths(paths)
+        dead = [path for path in paths if path not in live]
+        if dead or merged:
+            archive = _fold_dead(directory, archive, dead)
+
+        _accumulate(counters, histograms, archive, gauges=False)
+        for path in live:
+            snapshot = _read(path)
+            if snapshot is not None:
+                _accumulate(counters, histograms, snapshot)
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(counters, histograms):
+    """Formato de exposición de texto 0.0.4"""
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), histogram in histograms.items():
+        by_name.setdefault(name, []).append((labels, histogram))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, description = HELP.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+            if kind != 'histogram':
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(value['buckets'], value['counts']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {value["count"]}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(value["sum"])}')
+            lines.append(f'{name}_count{_labels(labels)} {value["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+# --- Medición de peticiones ---
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g._metrics_query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and '_metrics_query_start' in g:
+        g._metrics_db_time = g.get('_metrics_db_time', 0.0) + time.perf_counter() - g._metrics_query_start
+        g._metrics_db_queries = g.get('_metrics_db_queries', 0) + 1
+
+
+def _start_timer():
+    g._metrics_start = time.perf_counter()
+
+
+def _record(response, directory, interval):
+    start = g.pop('_metrics_start', None)
+    if start is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    labels = (('blueprint', request.blueprint or 'app'), ('endpoint', endpoint))
+
+    registry.inc('http_requests_total', labels + (('method', request.method), ('status', str(response.status_code))))
+    registry.observe('http_request_duration_seconds', labels, time.perf_counter() - start, LATENCY_BUCKETS)
+    size = response.content_length
+    if size is None and not response.is_streamed:
+        size = response.calculate_content_length()
+    if size is not None:
+        registry.observe('http_response_size_bytes', labels, size, SIZE_BUCKETS)
+    registry.observe('http_request_db_seconds', labels, g.get('_metrics_db_time', 0.0), DB_BUCKETS)
+    registry.inc('http_request_db_queries_total', labels, g.get('_metrics_db_queries', 0))
+
+    if directory and time.monotonic() - registry.last_flush >= interval:
+        try:
+            flush(directory)
+        except OSError:
+            pass
+    return response
+
+
+def init_app(app):
+    """Registrar antes que compression para medir los bytes ya comprimidos"""
+    directory = app.config.get('METRICS_DIR', os.path.join(app.instance_path, 'metrics'))
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    interval = app.config.get('METRICS_FLUSH_INTERVAL', 1)
+    allowed = set(app.config.get('METRICS_ALLOWED_IPS', ('127.0.0.1', '::1')))
+    token = app.config.get('METRICS_TOKEN')
+
+    app.before_request(_start_timer)
+    app.after_request(lambda response: _record(response, directory, interval))
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        if request.remote_addr not in allowed:
+            abort(404)
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            abort(404)
+        return Response(render(*aggregate(directory)), mimetype='text/plain; version=0.0.4')
+
+    @app.cli.command('metrics-reset')
+    def metrics_reset_command():
+        """Borra las instantáneas de métricas de todos los procesos"""
+        removed = 0
+        for path in glob.glob(os.path.join(directory, '*.json')) if directory else ():
+            os.remove(path)
+            removed += 1
+        print(f'Removed {removed} metrics snapshots.')
@@ -1,6 +1,6 @@
 from extensions import db
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+import passwords
 from datetime import datetime
 
 
@@ -8,7 +8,16 @@ from datetime import datetime
 note_sharing = db.Table('note_sharing',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
     db.Column('note_id', db.Integer, db.ForeignKey('note.id'), primary_key=True),
-    db.Column('shared_at', db.DateTime, default=datetime.utcnow)
+    db.Column('shared_at', db.DateTime, default=datetime.utcnow),
+    db.Index('ix_note_sharing_user_shared_at', 'user_id', 'shared_at')
+)
+
+# Association table for note tags. The (tag_id, note_id) index is the posting
+# list of each tag: the notes carrying it, read in order without touching note
+note_tags = db.Table('note_tags',
+    db.Column('note_id', db.Integer, db.ForeignKey('note.id'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True),
+    db.Index('ix_note_tags_tag_note', 'tag_id', 'note_id')
 )
 
 # Association table for user following relationships
@@ -33,6 +42,8 @@ class User(UserMixin, db.Model):
     date_joined = db.Column(db.DateTime, default=datetime.utcnow)
     bio = db.Column(db.Text, nullable=True)
     profile_pic = db.Column(db.String(200), nullable=True)
+    # Secreto de la URL del feed ICS (ics.py); None hasta que se genera
+    calendar_token = db.Column(db.String(64), unique=True, nullable=True)
 
     # Relationships
     notes = db.relationship('Note', backref='author', lazy=True, foreign_keys='Note.user_id')
@@ -58,27 +69,71 @@ class User(UserMixin, db.Model):
     reputation_points = db.Column(db.Integer, default=0)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """Comprueba la contraseña y, si el hash usa parámetros antiguos, lo rehace (sin commit)"""
+        if not passwords.verify_password(self.password_hash, password):
+            return False
+        if passwords.needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
     
     def follow(self, user):
         if not self.is_following(user):
             self.followed.append(user)
+            UserStats.bump(self.id, following_count=1)
+            UserStats.bump(user.id, followers_count=1)
+            UserDailyStats.bump(user.id, datetime.utcnow().date(), followers=1)
     
     def unfollow(self, user):
         if self.is_following(user):
             self.followed.remove(user)
+            UserDailyStats.bump(user.id, datetime.utcnow().date(), followers=-1)
+            UserStats.bump(self.id, following_count=-1)
+            UserStats.bump(user.id, followers_count=-1)
     
     def is_following(self, user):
         return self.followed.filter(followers.c.followed_id == user.id).count() > 0
     
+    def get_follow_status(self, user_ids):
+        """Get following / followed-by flags for many users with one query"""
+        user_ids = set(user_ids)
+        status = {user_id: {'following': False, 'followed_by': False} for user_id in user_ids}
+        if not user_ids:
+            return status
+        
+        rows = db.session.query(followers.c.follower_id, followers.c.followed_id).filter(db.or_(
+            db.and_(followers.c.follower_id == self.id, followers.c.followed_id.in_(user_ids)),
+            db.and_(followers.c.followed_id == self.id, followers.c.follower_id.in_(user_ids))
+        )).all()
+        for follower_id, followed_id in rows:
+            if follower_id == self.id and followed_id in status:
+                status[followed_id]['following'] = True
+            if followed_id == self.id and follower_id in status:
+                status[follower_id]['followed_by'] = True
+        return status
+    
+    def get_stats(self):
+        """
+        Get the materialized stats row. Reads never write: without a row
+        (registration, the migration backfill and `flask rebuild-user-stats`
+        create them) the counters are computed live and not stored.
+        """
+        if self.stats is not None:
+            return self.stats
+        if getattr(self, '_live_stats', None) is None:
+            self._live_stats = UserStats(user_id=self.id, **UserStats.live_values(self.id))
+        return self._live_stats
+    
     def get_followers_count(self):
-        return self.followers.count()
+        return self.get_stats().followers_count
     
     def get_following_count(self):
-        return self.followed.count()
+        return self.get_stats().following_count
+    
+    def get_notes_count(self):
+        return self.get_stats().note_count
     
     def get_followed_notes(self):
         """Get notes from users this user follows"""
@@ -89,19 +144,18 @@ class User(UserMixin, db.Model):
     
     def get_likes_received(self):
         """Get total likes received on user's notes"""
-        from sqlalchemy import func
-        return db.session.query(func.count(Like.id)).join(Note).filter(Note.user_id == self.id).scalar() or 0
+        return self.get_stats().likes_received
     
     def get_comments_made(self):
         """Get total comments made by user"""
-        return Comment.query.filter_by(user_id=self.id).count()
+        return self.get_stats().comments_made
     
     def calculate_reputation(self):
         """Calculate and update user reputation based on activity"""
         points = 0
         
         # Points for notes created
-        points += len(self.notes) * 10
+        points += self.get_notes_count() * 10
         
         # Points for likes received
         points += self.get_likes_received() * 5
@@ -132,7 +186,7 @@ class User(UserMixin, db.Model):
             earned = False
             
             if badge.requirement_type == 'notes_count':
-                earned = len(self.notes) >= badge.requirement_value
+                earned = self.get_notes_count() >= badge.requirement_value
             elif badge.requirement_type == 'likes_received':
                 earned = self.get_likes_received() >= badge.requirement_value
             elif badge.requirement_type == 'comments_made':
@@ -165,12 +219,195 @@ class User(UserMixin, db.Model):
             'reputation_points': self.reputation_points,
             'followers_count': self.get_followers_count(),
             'following_count': self.get_following_count(),
-            'notes_count': len(self.notes)
+            'notes_count': self.get_notes_count()
         }
     
     def __repr__(self):
         return f'<User {self.username}>'
 
+class UserStats(db.Model):
+    """
+    Contadores materializados por usuario. Los write paths los actualizan
+    con UserStats.bump() dentro de la misma transacción que el cambio, y
+    `flask rebuild-user-stats` los recalcula desde cero.
+    """
+    __tablename__ = 'user_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    note_count = db.Column(db.Integer, nullable=False, default=0)
+    public_note_count = db.Column(db.Integer, nullable=False, default=0)
+    followers_count = db.Column(db.Integer, nullable=False, default=0)
+    following_count = db.Column(db.Integer, nullable=False, default=0)
+    likes_received = db.Column(db.Integer, nullable=False, default=0)
+    comments_made = db.Column(db.Integer, nullable=False, default=0)
+    
+    user = db.relationship('User', backref=db.backref('stats', uselist=False, lazy='select'))
+    
+    COUNTERS = ('note_count', 'public_note_count', 'followers_count',
+                'following_count', 'likes_received', 'comments_made')
+    
+    @staticmethod
+    def _aggregates():
+        """Subconsultas agrupadas por usuario para cada contador"""
+        from sqlalchemy import func
+        return {
+            'note_count': db.session.query(Note.user_id.label('user_id'), func.count(Note.id).label('value'))
+                .group_by(Note.user_id),
+            'public_note_count': db.session.query(Note.user_id.label('user_id'), func.count(Note.id).label('value'))
+                .filter(Note.is_public == True).group_by(Note.user_id),
+            'followers_count': db.session.query(followers.c.followed_id.label('user_id'), func.count().label('value'))
+                .group_by(followers.c.followed_id),
+            'following_count': db.session.query(followers.c.follower_id.label('user_id'), func.count().label('value'))
+                .group_by(followers.c.follower_id),
+            'likes_received': db.session.query(Note.user_id.label('user_id'), func.count(Like.id).label('value'))
+                .join(Like, Like.note_id == Note.id).group_by(Note.user_id),
+            'comments_made': db.session.query(Comment.user_id.label('user_id'), func.count(Comment.id).label('value'))
+                .group_by(Comment.user_id),
+        }
+    
+    @classmethod
+    def live_values(cls, user_id):
+        """Counters of one user computed from live data"""
+        values = {}
+        for name, query in cls._aggregates().items():
+            subquery = query.subquery()
+            values[name] = db.session.query(subquery.c.value)\
+                .filter(subquery.c.user_id == user_id).scalar() or 0
+        return values
+    
+    @classmethod
+    def compute(cls, user_id):
+        """Build (and add to the session) the stats row for one user from live data"""
+        stats = cls(user_id=user_id, **cls.live_values(user_id))
+        db.session.add(stats)
+        db.session.flush()
+        return stats
+    
+    @classmethod
+    def bump(cls, user_id, **deltas):
+        """
+        Apply counter deltas as a single UPDATE in the current transaction,
+        e.g. UserStats.bump(note.user_id, note_count=1, public_note_count=1)
+        """
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        if db.session.get(cls, user_id) is None:
+            # Sin fila todavía: se calcula desde los datos actuales, que ya
+            # incluyen el cambio pendiente tras el flush
+            db.session.flush()
+            cls.compute(user_id)
+            return
+        db.session.query(cls).filter(cls.user_id == user_id).update(
+            {getattr(cls, name): getattr(cls, name) + delta for name, delta in deltas.items()},
+            synchronize_session='evaluate'
+        )
+    
+    @classmethod
+    def rebuild(cls):
+        """Recompute every user's stats with one grouped query per counter"""
+        user_ids = [row[0] for row in db.session.query(User.id).all()]
+        rows = {user_id: dict.fromkeys(cls.COUNTERS, 0) for user_id in user_ids}
+        for name, query in cls._aggregates().items():
+            for user_id, value in query.all():
+                if user_id in rows:
+                    rows[user_id][name] = value
+        
+        db.session.query(cls).delete(synchronize_session=False)
+        db.session.bulk_insert_mappings(cls, [
+            dict(values, user_id=user_id) for user_id, values in rows.items()
+        ])
+        db.session.commit()
+        return len(rows)
+    
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.COUNTERS}
+    
+    def __repr__(self):
+        return f'<UserStats for User {self.user_id}>'
+
+def _bump_daily(model, key, extra, deltas, floor=0):
+    """
+    Suma deltas a la fila diaria `key` (creándola si no existe) en la
+    transacción actual. Los decrementos no bajan de `floor` (cero): pueden
+    llegar para actividad anterior a las tablas de rollup. Con floor=None
+    los valores netos pueden ser negativos.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    from sqlalchemy import func
+    
+    def floored(value):
+        return value if floor is None else func.max(value, floor)
+    
+    updated = db.session.query(model).filter_by(**key).update(
+        {getattr(model, name): floored(getattr(model, name) + delta) for name, delta in deltas.items()},
+        synchronize_session=False
+    )
+    if not updated and (floor is None or any(delta > 0 for delta in deltas.values())):
+        db.session.add(model(**key, **extra, **{name: delta if floor is None else max(delta, floor)
+                                                for name, delta in deltas.items()}))
+        db.session.flush()
+
+class NoteDailyStats(db.Model):
+    """
+    Actividad diaria por nota para las estadísticas de autor (analytics.py).
+    Los likes y comentarios cuentan en el día en que se crearon, así que el
+    lote nocturno puede recalcularlos desde las filas vivas; las visitas
+    solo existen aquí.
+    """
+    __tablename__ = 'note_daily_stats'
+    
+    note_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)  # autor de la nota
+    views = db.Column(db.Integer, nullable=False, default=0)
+    likes = db.Column(db.Integer, nullable=False, default=0)
+    comments = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (db.Index('ix_note_daily_stats_user_day', 'user_id', 'day'),)
+    
+    COUNTERS = ('views', 'likes', 'comments')
+    
+    @classmethod
+    def bump(cls, note_id, user_id, day, **deltas):
+        """NoteDailyStats.bump(note.id, note.user_id, like.created_at.date(), likes=1)"""
+        _bump_daily(cls, {'note_id': note_id, 'day': day}, {'user_id': user_id}, deltas)
+
+class UserDailyStats(db.Model):
+    """
+    Seguidores netos por día: +1 el día de cada seguimiento y -1 el día en
+    que se deja de seguir (puede ser negativo). Las bajas no dejan filas de
+    origen, así que solo lo escriben follow() y unfollow(), como las visitas.
+    """
+    __tablename__ = 'user_daily_stats'
+    
+    user_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    followers = db.Column(db.Integer, nullable=False, default=0)
+    
+    @classmethod
+    def bump(cls, user_id, day, **deltas):
+        _bump_daily(cls, {'user_id': user_id, 'day': day}, {}, deltas, floor=None)
+
+class FollowSuggestion(db.Model):
+    """Top-K usuarios sugeridos por usuario, precalculados por suggestions.py"""
+    __tablename__ = 'follow_suggestion'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    suggested_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    score = db.Column(db.Float, nullable=False, default=0)
+    mutual_count = db.Column(db.Integer, nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    suggested_user = db.relationship('User', foreign_keys=[suggested_user_id])
+    
+    __table_args__ = (db.Index('ix_follow_suggestion_user_score', 'user_id', 'score'),)
+    
+    def __repr__(self):
+        return f'<FollowSuggestion {self.suggested_user_id} for User {self.user_id}>'
+
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
@@ -181,6 +418,24 @@ class Category(db.Model):
     def __repr__(self):
         return f'<Category {self.name}>'
 
+class Tag(db.Model):
+    """Etiqueta de un usuario. El nombre se guarda normalizado en minúsculas"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    name = db.Column(db.String(50), nullable=False)
+    # Número de notas con la etiqueta, mantenido de forma incremental
+    note_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # (user_id, name) también sirve de índice de prefijos para el autocompletado
+    __table_args__ = (db.UniqueConstraint('user_id', 'name', name='uq_tag_user_name'),)
+    
+    def __repr__(self):
+        return f'<Tag {self.name}>'
+    
+    def to_dict(self):
+        return {'id': self.id, 'name': self.name, 'note_count': self.note_count}
+
 class Note(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -195,11 +450,20 @@ class Note(db.Model):
     # Foreign Keys
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Id generado por el cliente al crear la nota sin conexión: reintentar el
+    # envío no la duplica
+    client_id = db.Column(db.String(64), nullable=True)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'client_id', name='uq_note_user_client'),
+    )
     
     # Relationships
     attachments = db.relationship('Attachment', backref='note', lazy=True, cascade='all, delete-orphan')
     likes = db.relationship('Like', backref='note', lazy=True, cascade='all, delete-orphan')
     comments = db.relationship('Comment', backref='note', lazy=True, cascade='all, delete-orphan')
+    tags = db.relationship('Tag', secondary=note_tags, lazy=True, order_by='Tag.name',
+                           backref=db.backref('notes', lazy='dynamic'))
     
     def __repr__(self):
         return f'<Note {self.title}>'
@@ -233,6 +497,7 @@ class Note(db.Model):
             'attachments': [{'id': a.id, 'filename': a.filename, 'file_type': a.file_type} for a in self.attachments],
             'likes_count': len(self.likes),
             'comments_count': len(self.comments),
+            'tags': [tag.name for tag in self.tags],
             'author': {
                 'id': self.author.id,
                 'username': self.author.username,
@@ -241,6 +506,55 @@ class Note(db.Model):
             'user_id': self.user_id
         }
 
+class NoteRevision(db.Model):
+    """
+    Versión de una nota tras un guardado. `data` es el contenido completo
+    (snapshot) o un delta contra la revisión anterior, comprimido con zlib;
+    ver revisions.py.
+    """
+    __tablename__ = 'note_revision'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id'), nullable=False)
+    number = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    title = db.Column(db.String(200), nullable=False)
+    is_snapshot = db.Column(db.Boolean, nullable=False, default=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    content_length = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('note_id', 'number', name='uq_note_revision_number'),)
+    
+    def __repr__(self):
+        return f'<NoteRevision {self.number} of Note {self.note_id}>'
+    
+    def to_dict(self):
+        return {
+            'number': self.number,
+            'title': self.title,
+            'is_snapshot': self.is_snapshot,
+            'content_length': self.content_length,
+            'stored_bytes': len(self.data),
+            'user_id': self.user_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class RenderedContent(db.Model):
+    """
+    HTML saneado de un contenido Markdown, indexado por el hash del texto y
+    la versión del renderizador. Notas con el mismo contenido comparten fila.
+    """
+    __tablename__ = 'rendered_content'
+    
+    content_hash = db.Column(db.String(64), primary_key=True)
+    renderer_version = db.Column(db.Integer, primary_key=True)
+    html = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<RenderedContent {self.content_hash[:12]} v{self.renderer_version}>'
+
 class Task(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -250,6 +564,21 @@ class Task(db.Model):
     priority = db.Column(db.Integer, default=1) # 1: low, 2: medium, 3: high
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Momento en que el planificador envió el recordatorio (scheduler.py)
+    reminded_at = db.Column(db.DateTime, nullable=True)
+    # Regla RRULE (recurrence.py); due_date es la primera ocurrencia
+    recurrence_rule = db.Column(db.String(200), nullable=True)
+    
+    occurrence_exceptions = db.relationship('TaskOccurrence', backref='task', lazy='dynamic',
+                                            cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        # Carga del heap del planificador y marcado de vencidas
+        db.Index('ix_task_status_due', 'status', 'due_date'),
+        # APIs filtradas por usuario: próximas, vencidas, por prioridad
+        db.Index('ix_task_user_status_due', 'user_id', 'status', 'due_date'),
+        db.Index('ix_task_user_priority_due', 'user_id', 'priority', 'due_date'),
+    )
     
     def to_dict(self):
         return {
@@ -259,9 +588,52 @@ class Task(db.Model):
             'due_date': self.due_date.isoformat() if self.due_date else None,
             'status': self.status,
             'priority': self.priority,
+            'recurrence_rule': self.recurrence_rule,
             'created_at': self.created_at.isoformat()
         }
 
+class ChangeLog(db.Model):
+    """Alta, modificación o baja de una entidad; el id es la secuencia (changelog.py)"""
+    __tablename__ = 'change_log'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    entity = db.Column(db.String(20), nullable=False)  # note, task, comment, like, follow, follower
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)  # insert, update, delete
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_change_log_user_seq', 'user_id', 'id'),
+        # Los ids no se reutilizan aunque se borren las filas más recientes
+        {'sqlite_autoincrement': True},
+    )
+    
+    def to_dict(self):
+        return {
+            'seq': self.id,
+            'entity': self.entity,
+            'id': self.entity_id,
+            'op': self.op,
+            'at': self.created_at.isoformat()
+        }
+
+class ChangeLogHorizon(db.Model):
+    """Última secuencia borrada por la retención: cursores anteriores deben resincronizar"""
+    __tablename__ = 'change_log_horizon'
+    
+    user_id = db.Column(db.Integer, primary_key=True)
+    sequence = db.Column(db.Integer, nullable=False, default=0)
+
+class TaskOccurrence(db.Model):
+    """Excepción de una ocurrencia de tarea recurrente (completada u omitida)"""
+    __tablename__ = 'task_occurrence'
+    
+    task_id = db.Column(db.Integer, db.ForeignKey('task.id'), primary_key=True)
+    occurrence = db.Column(db.DateTime, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='completed')  # completed, skipped
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Attachment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(200), nullable=False)
@@ -0,0 +1,149 @@
+# passwords.py
+"""
+Hash de contraseñas fuera del hilo de la petición.
+
+Los hashes (scrypt/pbkdf2 de werkzeug) cuestan decenas de milisegundos de
+CPU a propósito. Se ejecutan en un pool acotado (PASSWORD_HASH_WORKERS
+hilos; hashlib suelta el GIL mientras calcula) con un máximo de trabajos en
+espera (PASSWORD_HASH_QUEUE): durante una avalancha de logins el resto de
+la aplicación sigue teniendo CPU, y las peticiones que no caben en la cola
+reciben HashingBusy en vez de acumularse.
+
+PASSWORD_HASH_METHOD fija el método y sus parámetros ('scrypt',
+'pbkdf2:sha256:600000'...). Si cambian, los hashes antiguos se siguen
+aceptando y se rehacen con los nuevos en el siguiente login correcto
+(`needs_rehash`). `flask hash-timings` mide lo que cuesta cada método.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'scrypt'
+TIMING_METHODS = ('scrypt', 'scrypt:16384:8:1', 'pbkdf2:sha256:600000', 'pbkdf2:sha256:260000')
+
+
+class HashingBusy(Exception):
+    """La cola de hashes está llena"""
+
+
+class PasswordHasher:
+    def __init__(self, method=DEFAULT_METHOD, workers=2, queue_size=16, wait=5):
+        self.method = method
+        self.wait = wait
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._prefix = None
+        self._dummy_hash = None
+        self._lock = threading.Lock()
+        self.counters = {'hash': 0, 'verify': 0, 'rejected': 0, 'hash_seconds': 0.0, 'verify_seconds': 0.0}
+
+    def _run(self, kind, function, *args):
+        if not self._slots.acquire(timeout=self.wait):
+            self.counters['rejected'] += 1
+            raise HashingBusy()
+        try:
+            future = self._executor.submit(self._timed, kind, function, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def _timed(self, kind, function, *args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            with self._lock:
+                self.counters[kind] += 1
+                self.counters[f'{kind}_seconds'] += time.perf_counter() - start
+
+    def hash(self, password):
+        return self._run('hash', generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run('verify', check_password_hash, password_hash, password)
+
+    def verify_missing(self, password):
+        """Mismo coste que verify() para un usuario que no existe (no delata cuáles existen)"""
+        if self._dummy_hash is None:
+            self._dummy_hash = self.hash('')
+        self.verify(self._dummy_hash, password)
+        return False
+
+    def prefix(self):
+        """'método:parámetros' completo de los hashes nuevos (p. ej. 'scrypt:32768:8:1')"""
+        if self._prefix is None:
+            self._prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return self._prefix
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.prefix()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            'method': self.prefix(),
+            'hashes': counters['hash'],
+            'verifications': counters['verify'],
+            'rejected': counters['rejected'],
+            'avg_hash_ms': round(counters['hash_seconds'] / counters['hash'] * 1000, 2) if counters['hash'] else None,
+            'avg_verify_ms': round(counters['verify_seconds'] / counters['verify'] * 1000, 2)
+            if counters['verify'] else None
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+hasher = PasswordHasher()
+
+
+def hash_password(password):
+    return hasher.hash(password)
+
+
+def verify_password(password_hash, password):
+    return hasher.verify(password_hash, password)
+
+
+def verify_missing(password):
+    return hasher.verify_missing(password)
+
+
+def needs_rehash(password_hash):
+    return hasher.needs_rehash(password_hash)
+
+
+def timings(methods=TIMING_METHODS, rounds=3):
+    """[(método, ms por hash)] midiendo en este hilo, sin pasar por el pool"""
+    results = []
+    for method in methods:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            generate_password_hash('benchmark-password', method)
+        results.append((method, (time.perf_counter() - start) / rounds * 1000))
+    return results
+
+
+def init_app(app):
+    global hasher
+    hasher.shutdown()
+    hasher = PasswordHasher(
+        method=app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+        queue_size=app.config.get('PASSWORD_HASH_QUEUE', 16),
+        wait=app.config.get('PASSWORD_HASH_WAIT', 5)
+    )
+
+    @app.cli.command('hash-timings')
+    def hash_timings_command():
+        """Tiempo por hash de los métodos de contraseña disponibles"""
+        configured = hasher.prefix()
+        methods = list(dict.fromkeys([hasher.method, *TIMING_METHODS]))
+        for method, ms in timings(methods):
+            marker = ' (configured)' if generate_password_hash('', method).split('$', 1)[0] == configured else ''
+            print(f'{method:28} {ms:8.1f} ms{marker}')
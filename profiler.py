@@ -0,0 +1,289 @@
+# profiler.py
+"""
+Perfilado por muestreo y captura de peticiones lentas.
+
+Durante cada petición se anotan las consultas SQL (sentencia y duración) y
+el tiempo de cada plantilla renderizada; cuesta un append por consulta.
+Además, las peticiones perfiladas registran pilas de llamadas: un hilo
+muestreador lee sys._current_frames() cada PROFILER_INTERVAL_MS y cuenta
+la pila del hilo de la petición (formato "collapsed" de los flame graphs),
+sin instrumentar cada llamada como cProfile. Se perfila una petición:
+
+- con ?_profile=1, si el usuario está en PROFILER_USERS (en modo debug,
+  cualquier usuario autenticado); la respuesta lleva X-Profile-Id;
+- al azar, con probabilidad PROFILER_SAMPLE_RATE (siempre activo, 1 %).
+
+Se guardan las perfiladas con ?_profile=1 y cualquier petición que supere
+PROFILER_SLOW_MS, como un JSON por petición en PROFILER_DIR. El almacén
+rota: conserva los PROFILER_MAX_FILES más recientes. /profiler lista las
+más lentas y /profiler/<id> muestra el detalle.
+"""
+import glob
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app, g, request, has_request_context, render_template, abort, before_render_template, template_rendered
+from flask_login import current_user, login_required
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+MAX_QUERIES = 500
+MAX_STACK_DEPTH = 80
+TOP_STACKS = 50
+TOP_FUNCTIONS = 30
+RECORD_ID = re.compile(r'^[0-9]+-[0-9]+-[0-9]+$')
+
+
+class StackSampler:
+    """Hilo que cuenta las pilas de los hilos registrados cada `interval` segundos"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, thread_id):
+        stacks = Counter()
+        with self._lock:
+            self._active[thread_id] = stacks
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return stacks
+
+    def remove(self, thread_id):
+        with self._lock:
+            self._active.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                active = dict(self._active)
+                if not active:
+                    self._wake.clear()
+            if not active:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            for thread_id, stacks in active.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stacks[_collapse(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class ProfileStore:
+    """Un JSON por petición; se borran los más antiguos al pasar de max_files"""
+
+    def __init__(self, directory, max_files=200):
+        self.directory = directory
+        self.max_files = max_files
+        self._seq = itertools.count(1)
+
+    def save(self, record):
+        os.makedirs(self.directory, exist_ok=True)
+        record_id = f'{int(time.time() * 1000)}-{os.getpid()}-{next(self._seq)}'
+        record['id'] = record_id
+        path = os.path.join(self.directory, f'{record_id}.json')
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(record, f)
+        os.replace(f'{path}.tmp', path)
+        self._rotate()
+        return record_id
+
+    def _paths(self):
+        # El nombre empieza por la marca de tiempo en ms: orden cronológico
+        return sorted(glob.glob(os.path.join(self.directory, '*.json')),
+                      key=lambda path: int(os.path.basename(path).split('-', 1)[0]))
+
+    def _rotate(self):
+        paths = self._paths()
+        for path in paths[:max(0, len(paths) - self.max_files)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, record_id):
+        if not RECORD_ID.match(record_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, f'{record_id}.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def slowest(self, limit=50):
+        records = []
+        for path in self._paths():
+            try:
+                with open(path) as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for key in ('sql', 'templates', 'stacks', 'functions'):
+                record.pop(key, None)
+            records.append(record)
+        return sorted(records, key=lambda record: record['duration_ms'], reverse=True)[:limit]
+
+
+# --- Captura durante la petición ---
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_profile_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('_profile_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    profile = g.get('_profile') if has_request_context() else None
+    if profile is None:
+        return
+    profile['query_count'] += 1
+    profile['db_seconds'] += elapsed
+    if len(profile['sql']) < MAX_QUERIES:
+        profile['sql'].append({'statement': statement[:2000], 'ms': round(elapsed * 1000, 3)})
+
+
+def _before_render(sender, template, context, **extra):
+    profile = g.get('_profile')
+    if profile is not None:
+        profile['render_stack'].append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    profile = g.get('_profile')
+    if profile is not None and profile['render_stack']:
+        elapsed = time.perf_counter() - profile['render_stack'].pop()
+        profile['templates'].append({'name': template.name, 'ms': round(elapsed * 1000, 3)})
+
+
+def _top_functions(stacks):
+    """Muestras por función: inclusivas (en la pila) y propias (en la hoja)"""
+    inclusive, own = Counter(), Counter()
+    for stack, count in stacks.items():
+        frames = [frame.rsplit(':', 1)[0] for frame in stack.split(';')]
+        for function in set(frames):
+            inclusive[function] += count
+        own[frames[-1]] += count
+    return [{'function': function, 'samples': samples, 'own': own[function]}
+            for function, samples in inclusive.most_common(TOP_FUNCTIONS)]
+
+
+class Profiler:
+    def __init__(self, app):
+        self.sample_rate = app.config.get('PROFILER_SAMPLE_RATE', 0.01)
+        self.slow_ms = app.config.get('PROFILER_SLOW_MS', 500)
+        self.users = set(app.config.get('PROFILER_USERS', ()))
+        self.sampler = StackSampler(app.config.get('PROFILER_INTERVAL_MS', 5) / 1000)
+        self.store = ProfileStore(app.config.get('PROFILER_DIR', os.path.join(app.instance_path, 'profiles')),
+                                  app.config.get('PROFILER_MAX_FILES', 200))
+
+    def authorized(self):
+        if not current_user.is_authenticated:
+            return False
+        return current_app.debug or current_user.username in self.users
+
+    def start(self):
+        explicit = request.args.get('_profile') == '1' and self.authorized()
+        sampled = not explicit and random.random() < self.sample_rate
+        profile = g._profile = {
+            'mode': 'explicit' if explicit else 'sampled' if sampled else None,
+            'start': time.perf_counter(),
+            'sql': [], 'query_count': 0, 'db_seconds': 0.0,
+            'templates': [], 'render_stack': [],
+            'thread_id': threading.get_ident(), 'stacks': None
+        }
+        if explicit or sampled:
+            profile['stacks'] = self.sampler.add(profile['thread_id'])
+
+    def finish(self, response):
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return response
+        if profile['stacks'] is not None:
+            self.sampler.remove(profile['thread_id'])
+        duration_ms = (time.perf_counter() - profile['start']) * 1000
+        if profile['mode'] != 'explicit' and duration_ms < self.slow_ms:
+            return response
+
+        stacks = profile['stacks'] or Counter()
+        record = {
+            'created_at': datetime.utcnow().isoformat(),
+            'mode': profile['mode'] or 'slow',
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'user_id': current_user.id if current_user.is_authenticated else None,
+            'duration_ms': round(duration_ms, 2),
+            'db_ms': round(profile['db_seconds'] * 1000, 2),
+            'query_count': profile['query_count'],
+            'template_ms': round(sum(item['ms'] for item in profile['templates']), 2),
+            'samples': sum(stacks.values()),
+            'sample_interval_ms': self.sampler.interval * 1000,
+            'sql': profile['sql'],
+            'templates': profile['templates'],
+            'stacks': [[stack, count] for stack, count in stacks.most_common(TOP_STACKS)],
+            'functions': _top_functions(stacks)
+        }
+        try:
+            record_id = self.store.save(record)
+        except OSError:
+            return response
+        if profile['mode'] == 'explicit':
+            response.headers['X-Profile-Id'] = record_id
+        return response
+
+
+def init_app(app):
+    if not app.config.get('PROFILER_ENABLED', True):
+        return
+    profiler = Profiler(app)
+    app.before_request(profiler.start)
+    app.after_request(profiler.finish)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+    @app.route('/profiler')
+    @login_required
+    def profiler_list():
+        if not profiler.authorized():
+            abort(404)
+        return render_template('profiler/list.html', records=profiler.store.slowest(),
+                               slow_ms=profiler.slow_ms, sample_rate=profiler.sample_rate)
+
+    @app.route('/profiler/<record_id>')
+    @login_required
+    def profiler_detail(record_id):
+        if not profiler.authorized():
+            abort(404)
+        record = profiler.store.get(record_id)
+        if record is None:
+            abort(404)
+        return render_template('profiler/detail.html', record=record)
@@ -0,0 +1,250 @@
+# ratelimit.py
+"""
+Limitación de peticiones con token buckets, por usuario y por IP.
+
+Cada regla ('like', 'comment', 'follow', 'login') tiene un bucket por
+usuario y otro por IP: capacidad de ráfaga y periodo en el que se rellena
+entero. El relleno es perezoso (se calcula al consultar a partir del último
+momento guardado), así que no hay temporizadores y una decisión son unas
+pocas operaciones aritméticas bajo un lock.
+
+Almacenamiento (RATE_LIMIT_STORAGE):
+- 'memory' (por defecto): dict por proceso. Con varios workers cada uno
+  lleva su cuenta y el límite efectivo se multiplica por su número.
+- 'sqlite:///ratelimit.db': fichero SQLite compartido entre workers (ruta
+  relativa a la carpeta instance). Es una base aparte para no competir por
+  el lock de escritura de notes.db; cada decisión es una transacción corta
+  (BEGIN IMMEDIATE).
+
+Una petición solo gasta tokens si todos sus buckets lo permiten: la que
+rechaza el bucket de usuario no consume también el de su IP.
+
+Las vistas se marcan con @rate_limit('regla'); al superar el límite se
+responde 429 con Retry-After. Los contadores de permitidas/rechazadas se
+ven en /api/ratelimit/stats. La IP es request.remote_addr: detrás de un
+proxy hay que aplicar ProxyFix para que sea la del cliente.
+"""
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from flask import request, jsonify, flash, render_template
+from flask_login import current_user
+
+logger = logging.getLogger(__name__)
+
+# regla -> {ámbito: (capacidad, segundos para rellenarla entera)}
+DEFAULT_LIMITS = {
+    'like': {'user': (60, 60), 'ip': (300, 60)},
+    'comment': {'user': (10, 60), 'ip': (60, 60)},
+    'follow': {'user': (30, 60), 'ip': (120, 60)},
+    # En login el "usuario" es (IP, nombre enviado): nadie puede bloquear
+    # desde su IP el acceso de otra persona a su cuenta
+    'login': {'user': (5, 300), 'ip': (20, 60)}
+}
+MAX_MEMORY_KEYS = 100000
+PRUNE_EVERY = 1000
+
+
+def _waits(state):
+    """Segundos hasta el siguiente token de cada (key, tokens, rate)"""
+    return [0 if tokens >= 1 else (1 - tokens) / rate for _, tokens, rate in state]
+
+
+class MemoryBackend:
+    """Buckets en un dict del proceso: key -> (tokens, último momento)"""
+
+    def __init__(self, max_keys=MAX_MEMORY_KEYS):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, buckets):
+        """
+        buckets: [(key, capacity, period)]. Devuelve los segundos de espera
+        de cada uno; solo se descuenta un token si todos son 0.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = []
+            for key, capacity, period in buckets:
+                tokens, last = self._buckets.get(key, (capacity, now))
+                state.append((key, min(capacity, tokens + (now - last) * capacity / period), capacity / period))
+            waits = _waits(state)
+            for key, tokens, _ in state:
+                self._buckets[key] = (tokens if any(waits) else tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now, max(period for _, _, period in buckets))
+        return waits
+
+    def _prune(self, now, period):
+        # Un bucket sin tocar durante un periodo está lleno: equivale a no tenerlo
+        for key in [key for key, (_, last) in self._buckets.items() if now - last >= period]:
+            del self._buckets[key]
+        while len(self._buckets) > self.max_keys:
+            del self._buckets[next(iter(self._buckets))]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBackend:
+    """Buckets en una tabla SQLite compartida por todos los workers"""
+
+    UPSERT = '''
+        INSERT INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)
+        ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated
+    '''
+
+    def __init__(self, path, max_period=300):
+        self.path = path
+        self.max_period = max_period
+        self._local = threading.local()
+        self._decisions = 0
+        with self._connection() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS rate_buckets ('
+                               'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL'
+                               ') WITHOUT ROWID')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def consume(self, buckets):
+        now = time.time()
+        connection = self._connection()
+        # BEGIN IMMEDIATE: ningún otro worker cambia los buckets entre la lectura y el descuento
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            state = []
+            for key, capacity, period in buckets:
+                row = connection.execute('SELECT tokens, updated FROM rate_buckets WHERE key = ?',
+                                         (key,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * capacity / period)
+                state.append((key, tokens, capacity / period))
+            waits = _waits(state)
+            if not any(waits):
+                connection.executemany(self.UPSERT, [(key, tokens - 1, now) for key, tokens, _ in state])
+            self._decisions += 1
+            if self._decisions % PRUNE_EVERY == 0:
+                connection.execute('DELETE FROM rate_buckets WHERE updated < ?', (now - self.max_period,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return waits
+
+    def clear(self):
+        self._connection().execute('DELETE FROM rate_buckets')
+
+
+class RateLimiter:
+    def __init__(self, limits=None, backend=None):
+        self.limits = {rule: dict(scopes) for rule, scopes in (limits or DEFAULT_LIMITS).items()}
+        self.backend = backend or MemoryBackend()
+        self.enabled = True
+        self.counters = Counter()
+
+    def hit(self, rule, identities):
+        """
+        Consume un token de cada bucket de la regla ({ámbito: identidad}),
+        o de ninguno si alguno está vacío. Devuelve 0 si se permite o los
+        segundos que hay que esperar.
+        """
+        if not self.enabled:
+            return 0
+        scopes, buckets = [], []
+        for scope, identity in identities.items():
+            limit = self.limits.get(rule, {}).get(scope)
+            if limit is None or identity is None:
+                continue
+            scopes.append((scope, identity))
+            buckets.append((f'{rule}:{scope}:{identity}', *limit))
+        waits = self.backend.consume(buckets) if buckets else []
+        if any(waits):
+            for (scope, identity), wait in zip(scopes, waits):
+                if wait:
+                    self.counters[(rule, scope, 'rejected')] += 1
+                    logger.info('Rate limit %s/%s exceeded by %s', rule, scope, identity)
+            return max(waits)
+        self.counters[(rule, 'allowed')] += 1
+        return 0
+
+    def stats(self):
+        stats = {}
+        for rule, scopes in self.limits.items():
+            stats[rule] = {
+                'allowed': self.counters[(rule, 'allowed')],
+                'rejected': {scope: self.counters[(rule, scope, 'rejected')] for scope in scopes},
+                'limits': {scope: {'capacity': capacity, 'period': period}
+                           for scope, (capacity, period) in scopes.items()}
+            }
+        return stats
+
+
+limiter = RateLimiter()
+
+
+def _current_user_id():
+    return current_user.id if current_user.is_authenticated else None
+
+
+def _too_many(retry_after, template=None):
+    seconds = max(1, math.ceil(retry_after))
+    message = f'Demasiadas peticiones. Inténtalo de nuevo en {seconds} s.'
+    if template is not None:
+        flash(message, 'error')
+        response = render_template(template), 429
+    else:
+        response = jsonify({'error': message, 'retry_after': seconds}), 429
+    return response + ({'Retry-After': str(seconds)},)
+
+
+def rate_limit(rule, methods=None, user_key=_current_user_id, template=None):
+    """
+    Aplica la regla a la vista (solo a `methods` si se indica). user_key da
+    la identidad del bucket por usuario; con `template` el 429 se muestra
+    como esa página con un flash en lugar de JSON.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if methods is None or request.method in methods:
+                retry_after = limiter.hit(rule, {'ip': request.remote_addr, 'user': user_key()})
+                if retry_after:
+                    return _too_many(retry_after, template)
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def _backend_from_config(app):
+    storage = app.config.get('RATE_LIMIT_STORAGE', 'memory')
+    if storage == 'memory':
+        return MemoryBackend()
+    if storage.startswith('sqlite:///'):
+        path = storage[len('sqlite:///'):]
+        if not os.path.isabs(path):
+            os.makedirs(app.instance_path, exist_ok=True)
+            path = os.path.join(app.instance_path, path)
+        max_period = max(period for scopes in limiter.limits.values() for _, period in scopes.values())
+        return SQLiteBackend(path, max_period=max_period)
+    raise ValueError(f'Unsupported RATE_LIMIT_STORAGE: {storage}')
+
+
+def init_app(app):
+    for rule, scopes in app.config.get('RATE_LIMITS', {}).items():
+        limiter.limits.setdefault(rule, {}).update(scopes)
+    limiter.enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+    limiter.backend = _backend_from_config(app)
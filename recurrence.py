@@ -0,0 +1,202 @@
+# recurrence.py
+"""
+Tareas recurrentes con reglas estilo RRULE (subconjunto de RFC 5545).
+
+Task.recurrence_rule guarda la regla ('FREQ=WEEKLY;BYDAY=MO,WE') y
+Task.due_date hace de DTSTART. Las ocurrencias no se guardan como filas:
+`expand()` las genera solo dentro de la ventana pedida y, en reglas diarias
+y semanales, salta directamente al primer periodo de la ventana. Las
+ocurrencias completadas u omitidas se guardan aparte (TaskOccurrence), una
+fila por excepción.
+
+Las expansiones se memorizan en cache.occurrence_cache; la clave incluye la
+regla, el inicio y la ventana, así que editar una tarea no necesita
+invalidar nada.
+
+Soportado: FREQ=DAILY|WEEKLY|MONTHLY|YEARLY, INTERVAL, COUNT, UNTIL y BYDAY
+(solo con WEEKLY).
+
+Task.due_date es hora local sin zona (la que envía el <input
+type="datetime-local"> del formulario), no UTC: las ocurrencias y UNTIL
+también lo son. Para saber si una tarea ya venció se compara con
+local_now(), la hora local del servidor, nunca con utcnow().
+"""
+import calendar
+from datetime import datetime, timedelta
+
+from cache import occurrence_cache
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+RULE_KEYS = {'FREQ', 'INTERVAL', 'COUNT', 'UNTIL', 'BYDAY'}
+MAX_OCCURRENCES = 1000
+
+# Opciones del formulario de tareas
+PRESETS = {
+    'daily': 'FREQ=DAILY',
+    'weekdays': 'FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR',
+    'weekly': 'FREQ=WEEKLY',
+    'monthly': 'FREQ=MONTHLY',
+    'yearly': 'FREQ=YEARLY'
+}
+
+
+def local_now():
+    """Hora local del servidor sin zona, el mismo reloj que Task.due_date"""
+    return datetime.now()
+
+
+def _parse_until(value):
+    for fmt in ('%Y%m%dT%H%M%SZ', '%Y%m%dT%H%M%S'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    # Solo fecha: incluye todo ese día
+    return datetime.strptime(value, '%Y%m%d') + timedelta(days=1, microseconds=-1)
+
+
+def parse_rule(rule):
+    """'FREQ=WEEKLY;BYDAY=MO' -> dict. ValueError si la regla no es válida."""
+    parts = {}
+    for item in (rule or '').upper().replace('RRULE:', '').split(';'):
+        if not item.strip():
+            continue
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f'Invalid rule part: {item}')
+        parts[key.strip()] = value.strip()
+
+    freq = parts.get('FREQ')
+    if freq not in FREQUENCIES:
+        raise ValueError(f'FREQ must be one of: {", ".join(FREQUENCIES)}')
+    unknown = set(parts) - RULE_KEYS
+    if unknown:
+        raise ValueError(f'Unsupported rule parts: {", ".join(sorted(unknown))}')
+
+    interval = int(parts.get('INTERVAL', 1))
+    count = int(parts['COUNT']) if 'COUNT' in parts else None
+    if interval < 1 or (count is not None and count < 1):
+        raise ValueError('INTERVAL and COUNT must be positive')
+    until = _parse_until(parts['UNTIL']) if 'UNTIL' in parts else None
+
+    byday = None
+    if 'BYDAY' in parts:
+        if freq != 'WEEKLY':
+            raise ValueError('BYDAY is only supported with FREQ=WEEKLY')
+        byday = sorted({WEEKDAYS.index(day) for day in parts['BYDAY'].split(',')})
+
+    return {'freq': freq, 'interval': interval, 'count': count, 'until': until, 'byday': byday}
+
+
+def normalize_rule(rule):
+    """Forma canónica para guardar (valida la regla)"""
+    parsed = parse_rule(rule)
+    parts = [f"FREQ={parsed['freq']}"]
+    if parsed['interval'] != 1:
+        parts.append(f"INTERVAL={parsed['interval']}")
+    if parsed['byday']:
+        parts.append('BYDAY=' + ','.join(WEEKDAYS[day] for day in parsed['byday']))
+    if parsed['count']:
+        parts.append(f"COUNT={parsed['count']}")
+    if parsed['until']:
+        parts.append(f"UNTIL={parsed['until'].strftime('%Y%m%dT%H%M%S')}")
+    return ';'.join(parts)
+
+
+def _shift_months(dt, months):
+    """(ocurrencia o None si el mes no tiene ese día, primer día del mes)"""
+    index = dt.month - 1 + months
+    year, month = dt.year + index // 12, index % 12 + 1
+    period = datetime(year, month, 1)
+    if dt.day > calendar.monthrange(year, month)[1]:
+        return None, period
+    return dt.replace(year=year, month=month), period
+
+
+def _candidates(rule, dtstart, window_start):
+    """
+    (índice, ocurrencia o None, inicio del periodo) en orden. El índice es
+    la posición desde dtstart, necesaria para COUNT.
+    """
+    freq, interval = rule['freq'], rule['interval']
+
+    if freq == 'DAILY':
+        step = timedelta(days=interval)
+        k = max(0, (window_start - dtstart) // step)
+        while True:
+            when = dtstart + k * step
+            yield k, when, when
+            k += 1
+
+    elif freq == 'WEEKLY':
+        days = rule['byday'] or [dtstart.weekday()]
+        first_week = [day for day in days if day >= dtstart.weekday()]
+        week_start = dtstart - timedelta(days=dtstart.weekday())
+        step = timedelta(weeks=interval)
+        p = max(0, (window_start - week_start) // step)
+        index = 0 if p == 0 else len(first_week) + (p - 1) * len(days)
+        while True:
+            for day in (first_week if p == 0 else days):
+                when = week_start + p * step + timedelta(days=day)
+                yield index, when, when
+                index += 1
+            p += 1
+
+    else:
+        months = interval * (12 if freq == 'YEARLY' else 1)
+        p = 0
+        # Sin COUNT no hace falta contar las ocurrencias anteriores a la ventana
+        if rule['count'] is None and window_start > dtstart:
+            elapsed = (window_start.year - dtstart.year) * 12 + window_start.month - dtstart.month
+            p = max(0, elapsed // months - 1)
+        index = 0
+        while True:
+            when, period = _shift_months(dtstart, p * months)
+            yield index, when, period
+            if when is not None:
+                index += 1
+            p += 1
+
+
+def expand(rule, dtstart, window_start, window_end):
+    """Ocurrencias de la regla en [window_start, window_end), memorizadas"""
+    key = ('occurrences', rule, dtstart, window_start, window_end)
+    cached = occurrence_cache.get(key)
+    if cached is not None:
+        return cached
+
+    parsed = parse_rule(rule)
+    occurrences = []
+    for index, when, period in _candidates(parsed, dtstart, window_start):
+        if period >= window_end or (parsed['count'] is not None and index >= parsed['count']):
+            break
+        if when is None or when < window_start or when >= window_end:
+            continue
+        if parsed['until'] is not None and when > parsed['until']:
+            break
+        occurrences.append(when)
+        if len(occurrences) >= MAX_OCCURRENCES:
+            break
+
+    occurrence_cache.set(key, occurrences)
+    return occurrences
+
+
+def is_occurrence(rule, dtstart, when):
+    return when in expand(rule, dtstart, when, when + timedelta(seconds=1))
+
+
+def describe(rule):
+    """Texto corto para la lista de tareas"""
+    try:
+        parsed = parse_rule(rule)
+    except ValueError:
+        return rule
+    if parsed['byday'] == [0, 1, 2, 3, 4]:
+        return 'Días laborables'
+    names = {'DAILY': 'Diaria', 'WEEKLY': 'Semanal', 'MONTHLY': 'Mensual', 'YEARLY': 'Anual'}
+    label = names[parsed['freq']]
+    if parsed['interval'] > 1:
+        label += f" (cada {parsed['interval']})"
+    return label
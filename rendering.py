@@ -0,0 +1,141 @@
+# rendering.py
+"""
+Renderizado del contenido de las notas (Markdown) a HTML saneado.
+
+- `render_markdown()`: Markdown con tablas y bloques de código resaltados
+  con Pygments, limpiado con bleach.
+- `rendered_html()`: el HTML se calcula una sola vez por contenido. Se
+  busca por hash del texto y versión del renderizador en la caché de
+  fragmentos del proceso y después en la tabla rendered_content; si no está
+  se renderiza y se guarda (al guardar la nota o en la primera vista).
+- `rerender_all()`: tras subir RENDERER_VERSION renderiza en un pool de
+  procesos los contenidos que falten y borra las filas obsoletas.
+"""
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import bleach
+import markdown
+from bleach.linkifier import LinkifyFilter
+from markupsafe import Markup
+from sqlalchemy.dialects.sqlite import insert
+
+from extensions import db
+from models import Note, RenderedContent
+from cache import fragment_cache
+
+# Subir al cambiar extensiones, estilos o reglas de saneado
+RENDERER_VERSION = 1
+CHUNK_SIZE = 50
+
+MARKDOWN_EXTENSIONS = ['fenced_code', 'codehilite', 'tables', 'sane_lists', 'nl2br']
+MARKDOWN_CONFIG = {
+    'codehilite': {'css_class': 'highlight', 'guess_lang': False},
+    'tables': {'use_align_attribute': True}
+}
+
+ALLOWED_TAGS = {
+    'p', 'br', 'hr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'strong', 'em', 'b', 'i', 'del',
+    'blockquote', 'ul', 'ol', 'li', 'a', 'img', 'code', 'pre', 'span', 'div',
+    'table', 'thead', 'tbody', 'tr', 'th', 'td'
+}
+ALLOWED_ATTRIBUTES = {
+    'a': ['href', 'title', 'rel'],
+    'img': ['src', 'alt', 'title'],
+    'span': ['class'],
+    'div': ['class'],
+    'code': ['class'],
+    'th': ['align'],
+    'td': ['align']
+}
+ALLOWED_PROTOCOLS = {'http', 'https', 'mailto'}
+
+# Saneado y enlaces automáticos en una sola pasada (fuera de los bloques de código)
+_cleaner = bleach.Cleaner(
+    tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, protocols=ALLOWED_PROTOCOLS, strip=True,
+    filters=[partial(LinkifyFilter, skip_tags=['pre'])]
+)
+
+
+def content_hash(text):
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+def render_markdown(text):
+    html = markdown.markdown(text or '', extensions=MARKDOWN_EXTENSIONS,
+                             extension_configs=MARKDOWN_CONFIG)
+    return _cleaner.clean(html)
+
+
+def _store(digest, version, html):
+    """
+    Guarda el HTML sin hacer commit; si otra petición se adelantó no pasa
+    nada. INSERT OR IGNORE en la transacción de la petición, sin savepoint
+    (pysqlite no abre la transacción al hacer SAVEPOINT).
+    """
+    db.session.execute(
+        insert(RenderedContent).values(content_hash=digest, renderer_version=version, html=html)
+        .on_conflict_do_nothing()
+    )
+
+
+def rendered_html(text):
+    """HTML saneado de un contenido, renderizado una sola vez por hash y versión"""
+    digest = content_hash(text)
+    version = RENDERER_VERSION
+    key = ('markdown', digest, version)
+
+    html = fragment_cache.get(key)
+    if html is None:
+        row = db.session.get(RenderedContent, (digest, version))
+        if row is not None:
+            html = row.html
+        else:
+            html = render_markdown(text)
+            _store(digest, version, html)
+        fragment_cache.set(key, html)
+    return Markup(html)
+
+
+def _render_chunk(items):
+    return [(digest, render_markdown(text)) for digest, text in items]
+
+
+def rerender_all(workers=1):
+    """
+    Renderiza los contenidos de todas las notas que no tengan HTML de la
+    versión actual y borra el de versiones anteriores o contenidos que ya
+    no usa ninguna nota. Devuelve (renderizados, borrados).
+    """
+    version = RENDERER_VERSION
+    existing = {row[0] for row in db.session.query(RenderedContent.content_hash)
+                .filter(RenderedContent.renderer_version == version)}
+
+    used = set()
+    missing = {}
+    for (content,) in db.session.query(Note.content).yield_per(500):
+        digest = content_hash(content)
+        used.add(digest)
+        if digest not in existing:
+            missing[digest] = content
+
+    items = list(missing.items())
+    chunks = [items[i:i + CHUNK_SIZE] for i in range(0, len(items), CHUNK_SIZE)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_render_chunk, chunks))
+    else:
+        results = map(_render_chunk, chunks)
+    for rendered in results:
+        db.session.add_all([RenderedContent(content_hash=digest, renderer_version=version, html=html)
+                            for digest, html in rendered])
+
+    stale = [(digest, row_version) for digest, row_version in
+             db.session.query(RenderedContent.content_hash, RenderedContent.renderer_version)
+             if row_version != version or digest not in used]
+    for digest, row_version in stale:
+        RenderedContent.query.filter_by(content_hash=digest, renderer_version=row_version)\
+            .delete(synchronize_session=False)
+    db.session.commit()
+    return len(items), len(stale)
@@ -0,0 +1,310 @@
+# revisions.py
+"""
+Historial de revisiones de notas guardado como deltas comprimidos.
+
+Cada guardado añade una NoteRevision con el estado resultante. En lugar de
+copiar la nota entera se guarda un delta por líneas contra la revisión
+anterior: rangos [i, j] de líneas que se copian de la base y texto nuevo
+insertado, serializado en JSON y comprimido con zlib. Cada SNAPSHOT_INTERVAL
+revisiones (o cuando el delta no ahorra espacio) se guarda el contenido
+completo, así que reconstruir cualquier revisión aplica como mucho
+SNAPSHOT_INTERVAL - 1 deltas.
+
+`compact_revisions()` aclara el historial antiguo (deja la última revisión
+de cada día) y vuelve a codificar la cadena de las que quedan.
+`benchmark()` mide espacio y tiempo de reconstrucción en memoria.
+`merge_lines()` fusiona dos ediciones concurrentes (sincronización offline).
+"""
+import json
+import random
+import time
+import zlib
+from datetime import datetime, timedelta
+from difflib import SequenceMatcher
+
+from extensions import db
+from models import NoteRevision
+
+SNAPSHOT_INTERVAL = 10
+COMPRESS_LEVEL = 6
+
+
+def _lines(text):
+    return (text or '').splitlines(keepends=True)
+
+
+def encode_delta(base, target):
+    """Operaciones para pasar de base a target: [i, j] copia líneas, str inserta"""
+    base_lines, target_lines = _lines(base), _lines(target)
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, base_lines, target_lines).get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(''.join(target_lines[j1:j2]))
+    return ops
+
+
+def apply_delta(base, ops):
+    base_lines = _lines(base)
+    parts = []
+    for op in ops:
+        if isinstance(op, list):
+            parts.extend(base_lines[op[0]:op[1]])
+        else:
+            parts.append(op)
+    return ''.join(parts)
+
+
+def _line_edits(base_lines, target):
+    """(i1, i2, lines): replace base_lines[i1:i2] with lines"""
+    target_lines = _lines(target)
+    return [(i1, i2, tuple(target_lines[j1:j2])) for tag, i1, i2, j1, j2
+            in SequenceMatcher(None, base_lines, target_lines).get_opcodes() if tag != 'equal']
+
+
+def merge_lines(base, local, remote):
+    """
+    Fusión a tres bandas por líneas: aplica sobre base los cambios de local y
+    de remote. Devuelve None si los dos tocan la misma zona de forma distinta.
+    """
+    base_lines = _lines(base)
+    edits = sorted(set(_line_edits(base_lines, local)) | set(_line_edits(base_lines, remote)),
+                   key=lambda edit: (edit[0], edit[1]))
+    parts = []
+    position = 0
+    previous = None
+    for i1, i2, lines in edits:
+        # Zonas solapadas, o dos cambios que empiezan en la misma línea y
+        # alguno es una inserción: el orden sería ambiguo
+        if previous is not None and (i1 < previous[1] or
+                                     (i1 == previous[0] and (i1 == i2 or previous[0] == previous[1]))):
+            return None
+        parts.extend(base_lines[position:i1])
+        parts.extend(lines)
+        position = i2
+        previous = (i1, i2)
+    parts.extend(base_lines[position:])
+    return ''.join(parts)
+
+
+def _pack(value):
+    return zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'), COMPRESS_LEVEL)
+
+
+def _unpack(data):
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+def encode_revision(base, content, deltas_since_snapshot, interval=SNAPSHOT_INTERVAL):
+    """
+    (is_snapshot, data) para guardar content. Snapshot al empezar la cadena,
+    cuando ya hay interval - 1 deltas seguidos o si el delta no es más pequeño.
+    """
+    snapshot_data = _pack(content)
+    if base is None or deltas_since_snapshot + 1 >= interval:
+        return True, snapshot_data
+    delta_data = _pack(encode_delta(base, content))
+    if len(delta_data) >= len(snapshot_data):
+        return True, snapshot_data
+    return False, delta_data
+
+
+def rebuild_content(chain):
+    """Contenido de la última revisión de una cadena que empieza en un snapshot"""
+    content = None
+    for is_snapshot, data in chain:
+        value = _unpack(data)
+        content = value if is_snapshot else apply_delta(content, value)
+    return content
+
+
+def _chain(note_id, number):
+    """Revisiones desde el último snapshot <= number hasta number, en orden"""
+    snapshot_number = db.session.query(db.func.max(NoteRevision.number)).filter(
+        NoteRevision.note_id == note_id,
+        NoteRevision.number <= number,
+        NoteRevision.is_snapshot == True
+    ).scalar()
+    if snapshot_number is None:
+        return []
+    return NoteRevision.query.filter(
+        NoteRevision.note_id == note_id,
+        NoteRevision.number.between(snapshot_number, number)
+    ).order_by(NoteRevision.number).all()
+
+
+def get_revision_content(revision):
+    chain = _chain(revision.note_id, revision.number)
+    return rebuild_content([(rev.is_snapshot, rev.data) for rev in chain])
+
+
+def _add_revision(note_id, number, title, content, base, deltas_since_snapshot, user_id):
+    is_snapshot, data = encode_revision(base, content, deltas_since_snapshot)
+    revision = NoteRevision(note_id=note_id, number=number, user_id=user_id, title=title,
+                            is_snapshot=is_snapshot, data=data, content_length=len(content))
+    db.session.add(revision)
+    return revision
+
+
+def record_revision(note, user_id=None, previous=None, coalesce_seconds=None):
+    """
+    Guarda el estado actual de la nota como nueva revisión. `previous`
+    (title, content) es el estado antes de editar: en notas sin historial
+    se guarda primero como revisión inicial. Con coalesce_seconds, si la
+    última revisión es del mismo usuario y se creó hace menos de ese tiempo
+    se sobrescribe en lugar de añadir otra (autoguardado mientras se
+    escribe). No hace commit. Devuelve la revisión guardada o None si nada
+    ha cambiado.
+    """
+    user_id = user_id or note.user_id
+    last = NoteRevision.query.filter_by(note_id=note.id)\
+        .order_by(NoteRevision.number.desc()).first()
+    if last is None and previous is not None and previous != (note.title, note.content):
+        last = _add_revision(note.id, 1, previous[0], previous[1], None, 0, note.user_id)
+        chain = [last]
+    else:
+        chain = _chain(note.id, last.number) if last else []
+
+    base = rebuild_content([(rev.is_snapshot, rev.data) for rev in chain]) if chain else None
+    if last is not None and last.title == note.title and base == note.content:
+        return None
+
+    coalesce = (coalesce_seconds and last is not None and last.id is not None
+                and last.number > 1 and last.user_id == user_id
+                and last.created_at >= datetime.utcnow() - timedelta(seconds=coalesce_seconds))
+    if coalesce:
+        # Se vuelve a codificar contra la revisión anterior a `last`
+        chain = chain[:-1] if len(chain) > 1 else []
+        base = rebuild_content([(rev.is_snapshot, rev.data) for rev in chain]) if chain else None
+        last.is_snapshot, last.data = encode_revision(base, note.content, len(chain) - 1 if chain else 0)
+        last.title = note.title
+        last.content_length = len(note.content)
+        return last
+
+    number = last.number + 1 if last else 1
+    return _add_revision(note.id, number, note.title, note.content, base,
+                         len(chain) - 1 if chain else 0, user_id)
+
+
+def compact_note(note_id, keep_since, interval=SNAPSHOT_INTERVAL):
+    """
+    Borra las revisiones anteriores a keep_since salvo la última de cada día
+    (y siempre la más reciente) y recodifica la cadena. No hace commit.
+    Devuelve el número de revisiones borradas.
+    """
+    revisions = NoteRevision.query.filter_by(note_id=note_id).order_by(NoteRevision.number).all()
+    contents = []
+    content = None
+    for revision in revisions:
+        value = _unpack(revision.data)
+        content = value if revision.is_snapshot else apply_delta(content, value)
+        contents.append(content)
+
+    last_of_day = {}
+    for index, revision in enumerate(revisions):
+        if revision.created_at < keep_since:
+            last_of_day[revision.created_at.date()] = index
+    keep = set(last_of_day.values()) | {index for index, revision in enumerate(revisions)
+                                        if revision.created_at >= keep_since}
+    keep.add(len(revisions) - 1)
+
+    removed = 0
+    base = None
+    deltas = 0
+    for index, revision in enumerate(revisions):
+        if index not in keep:
+            db.session.delete(revision)
+            removed += 1
+            continue
+        if removed:
+            revision.is_snapshot, revision.data = encode_revision(base, contents[index], deltas, interval)
+        base = contents[index]
+        deltas = 0 if revision.is_snapshot else deltas + 1
+    return removed
+
+
+def compact_revisions(keep_days=30):
+    """Compacta todas las notas con revisiones más antiguas que keep_days"""
+    keep_since = datetime.utcnow() - timedelta(days=keep_days)
+    note_ids = [row[0] for row in db.session.query(NoteRevision.note_id)
+                .filter(NoteRevision.created_at < keep_since).distinct()]
+    removed = 0
+    for note_id in note_ids:
+        removed += compact_note(note_id, keep_since)
+        db.session.commit()
+    return len(note_ids), removed
+
+
+WORDS = ('nota', 'idea', 'tarea', 'reunión', 'proyecto', 'lista', 'revisar', 'enviar',
+         'informe', 'cliente', 'fecha', 'borrador', 'cambio', 'versión', 'detalle')
+
+
+def _random_line(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 12))) + '\n'
+
+
+def _random_edit(lines, rng):
+    """Cambia, inserta o borra unas pocas líneas, como una edición normal"""
+    lines = list(lines)
+    for _ in range(rng.randint(1, 3)):
+        action = rng.random()
+        position = rng.randrange(len(lines) + 1)
+        if action < 0.5 and position < len(lines):
+            lines[position] = _random_line(rng)
+        elif action < 0.8 or len(lines) < 2:
+            lines.insert(position, _random_line(rng))
+        else:
+            del lines[min(position, len(lines) - 1)]
+    return lines
+
+
+def benchmark(sizes=(1000, 10000, 100000), edit_counts=(10, 100), interval=SNAPSHOT_INTERVAL, seed=0):
+    """
+    Simula edit_counts guardados sobre notas de sizes caracteres y compara
+    el espacio de los deltas con guardar copias completas, junto con el
+    tiempo medio y máximo de reconstruir una revisión.
+    """
+    results = []
+    for size in sizes:
+        for edits in edit_counts:
+            rng = random.Random(seed)
+            lines = []
+            while sum(len(line) for line in lines) < size:
+                lines.append(_random_line(rng))
+
+            stored = []
+            full_bytes = 0
+            base = None
+            deltas = 0
+            for index in range(edits + 1):
+                if index:
+                    lines = _random_edit(lines, rng)
+                content = ''.join(lines)
+                full_bytes += len(content.encode('utf-8'))
+                is_snapshot, data = encode_revision(base, content, deltas, interval)
+                stored.append((is_snapshot, data))
+                base = content
+                deltas = 0 if is_snapshot else deltas + 1
+
+            timings = []
+            snapshot_index = 0
+            for index, (is_snapshot, _) in enumerate(stored):
+                if is_snapshot:
+                    snapshot_index = index
+                started = time.perf_counter()
+                rebuild_content(stored[snapshot_index:index + 1])
+                timings.append(time.perf_counter() - started)
+
+            stored_bytes = sum(len(data) for _, data in stored)
+            results.append({
+                'size': size,
+                'edits': edits,
+                'full_bytes': full_bytes,
+                'stored_bytes': stored_bytes,
+                'ratio': stored_bytes / full_bytes,
+                'snapshots': sum(1 for is_snapshot, _ in stored if is_snapshot),
+                'rebuild_avg_ms': sum(timings) / len(timings) * 1000,
+                'rebuild_max_ms': max(timings) * 1000
+            })
+    return results
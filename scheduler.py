@@ -0,0 +1,273 @@
+# scheduler.py
+"""
+Planificador de tareas: marca las vencidas y envía recordatorios.
+
+Mantiene un min-heap de eventos (momento, tipo, tarea) cargado con una
+consulta por el índice (status, due_date) de las tareas pendientes que
+vencen dentro del horizonte (TASK_SCHEDULER_HORIZON, 24 h). Un hilo daemon
+duerme hasta el siguiente evento y al despertar procesa en lote todos los
+que ya tocan: un UPDATE por lote para pasar a 'overdue' y otro para
+reclamar los recordatorios, y publica 'task_overdue' / 'task_reminder' en el
+canal de cada usuario.
+
+Las tareas nuevas o reprogramadas en este proceso entran con notify_task();
+el heap se recarga cada TASK_SCHEDULER_RELOAD segundos para recoger los
+cambios de otros procesos. Con varios workers, el UPDATE condicional de
+reminded_at evita recordatorios duplicados.
+
+Las tareas recurrentes (recurrence.py) no pasan por el planificador: su
+due_date es solo la primera ocurrencia. due_date es hora local, así que
+todas las comparaciones usan recurrence.local_now().
+
+`flask check-tasks` hace una sola pasada (cron) y `flask run-scheduler`
+ejecuta el bucle en primer plano.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from extensions import db
+from models import Task
+from events import publish, user_channel
+from recurrence import local_now
+from changelog import UPDATE, record_changes
+
+logger = logging.getLogger(__name__)
+
+REMIND = 'remind'
+OVERDUE = 'overdue'
+BATCH_SIZE = 500
+
+
+def _batches(items, size=BATCH_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _publish_by_user(rows, event_type):
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(row.user_id, []).append({
+            'id': row.id,
+            'title': row.title,
+            'due_date': row.due_date.isoformat()
+        })
+    for user_id, tasks in by_user.items():
+        publish(user_channel(user_id), event_type, {'tasks': tasks})
+
+
+def mark_overdue(task_ids=None, now=None):
+    """
+    Pasa a 'overdue' las tareas pendientes ya vencidas (las de task_ids, o
+    todas) en UPDATEs por lotes y avisa a sus usuarios. Devuelve cuántas.
+    """
+    now = now or local_now()
+    query = db.session.query(Task.id, Task.user_id, Task.title, Task.due_date)\
+        .filter(Task.status == 'pending', Task.due_date < now, Task.recurrence_rule.is_(None))
+    if task_ids is not None:
+        if not task_ids:
+            return 0
+        query = query.filter(Task.id.in_(list(task_ids)))
+    rows = query.all()
+
+    for batch in _batches(row.id for row in rows):
+        Task.query.filter(Task.id.in_(batch), Task.status == 'pending')\
+            .update({Task.status: 'overdue'}, synchronize_session=False)
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(row.user_id, []).append(row.id)
+    for user_id, ids in by_user.items():
+        record_changes(user_id, 'task', ids, UPDATE)
+    db.session.commit()
+
+    _publish_by_user(rows, 'task_overdue')
+    return len(rows)
+
+
+def send_reminders(task_ids=None, now=None, lead=timedelta(hours=1)):
+    """
+    Recordatorio para las tareas pendientes que vencen dentro de `lead`.
+    Cada worker reclama las suyas escribiendo reminded_at = now solo donde
+    seguía vacío, así que un recordatorio no se envía dos veces.
+    """
+    now = now or local_now()
+    query = db.session.query(Task.id).filter(
+        Task.status == 'pending',
+        Task.reminded_at.is_(None),
+        Task.recurrence_rule.is_(None),
+        Task.due_date >= now,
+        Task.due_date <= now + lead
+    )
+    if task_ids is not None:
+        if not task_ids:
+            return 0
+        query = query.filter(Task.id.in_(list(task_ids)))
+    candidates = [row.id for row in query]
+
+    claimed = []
+    for batch in _batches(candidates):
+        Task.query.filter(Task.id.in_(batch), Task.reminded_at.is_(None))\
+            .update({Task.reminded_at: now}, synchronize_session=False)
+        claimed.extend(db.session.query(Task.id, Task.user_id, Task.title, Task.due_date)
+                       .filter(Task.id.in_(batch), Task.reminded_at == now).all())
+    db.session.commit()
+
+    _publish_by_user(claimed, 'task_reminder')
+    return len(claimed)
+
+
+class TaskScheduler:
+    def __init__(self, app, horizon=timedelta(hours=24), reload_interval=300,
+                 reminder_lead=timedelta(hours=1)):
+        self.app = app
+        self.horizon = horizon
+        self.reload_interval = reload_interval
+        self.reminder_lead = reminder_lead
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._loaded_until = None
+        self._last_reload = None
+        self._thread = None
+        self._stopped = False
+
+    def _push(self, task_id, due_date, reminded_at, now):
+        if reminded_at is None and due_date > now:
+            remind_at = max(due_date - self.reminder_lead, now)
+            heapq.heappush(self._heap, (remind_at, next(self._seq), REMIND, task_id))
+        heapq.heappush(self._heap, (due_date, next(self._seq), OVERDUE, task_id))
+
+    def reload(self, now=None):
+        """Reconstruye el heap con las pendientes que vencen antes del horizonte"""
+        now = now or local_now()
+        until = now + self.horizon
+        rows = db.session.query(Task.id, Task.due_date, Task.reminded_at).filter(
+            Task.status == 'pending',
+            Task.due_date.isnot(None),
+            Task.recurrence_rule.is_(None),
+            Task.due_date <= until
+        ).all()
+        with self._lock:
+            self._heap = []
+            for task_id, due_date, reminded_at in rows:
+                self._push(task_id, due_date, reminded_at, now)
+            self._loaded_until = until
+            self._last_reload = now
+        return len(rows)
+
+    def notify_task(self, task):
+        """Añade una tarea creada o reprogramada si cae dentro del horizonte cargado"""
+        if task.status != 'pending' or task.due_date is None or task.recurrence_rule:
+            return
+        with self._lock:
+            if self._loaded_until is None or task.due_date > self._loaded_until:
+                return
+            self._push(task.id, task.due_date, task.reminded_at, local_now())
+        self._wake.set()
+
+    def _pop_due(self, now):
+        due = {REMIND: set(), OVERDUE: set()}
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, _, kind, task_id = heapq.heappop(self._heap)
+                due[kind].add(task_id)
+        return due
+
+    def tick(self, now=None):
+        """
+        Procesa los eventos que ya tocan. Los obsoletos (tarea completada,
+        borrada o reprogramada) los descartan las condiciones de los UPDATE.
+        Devuelve (vencidas, recordatorios).
+        """
+        now = now or local_now()
+        due = self._pop_due(now)
+        reminded = send_reminders(due[REMIND], now, self.reminder_lead) if due[REMIND] else 0
+        overdue = mark_overdue(due[OVERDUE], now) if due[OVERDUE] else 0
+        return overdue, reminded
+
+    def _seconds_until_next(self, now):
+        timeout = self.reload_interval - (now - self._last_reload).total_seconds()
+        with self._lock:
+            if self._heap:
+                timeout = min(timeout, (self._heap[0][0] - now).total_seconds())
+        return max(timeout, 0.5)
+
+    def run_forever(self):
+        with self.app.app_context():
+            while not self._stopped:
+                now = local_now()
+                try:
+                    if self._last_reload is None or \
+                            (now - self._last_reload).total_seconds() >= self.reload_interval:
+                        self.reload(now)
+                    self.tick(now)
+                except Exception:
+                    logger.exception('Task scheduler pass failed')
+                    db.session.rollback()
+                    time.sleep(5)
+                finally:
+                    db.session.remove()
+                if self._last_reload is None:
+                    continue
+                self._wake.wait(self._seconds_until_next(local_now()))
+                self._wake.clear()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self.run_forever, name='task-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def notify_task(task):
+    """Llamar tras el commit al crear o reprogramar una tarea"""
+    if _scheduler is not None:
+        _scheduler.notify_task(task)
+
+
+def init_app(app):
+    global _scheduler
+    _scheduler = TaskScheduler(
+        app,
+        horizon=timedelta(seconds=app.config.get('TASK_SCHEDULER_HORIZON', 24 * 3600)),
+        reload_interval=app.config.get('TASK_SCHEDULER_RELOAD', 300),
+        reminder_lead=timedelta(minutes=app.config.get('TASK_REMINDER_LEAD_MINUTES', 60))
+    )
+
+    # El hilo arranca con la primera petición, no al importar la app (CLI, migraciones)
+    @app.before_request
+    def _start_scheduler():
+        if app.config.get('TASK_SCHEDULER_ENABLED', True) and \
+                (_scheduler._thread is None or not _scheduler._thread.is_alive()):
+            with _scheduler_lock:
+                _scheduler.start()
+
+    @app.cli.command('check-tasks')
+    def check_tasks_command():
+        """Una pasada: marca las tareas vencidas y envía los recordatorios pendientes"""
+        lead = _scheduler.reminder_lead
+        overdue = mark_overdue()
+        reminded = send_reminders(lead=lead)
+        print(f'Marked {overdue} tasks overdue, sent {reminded} reminders.')
+
+    @app.cli.command('run-scheduler')
+    def run_scheduler_command():
+        """Ejecuta el planificador de tareas en primer plano"""
+        print('Task scheduler running. Press Ctrl+C to stop.')
+        try:
+            _scheduler.run_forever()
+        except KeyboardInterrupt:
+            _scheduler.stop()
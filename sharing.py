@@ -0,0 +1,84 @@
+# sharing.py
+"""
+Compartir notas con otros usuarios y comprobar permisos de acceso.
+
+Una nota es accesible si el usuario es el autor, si es pública o si se ha
+compartido con él (tabla note_sharing). La comprobación se resuelve con una
+sola consulta y se memoriza durante la petición.
+"""
+from datetime import datetime
+
+from flask import g
+from flask_login import current_user
+from sqlalchemy import exists
+from extensions import db
+from models import User, Note, Attachment, note_sharing
+
+
+def access_filter(user_id):
+    """Condición SQL: autor OR pública OR compartida con user_id"""
+    return db.or_(
+        Note.user_id == user_id,
+        Note.is_public == True,
+        exists().where(note_sharing.c.note_id == Note.id, note_sharing.c.user_id == user_id)
+    )
+
+
+def can_access_note(note_id):
+    """Permiso de lectura del usuario actual sobre una nota (memorizado por petición)"""
+    memo = g.setdefault('note_access', {})
+    if note_id not in memo:
+        memo[note_id] = db.session.query(
+            exists().where(Note.id == note_id, access_filter(current_user.id))
+        ).scalar()
+    return memo[note_id]
+
+
+def can_access_attachment(filename):
+    """Permiso de descarga: el adjunto pertenece a alguna nota accesible"""
+    return db.session.query(
+        exists().where(Attachment.filename == filename,
+                       Attachment.note_id == Note.id,
+                       access_filter(current_user.id))
+    ).scalar()
+
+
+def share_notes(note_ids, user_ids, owner_id):
+    """
+    Comparte varias notas con varios usuarios omitiendo los pares existentes.
+    No hace commit. Devuelve los pares (note_id, user_id) insertados.
+    """
+    note_ids = set(note_ids)
+    user_ids = set(user_ids) - {owner_id}
+    valid_user_ids = {row[0] for row in db.session.query(User.id).filter(User.id.in_(user_ids))}
+    if not note_ids or not valid_user_ids:
+        return []
+
+    existing = set(db.session.query(note_sharing.c.user_id, note_sharing.c.note_id).filter(
+        note_sharing.c.note_id.in_(note_ids),
+        note_sharing.c.user_id.in_(valid_user_ids)
+    ).all())
+    now = datetime.utcnow()
+    rows = [{'user_id': user_id, 'note_id': note_id, 'shared_at': now}
+            for note_id in note_ids for user_id in valid_user_ids
+            if (user_id, note_id) not in existing]
+    if rows:
+        db.session.execute(note_sharing.insert(), rows)
+    return [(row['note_id'], row['user_id']) for row in rows]
+
+
+def unshare_notes(note_ids, user_ids):
+    """Deja de compartir. No hace commit. Devuelve las filas borradas."""
+    result = db.session.execute(note_sharing.delete().where(
+        note_sharing.c.note_id.in_(list(note_ids)),
+        note_sharing.c.user_id.in_(list(user_ids))
+    ))
+    return result.rowcount
+
+
+def shared_with_me_query(user_id):
+    """Notas compartidas con el usuario, las más recientes primero"""
+    return Note.query.join(note_sharing, note_sharing.c.note_id == Note.id)\
+        .filter(note_sharing.c.user_id == user_id)\
+        .add_columns(note_sharing.c.shared_at)\
+        .order_by(note_sharing.c.shared_at.desc(), Note.id.desc())
@@ -0,0 +1,83 @@
+// Autoguardado del formulario de edición (form[data-autosave-url]).
+// Envía por PATCH solo los campos que han cambiado desde el último guardado
+// con If-Match: <versión>; si otra pestaña o dispositivo guardó antes, el
+// servidor responde 409 y se deja de autoguardar para no pisar sus cambios.
+(function (window, document) {
+    const DELAY = 1500;
+
+    function attach(form) {
+        const status = form.querySelector('[data-autosave-status]');
+        const inputs = {
+            title: form.querySelector('[name="title"]'),
+            content: form.querySelector('[name="content"]')
+        };
+        let version = form.dataset.version;
+        let saved = { title: inputs.title.value, content: inputs.content.value };
+        let timer = null;
+        let saving = false;
+        let stopped = false;
+
+        const setStatus = (text) => {
+            if (status) status.textContent = text;
+        };
+
+        async function save() {
+            if (stopped) return;
+            if (saving) {
+                timer = setTimeout(save, DELAY);
+                return;
+            }
+
+            const changes = {};
+            Object.keys(inputs).forEach(field => {
+                if (inputs[field].value !== saved[field]) changes[field] = inputs[field].value;
+            });
+            if (!Object.keys(changes).length || !inputs.title.value.trim()) return;
+
+            saving = true;
+            setStatus('Guardando...');
+            try {
+                const response = await fetch(form.dataset.autosaveUrl, {
+                    method: 'PATCH',
+                    headers: { 'Content-Type': 'application/json', 'If-Match': `"${version}"` },
+                    body: JSON.stringify(changes)
+                });
+                const data = await response.json();
+
+                if (response.status === 409) {
+                    stopped = true;
+                    setStatus('La nota se ha modificado en otro sitio. Recarga para ver los cambios.');
+                } else if (response.ok) {
+                    version = data.version;
+                    Object.assign(saved, changes);
+                    setStatus(`Guardado ${new Date().toLocaleTimeString()}`);
+                } else {
+                    setStatus(data.error || 'No se pudo guardar');
+                }
+            } catch (error) {
+                console.error('Autosave error:', error);
+                setStatus('Sin conexión: se reintentará');
+                timer = setTimeout(save, DELAY * 4);
+            } finally {
+                saving = false;
+            }
+        }
+
+        Object.values(inputs).forEach(input => {
+            input.addEventListener('input', () => {
+                clearTimeout(timer);
+                timer = setTimeout(save, DELAY);
+            });
+        });
+
+        // Al enviar el formulario completo ya no hace falta el autoguardado pendiente
+        form.addEventListener('submit', () => {
+            clearTimeout(timer);
+            stopped = true;
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('form[data-autosave-url]').forEach(attach);
+    });
+})(window, document);
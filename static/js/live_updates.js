@@ -0,0 +1,28 @@
+// Live updates over Server-Sent Events (/api/stream).
+// A single EventSource per tab multiplexes the user, followed authors and
+// watched note channels; the browser reconnects automatically after the
+// server closes the stream.
+(function (window) {
+    function connect(options) {
+        if (!window.EventSource) return null;
+
+        const noteIds = (options.noteIds || []).filter(Boolean);
+        const query = noteIds.length ? `?notes=${noteIds.join(',')}` : '';
+        const source = new EventSource(`/api/stream${query}`);
+        const handlers = options.handlers || {};
+
+        Object.keys(handlers).forEach(eventType => {
+            source.addEventListener(eventType, event => {
+                try {
+                    handlers[eventType](JSON.parse(event.data));
+                } catch (error) {
+                    console.error('Error handling live event:', error);
+                }
+            });
+        });
+
+        return source;
+    }
+
+    window.LiveUpdates = { connect };
+})(window);
@@ -44,6 +44,8 @@ function initNotesApp() {
             const sortBy = ref('date');
             const noteToDelete = ref(null);
             let deleteModal = null;
+            // Almacén local (offline_store.js): si ya hay copia se pinta desde ella
+            let store = null;
 
             // Funciones auxiliares
             const isImage = (filename) => {
@@ -146,6 +148,16 @@ function initNotesApp() {
             const deleteNote = async () => {
                 if (!noteToDelete.value) return;
 
+                // Con almacén local se borra al momento y se envía al sincronizar
+                if (store) {
+                    await store.remove(noteToDelete.value.id);
+                    if (deleteModal) {
+                        deleteModal.hide();
+                    }
+                    showNotification('Note deleted successfully', 'success');
+                    return;
+                }
+
                 try {
                     const response = await fetch(`/notes/${noteToDelete.value.id}/delete`, {
                         method: 'POST',
@@ -227,6 +239,31 @@ function initNotesApp() {
                 }, 5000);
             };
 
+            const startOfflineStore = async () => {
+                const userId = document.getElementById('app').dataset.userId;
+                store = typeof NotesStore !== 'undefined' ? await NotesStore.open(userId) : null;
+                if (!store) return;
+
+                store.onChange(list => { notes.value = list; });
+                store.onConflict(({ note, local, conflicts }) => {
+                    // El servidor conserva su texto: el local se guarda como copia
+                    if ('content' in conflicts) {
+                        store.create({
+                            title: `${note.title} (conflicto)`,
+                            content: local.content,
+                            category_id: note.category_id
+                        }, { category: note.category });
+                    }
+                    showNotification(`"${note.title}" se modificó en otro dispositivo`, 'warning');
+                });
+                if (await store.hasSnapshot()) {
+                    notes.value = await store.all();
+                }
+                store.sync();
+            };
+
+            startOfflineStore().catch(error => console.error('Offline store error:', error));
+
             // Exponer funciones y datos al template
             return {
                 notes,
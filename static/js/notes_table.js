@@ -0,0 +1,691 @@
+// static/js/notes_table.js
+// Vue app for the notes table view; initial data comes from the JSON
+// script elements rendered by templates/notes_table.html
+
+const { createApp, ref, computed, watch, onMounted } = Vue;
+
+createApp({
+    setup() {
+        // Data
+        const notes = ref(JSON.parse(document.getElementById('notes-data').textContent));
+        const categories = ref(JSON.parse(document.getElementById('categories-data').textContent));
+        // Conteos por categoría, visibilidad y adjuntos para la búsqueda actual
+        const facets = ref(JSON.parse(document.getElementById('facets-data').textContent));
+        const searchQuery = ref("");
+        const selectedCategory = ref("");
+        const sortBy = ref("updated_at");
+        const sortDirection = ref("desc");
+        const loading = ref(false);
+        const noteToDelete = ref(null);
+        const selectedNotes = ref([]);
+        const toggleFilters = ref(false);
+        const dateRange = ref('');
+        const hasAttachments = ref('');
+        const hasLikes = ref('');
+        const visibility = ref('');
+        const itemsPerPage = ref('25');
+        // Los filtros por etiquetas se resuelven en el servidor (índice invertido)
+        const tagFilter = ref(new URLSearchParams(window.location.search).get('tags') || '');
+        const tagMatch = ref('all');
+        toggleFilters.value = Boolean(tagFilter.value);
+        // Copia local de todas las notas (offline_store.js). Cuando existe, las
+        // páginas, búsquedas y facetas se calculan aquí sin ir al servidor
+        const localNotes = ref(null);
+        const PER_PAGE = 25;
+        let store = null;
+
+        // Computed properties
+        const filteredNotes = computed(() => {
+            let filtered = Array.isArray(notes.value) ? [...notes.value] : [...notes.value.items];
+
+            // Filter by search query
+            if (searchQuery.value) {
+                const query = searchQuery.value.toLowerCase();
+                filtered = filtered.filter(note =>
+                    note.title.toLowerCase().includes(query) ||
+                    (note.content || note.content_preview || '').toLowerCase().includes(query)
+                );
+            }
+
+            // Filter by category
+            if (selectedCategory.value) {
+                filtered = filtered.filter(note =>
+                    note.category_id == selectedCategory.value
+                );
+            }
+
+            // Filter by date range
+            if (dateRange.value) {
+                const now = new Date();
+                let startDate = new Date();
+
+                switch (dateRange.value) {
+                    case 'today':
+                        startDate.setHours(0, 0, 0, 0);
+                        break;
+                    case 'week':
+                        startDate.setDate(now.getDate() - 7);
+                        break;
+                    case 'month':
+                        startDate.setMonth(now.getMonth() - 1);
+                        break;
+                    case 'year':
+                        startDate.setFullYear(now.getFullYear() - 1);
+                        break;
+                }
+
+                filtered = filtered.filter(note =>
+                    new Date(note.updated_at) >= startDate
+                );
+            }
+
+            // Filter by attachments
+            if (hasAttachments.value === 'yes') {
+                filtered = filtered.filter(note => note.attachments_count > 0);
+            } else if (hasAttachments.value === 'no') {
+                filtered = filtered.filter(note => note.attachments_count === 0);
+            }
+
+            // Filter by visibility
+            if (visibility.value) {
+                filtered = filtered.filter(note => note.is_public === (visibility.value === 'public'));
+            }
+
+            // Filter by likes
+            if (hasLikes.value === 'yes') {
+                filtered = filtered.filter(note => note.likes_count > 0);
+            } else if (hasLikes.value === 'no') {
+                filtered = filtered.filter(note => note.likes_count === 0);
+            }
+
+            // Sort notes
+            filtered.sort((a, b) => {
+                let aValue, bValue;
+
+                switch (sortBy.value) {
+                    case 'title':
+                        aValue = a.title.toLowerCase();
+                        bValue = b.title.toLowerCase();
+                        break;
+                    case 'category':
+                        aValue = a.category.name.toLowerCase();
+                        bValue = b.category.name.toLowerCase();
+                        break;
+                    case 'attachments':
+                        aValue = a.attachments_count || 0;
+                        bValue = b.attachments_count || 0;
+                        break;
+                    case 'likes':
+                        aValue = a.likes_count || 0;
+                        bValue = b.likes_count || 0;
+                        break;
+                    case 'created_at':
+                        aValue = new Date(a.created_at);
+                        bValue = new Date(b.created_at);
+                        break;
+                    case 'updated_at':
+                    default:
+                        aValue = new Date(a.updated_at);
+                        bValue = new Date(b.updated_at);
+                        break;
+                }
+
+                if (sortDirection.value === 'asc') {
+                    return aValue > bValue ? 1 : -1;
+                } else {
+                    return aValue < bValue ? 1 : -1;
+                }
+            });
+
+            return filtered;
+        });
+
+        const allSelected = computed(() => {
+            return filteredNotes.value.length > 0 &&
+                selectedNotes.value.length === filteredNotes.value.length;
+        });
+
+        const hasActiveFilters = computed(() => {
+            return searchQuery.value || selectedCategory.value || dateRange.value ||
+                hasAttachments.value || hasLikes.value || visibility.value || tagFilter.value;
+        });
+
+        const visiblePages = computed(() => {
+            if (!notes.value.pages) return [];
+            const total = notes.value.pages;
+            const current = notes.value.page;
+            const pages = [];
+
+            // Always show first page
+            pages.push(1);
+
+            // Calculate range around current page
+            let start = Math.max(2, current - 1);
+            let end = Math.min(total - 1, current + 1);
+
+            // Adjust if near edges
+            if (current <= 2) end = Math.min(3, total - 1);
+            if (current >= total - 1) start = Math.max(total - 2, 2);
+
+            // Add ellipsis if needed
+            if (start > 2) pages.push('...');
+
+            // Add middle pages
+            for (let i = start; i <= end; i++) {
+                pages.push(i);
+            }
+
+            // Add ellipsis if needed
+            if (end < total - 1) pages.push('...');
+
+            // Always show last page if not first
+            if (total > 1) pages.push(total);
+
+            return pages;
+        });
+
+        // Methods
+        const formatDate = (dateString) => {
+            const date = new Date(dateString);
+            return date.toLocaleDateString('en-US', {
+                month: 'short',
+                day: 'numeric',
+                hour: '2-digit',
+                minute: '2-digit'
+            });
+        };
+
+        const getStatusIndicatorClass = (updatedAt) => {
+            const now = new Date();
+            const updated = new Date(updatedAt);
+            const diffHours = (now - updated) / (1000 * 60 * 60);
+
+            if (diffHours < 24) return 'status-indicator status-new';
+            if (diffHours < 168) return 'status-indicator status-recent'; // 7 days
+            return 'status-indicator status-old';
+        };
+
+        const getSortClass = (column) => {
+            if (sortBy.value !== column) return 'sortable-header';
+            return `sortable-header sort-${sortDirection.value}`;
+        };
+
+        const sortTable = (column) => {
+            if (sortBy.value === column) {
+                // Toggle direction
+                sortDirection.value = sortDirection.value === 'asc' ? 'desc' : 'asc';
+            } else {
+                // Set new column with default direction
+                sortBy.value = column;
+                sortDirection.value = 'desc';
+            }
+        };
+
+        const rowClick = (noteId, event) => {
+            // Don't trigger if clicking on checkbox or action button
+            if (event.target.tagName === 'INPUT' ||
+                event.target.closest('button') ||
+                event.target.closest('a')) {
+                return;
+            }
+
+            window.location.href = `/notes/${noteId}`;
+        };
+
+        const isSelected = (noteId) => {
+            return selectedNotes.value.includes(noteId);
+        };
+
+        const toggleNoteSelection = (noteId) => {
+            const index = selectedNotes.value.indexOf(noteId);
+            if (index === -1) {
+                selectedNotes.value.push(noteId);
+            } else {
+                selectedNotes.value.splice(index, 1);
+            }
+        };
+
+        const toggleSelectAll = () => {
+            if (allSelected.value) {
+                selectedNotes.value = [];
+            } else {
+                selectedNotes.value = filteredNotes.value.map(note => note.id);
+            }
+        };
+
+        const clearSelection = () => {
+            selectedNotes.value = [];
+        };
+
+        const getNoteById = (noteId) => {
+            const allNotes = Array.isArray(notes.value) ? notes.value : notes.value.items;
+            return allNotes.find(note => note.id === noteId);
+        };
+
+        const confirmDelete = (note) => {
+            noteToDelete.value = note;
+            const modal = new bootstrap.Modal(document.getElementById('deleteModal'));
+            modal.show();
+        };
+
+        const deleteNote = async () => {
+            if (!noteToDelete.value) return;
+
+            // Con copia local se borra al momento y se envía al sincronizar
+            if (store) {
+                const index = selectedNotes.value.indexOf(noteToDelete.value.id);
+                if (index !== -1) selectedNotes.value.splice(index, 1);
+                await store.remove(noteToDelete.value.id);
+                bootstrap.Modal.getInstance(document.getElementById('deleteModal')).hide();
+                showFlash('Note deleted successfully!', 'success');
+                return;
+            }
+
+            try {
+                const response = await fetch(`/notes/${noteToDelete.value.id}/delete`, {
+                    method: 'POST',
+                });
+
+                if (response.ok) {
+                    // Remove note from list
+                    if (Array.isArray(notes.value)) {
+                        notes.value = notes.value.filter(n => n.id !== noteToDelete.value.id);
+                    } else {
+                        notes.value.items = notes.value.items.filter(n => n.id !== noteToDelete.value.id);
+                        notes.value.total -= 1;
+                    }
+
+                    // Remove from selection if it was selected
+                    const index = selectedNotes.value.indexOf(noteToDelete.value.id);
+                    if (index !== -1) {
+                        selectedNotes.value.splice(index, 1);
+                    }
+
+                    // Close modal
+                    const modal = bootstrap.Modal.getInstance(document.getElementById('deleteModal'));
+                    modal.hide();
+
+                    // Show success message
+                    showFlash('Note deleted successfully!', 'success');
+                }
+            } catch (error) {
+                console.error('Error deleting note:', error);
+                showFlash('Error deleting note', 'error');
+            }
+        };
+
+        const confirmBulkDelete = () => {
+            if (selectedNotes.value.length === 0) return;
+            const modal = new bootstrap.Modal(document.getElementById('bulkDeleteModal'));
+            modal.show();
+        };
+
+        const bulkDelete = async () => {
+            if (selectedNotes.value.length === 0) return;
+
+            try {
+                const response = await fetch('/api/notes/bulk', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ action: 'delete', ids: selectedNotes.value })
+                });
+                const result = await response.json();
+
+                if (!response.ok) {
+                    showFlash(result.error || 'Error deleting notes', 'danger');
+                    return;
+                }
+
+                if (result.affected > 0) {
+                    // Remove deleted notes from the list
+                    const deletedIds = selectedNotes.value;
+
+                    if (Array.isArray(notes.value)) {
+                        notes.value = notes.value.filter(n => !deletedIds.includes(n.id));
+                    } else {
+                        notes.value.items = notes.value.items.filter(n => !deletedIds.includes(n.id));
+                        notes.value.total -= deletedIds.length;
+                    }
+
+                    // Clear selection
+                    selectedNotes.value = [];
+
+                    // Close modal
+                    const modal = bootstrap.Modal.getInstance(document.getElementById('bulkDeleteModal'));
+                    modal.hide();
+
+                    // Show success message
+                    showFlash(`${result.affected} note(s) deleted successfully!`, 'success');
+                    if (store) store.sync();
+                }
+            } catch (error) {
+                console.error('Error in bulk delete:', error);
+                showFlash('Error deleting notes', 'error');
+            }
+        };
+
+        const toggleLike = async (note) => {
+            try {
+                const response = await fetch(`/notes/${note.id}/like`, {
+                    method: 'POST',
+                });
+
+                if (response.ok) {
+                    // Update likes count
+                    if (!note.likes_count) note.likes_count = 0;
+                    note.likes_count += 1;
+                }
+            } catch (error) {
+                console.error('Error liking note:', error);
+            }
+        };
+
+        const matchesLocalFilters = (note) => {
+            const query = searchQuery.value.toLowerCase();
+            if (query && !note.title.toLowerCase().includes(query) &&
+                !(note.content || '').toLowerCase().includes(query)) {
+                return false;
+            }
+            const wanted = tagFilter.value.split(',').map(tag => tag.trim().toLowerCase()).filter(Boolean);
+            if (wanted.length) {
+                const tags = note.tags || [];
+                return tagMatch.value === 'any' ? wanted.some(tag => tags.includes(tag))
+                    : wanted.every(tag => tags.includes(tag));
+            }
+            return true;
+        };
+
+        const localPage = (page) => {
+            const matching = localNotes.value.filter(matchesLocalFilters)
+                .sort((a, b) => new Date(b.updated_at) - new Date(a.updated_at));
+            const pages = Math.max(1, Math.ceil(matching.length / PER_PAGE));
+            page = Math.min(Math.max(page, 1), pages);
+            return {
+                items: matching.slice((page - 1) * PER_PAGE, page * PER_PAGE),
+                total: matching.length,
+                page,
+                pages,
+                has_prev: page > 1,
+                has_next: page < pages,
+                prev_num: page > 1 ? page - 1 : null,
+                next_num: page < pages ? page + 1 : null
+            };
+        };
+
+        const localFacets = () => {
+            const counts = {
+                total: 0,
+                category: {},
+                visibility: { public: 0, private: 0 },
+                attachments: { yes: 0, no: 0 }
+            };
+            localNotes.value.filter(matchesLocalFilters).forEach(note => {
+                counts.total += 1;
+                counts.category[note.category_id] = (counts.category[note.category_id] || 0) + 1;
+                counts.visibility[note.is_public ? 'public' : 'private'] += 1;
+                counts.attachments[note.attachments_count > 0 ? 'yes' : 'no'] += 1;
+            });
+            return counts;
+        };
+
+        const showLocal = (page) => {
+            notes.value = localPage(page);
+            facets.value = localFacets();
+        };
+
+        // La tabla solo muestra la vista previa: no se pide el contenido completo
+        const LIST_FIELDS = 'id,title,content_preview,created_at,updated_at,category_id,is_public,attachments_count,likes_count,user_id';
+
+        const loadPage = async (page) => {
+            if (!page || loading.value) return;
+            if (localNotes.value) {
+                showLocal(page);
+                return;
+            }
+
+            loading.value = true;
+            try {
+                const params = new URLSearchParams({
+                    page, format: 'json', fields: LIST_FIELDS, include: 'category,tags', facets: 1
+                });
+                if (tagFilter.value.trim()) {
+                    params.set('tags', tagFilter.value);
+                    params.set('tag_match', tagMatch.value);
+                }
+                const response = await fetch(`/notes/table?${params}`);
+                const data = await response.json();
+                facets.value = data.facets;
+                delete data.facets;
+                notes.value = data;
+            } catch (error) {
+                console.error('Error loading page:', error);
+            } finally {
+                loading.value = false;
+            }
+        };
+
+        const applyFilters = () => {
+            // Force reactive update
+            const query = searchQuery.value;
+            searchQuery.value = '';
+            setTimeout(() => searchQuery.value = query, 0);
+        };
+
+        const resetFilters = () => {
+            searchQuery.value = '';
+            selectedCategory.value = '';
+            dateRange.value = '';
+            hasAttachments.value = '';
+            hasLikes.value = '';
+            visibility.value = '';
+            tagFilter.value = '';
+            sortBy.value = 'updated_at';
+            sortDirection.value = 'desc';
+            loadFacets();
+        };
+
+        const changeItemsPerPage = () => {
+            // In a real app, this would reload with new per_page
+            showFlash(`Displaying ${itemsPerPage.value} items per page`, 'info');
+        };
+
+        const exportTable = () => {
+            // Simple CSV export
+            const headers = ['Title', 'Content', 'Category', 'Attachments', 'Likes', 'Updated'];
+            const csvData = filteredNotes.value.map(note => [
+                `"${note.title.replace(/"/g, '""')}"`,
+                `"${(note.content || note.content_preview || '').substring(0, 200).replace(/"/g, '""')}"`,
+                note.category.name,
+                note.attachments_count,
+                note.likes_count,
+                formatDate(note.updated_at)
+            ]);
+
+            const csvContent = [
+                headers.join(','),
+                ...csvData.map(row => row.join(','))
+            ].join('\n');
+
+            const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' });
+            const link = document.createElement('a');
+            const url = URL.createObjectURL(blob);
+
+            link.setAttribute('href', url);
+            link.setAttribute('download', `notes_export_${new Date().toISOString().split('T')[0]}.csv`);
+            link.style.visibility = 'hidden';
+
+            document.body.appendChild(link);
+            link.click();
+            document.body.removeChild(link);
+
+            showFlash('Table exported to CSV', 'success');
+        };
+
+        const showFlash = (message, type) => {
+            const alert = document.createElement('div');
+            alert.className = `alert alert-${type} alert-dismissible fade show`;
+            alert.innerHTML = `
+            ${message}
+            <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
+        `;
+
+            const container = document.querySelector('.flash-messages');
+            container.appendChild(alert);
+
+            setTimeout(() => {
+                alert.classList.remove('show');
+                setTimeout(() => alert.remove(), 150);
+            }, 3000);
+        };
+
+        // Debounced search
+        let searchTimeout = null;
+        const filterByTag = (name) => {
+            tagFilter.value = name;
+            tagMatch.value = 'all';
+        };
+
+        let tagTimeout = null;
+        watch([tagFilter, tagMatch], () => {
+            clearTimeout(tagTimeout);
+            tagTimeout = setTimeout(() => loadPage(1), 300);
+        });
+
+        const loadFacets = async () => {
+            if (localNotes.value) {
+                showLocal(1);
+                return;
+            }
+            const params = new URLSearchParams();
+            if (searchQuery.value) params.set('search', searchQuery.value);
+            if (tagFilter.value.trim()) {
+                params.set('tags', tagFilter.value);
+                params.set('tag_match', tagMatch.value);
+            }
+            try {
+                const response = await fetch(`/api/notes/facets?${params}`);
+                facets.value = await response.json();
+            } catch (error) {
+                console.error('Error loading facets:', error);
+            }
+        };
+
+        const debouncedSearch = () => {
+            clearTimeout(searchTimeout);
+            searchTimeout = setTimeout(() => {
+                applyFilters();
+                loadFacets();
+            }, 500);
+        };
+
+        const startOfflineStore = async () => {
+            const userId = document.getElementById('app').dataset.userId;
+            store = typeof NotesStore !== 'undefined' ? await NotesStore.open(userId) : null;
+            if (!store) return;
+
+            const useLocal = (list) => {
+                localNotes.value = list;
+                showLocal(notes.value.page || 1);
+            };
+            store.onChange(useLocal);
+            store.onConflict(({ note, local, conflicts }) => {
+                // El servidor conserva su texto: el local se guarda como copia
+                if ('content' in conflicts) {
+                    store.create({
+                        title: `${note.title} (conflict)`,
+                        content: local.content,
+                        category_id: note.category_id
+                    }, { category: note.category });
+                }
+                showFlash(`"${note.title}" was changed on another device`, 'warning');
+            });
+            if (await store.hasSnapshot()) {
+                useLocal(await store.all());
+            }
+            store.sync();
+        };
+
+        // Lifecycle
+        onMounted(() => {
+            startOfflineStore().catch(error => console.error('Offline store error:', error));
+
+            // Initialize tooltips if needed
+            if (typeof bootstrap !== 'undefined' && bootstrap.Tooltip) {
+                const tooltipTriggerList = [].slice.call(document.querySelectorAll('[data-bs-toggle="tooltip"]'));
+                tooltipTriggerList.map(function (tooltipTriggerEl) {
+                    return new bootstrap.Tooltip(tooltipTriggerEl);
+                });
+            }
+
+            // Load from URL params if present
+            const urlParams = new URLSearchParams(window.location.search);
+            if (urlParams.has('category')) {
+                selectedCategory.value = urlParams.get('category');
+            }
+            if (urlParams.has('search')) {
+                searchQuery.value = urlParams.get('search');
+            }
+
+            // Live like/comment counts for own notes (user channel)
+            LiveUpdates.connect({
+                handlers: {
+                    like: data => {
+                        const note = getNoteById(data.note_id);
+                        if (note) note.likes_count = data.likes_count;
+                    },
+                    comment: data => {
+                        const note = getNoteById(data.note_id);
+                        if (note) note.comments_count = (note.comments_count || 0) + 1;
+                    }
+                }
+            });
+        });
+
+        return {
+            notes,
+            categories,
+            facets,
+            searchQuery,
+            selectedCategory,
+            sortBy,
+            sortDirection,
+            loading,
+            noteToDelete,
+            selectedNotes,
+            toggleFilters,
+            dateRange,
+            hasAttachments,
+            hasLikes,
+            visibility,
+            itemsPerPage,
+            tagFilter,
+            tagMatch,
+            filteredNotes,
+            allSelected,
+            hasActiveFilters,
+            visiblePages,
+            formatDate,
+            getStatusIndicatorClass,
+            getSortClass,
+            sortTable,
+            rowClick,
+            isSelected,
+            toggleNoteSelection,
+            toggleSelectAll,
+            clearSelection,
+            getNoteById,
+            confirmDelete,
+            deleteNote,
+            confirmBulkDelete,
+            bulkDelete,
+            toggleLike,
+            loadPage,
+            applyFilters,
+            resetFilters,
+            changeItemsPerPage,
+            exportTable,
+            filterByTag,
+            debouncedSearch
+        };
+    }
+}).mount('#app');
@@ -0,0 +1,309 @@
+// Almacén local de notas para trabajar sin conexión (IndexedDB).
+// Guarda una copia de las notas del usuario y una cola de cambios pendientes
+// (outbox, como mucho una entrada por nota). sync() envía la cola a
+// POST /api/notes/sync y trae lo cambiado desde el último cursor con
+// GET /api/notes/sync, así que el servidor solo ve deltas. Las vistas pintan
+// desde el almacén y se refrescan con onChange().
+(function (window) {
+    const DB_VERSION = 1;
+    const SYNC_DELAY = 1000;
+    const SYNC_INTERVAL = 60000;
+    const PUSH_BATCH = 100;
+
+    const promisify = (req) => new Promise((resolve, reject) => {
+        req.onsuccess = () => resolve(req.result);
+        req.onerror = () => reject(req.error);
+    });
+
+    const completed = (tx) => new Promise((resolve, reject) => {
+        tx.oncomplete = () => resolve();
+        tx.onerror = tx.onabort = () => reject(tx.error);
+    });
+
+    function openDatabase(name) {
+        const req = indexedDB.open(name, DB_VERSION);
+        req.onupgradeneeded = () => {
+            const db = req.result;
+            db.createObjectStore('notes', { keyPath: 'id' });
+            db.createObjectStore('outbox', { keyPath: 'id' });
+            db.createObjectStore('meta');
+        };
+        return promisify(req);
+    }
+
+    async function fetchJSON(url, options) {
+        const response = await fetch(url, options);
+        const data = await response.json().catch(() => ({}));
+        if (!response.ok) {
+            const error = new Error(data.error || `HTTP ${response.status}`);
+            error.status = response.status;
+            throw error;
+        }
+        return data;
+    }
+
+    const preview = (content) => (content || '').length > 150 ? content.substring(0, 150) + '...' : (content || '');
+
+    class NotesStore {
+        constructor(db) {
+            this.db = db;
+            this.listeners = [];
+            this.conflictListeners = [];
+            this.running = null;
+            this.timer = null;
+        }
+
+        static async open(userId) {
+            if (!window.indexedDB || !userId) return null;
+            const store = new NotesStore(await openDatabase(`notes-sync-${userId}`));
+            window.addEventListener('online', () => store.sync());
+            setInterval(() => store.sync(), SYNC_INTERVAL);
+            return store;
+        }
+
+        onChange(listener) {
+            this.listeners.push(listener);
+        }
+
+        // Se llama con {note, local, conflicts} cuando el servidor conserva su valor
+        onConflict(listener) {
+            this.conflictListeners.push(listener);
+        }
+
+        async all() {
+            return promisify(this.db.transaction('notes').objectStore('notes').getAll());
+        }
+
+        async hasSnapshot() {
+            return (await this.getMeta('cursor')) !== undefined;
+        }
+
+        async getMeta(key) {
+            return promisify(this.db.transaction('meta').objectStore('meta').get(key));
+        }
+
+        async setMeta(key, value) {
+            const tx = this.db.transaction('meta', 'readwrite');
+            tx.objectStore('meta').put(value, key);
+            return completed(tx);
+        }
+
+        async emit() {
+            const notes = await this.all();
+            this.listeners.forEach(listener => listener(notes));
+        }
+
+        // --- Cambios locales: se ven al instante y quedan en la cola ---
+
+        async update(id, changes) {
+            const tx = this.db.transaction(['notes', 'outbox'], 'readwrite');
+            const notes = tx.objectStore('notes');
+            const outbox = tx.objectStore('outbox');
+            const note = await promisify(notes.get(id));
+            if (!note) return;
+            const entry = (await promisify(outbox.get(id))) || { id, op: 'update', base: {}, changes: {}, seq: 0 };
+            if (entry.op === 'update') {
+                // base: el valor que tenía el servidor antes del primer cambio local
+                Object.keys(changes).forEach(field => {
+                    if (!(field in entry.base)) entry.base[field] = note[field];
+                });
+            }
+            Object.assign(entry.changes, changes);
+            entry.seq += 1;
+            Object.assign(note, changes, { updated_at: new Date().toISOString() });
+            if ('content' in changes) note.content_preview = preview(changes.content);
+            notes.put(note);
+            outbox.put(entry);
+            await completed(tx);
+            this.emit();
+            this.scheduleSync();
+        }
+
+        async create(fields, display = {}) {
+            const clientId = window.crypto && crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random()}`;
+            const id = -Date.now();
+            const now = new Date().toISOString();
+            const tx = this.db.transaction(['notes', 'outbox'], 'readwrite');
+            tx.objectStore('notes').put(Object.assign({
+                id, created_at: now, updated_at: now, content_preview: preview(fields.content),
+                attachments: [], attachments_count: 0, likes_count: 0, comments_count: 0, tags: []
+            }, display, fields));
+            tx.objectStore('outbox').put({ id, op: 'create', client_id: clientId, changes: fields, seq: 1 });
+            await completed(tx);
+            this.emit();
+            this.scheduleSync();
+            return id;
+        }
+
+        async remove(id) {
+            const tx = this.db.transaction(['notes', 'outbox'], 'readwrite');
+            const outbox = tx.objectStore('outbox');
+            const entry = await promisify(outbox.get(id));
+            tx.objectStore('notes').delete(id);
+            if (entry && entry.op === 'create') {
+                // Nunca llegó al servidor
+                outbox.delete(id);
+            } else {
+                outbox.put({ id, op: 'delete', seq: (entry ? entry.seq : 0) + 1 });
+            }
+            await completed(tx);
+            this.emit();
+            this.scheduleSync();
+        }
+
+        // --- Sincronización ---
+
+        scheduleSync() {
+            clearTimeout(this.timer);
+            this.timer = setTimeout(() => this.sync(), SYNC_DELAY);
+        }
+
+        sync() {
+            if (this.running || !navigator.onLine) return this.running;
+            this.running = (async () => {
+                try {
+                    const pushed = await this.push();
+                    const pulled = await this.pull();
+                    if (pushed || pulled) await this.emit();
+                } catch (error) {
+                    console.error('Sync error:', error);
+                } finally {
+                    this.running = null;
+                }
+            })();
+            return this.running;
+        }
+
+        async push() {
+            const entries = await promisify(this.db.transaction('outbox').objectStore('outbox').getAll());
+            for (let i = 0; i < entries.length; i += PUSH_BATCH) {
+                const batch = entries.slice(i, i + PUSH_BATCH);
+                const data = await fetchJSON('/api/notes/sync', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({
+                        mutations: batch.map(entry => ({
+                            mutation_id: String(entry.id),
+                            op: entry.op,
+                            id: entry.op === 'create' ? undefined : entry.id,
+                            client_id: entry.client_id,
+                            base: entry.base,
+                            changes: entry.changes
+                        }))
+                    })
+                });
+                await this.applyResults(batch, data.results);
+            }
+            return entries.length > 0;
+        }
+
+        async applyResults(batch, results) {
+            const conflicts = [];
+            const tx = this.db.transaction(['notes', 'outbox'], 'readwrite');
+            const notes = tx.objectStore('notes');
+            const outbox = tx.objectStore('outbox');
+
+            for (let index = 0; index < batch.length; index++) {
+                const entry = batch[index];
+                const result = results[index] || { status: 'error' };
+                const current = await promisify(outbox.get(entry.id));
+                const editedMeanwhile = current && current.seq !== entry.seq;
+
+                if (result.status === 'error') {
+                    console.error('Sync mutation rejected:', result.error);
+                }
+                if (entry.op === 'create' && result.id) {
+                    notes.delete(entry.id);
+                }
+                if (result.status === 'deleted') {
+                    notes.delete(entry.id);
+                } else if (result.note && !(editedMeanwhile && current.op === 'delete')) {
+                    const pending = editedMeanwhile ? current.changes : {};
+                    notes.put(Object.assign({}, result.note, pending));
+                }
+                if (result.conflicts && Object.keys(result.conflicts).length) {
+                    conflicts.push({ note: result.note, local: entry.changes, conflicts: result.conflicts });
+                }
+
+                outbox.delete(entry.id);
+                if (editedMeanwhile && result.status !== 'deleted') {
+                    if (entry.op === 'create' && result.id) {
+                        // La nota ya tiene id real: lo pendiente pasa a ser una actualización
+                        const base = {};
+                        Object.keys(current.changes || {}).forEach(field => { base[field] = result.note[field]; });
+                        outbox.put(Object.assign({}, current, {
+                            id: result.id, op: current.op === 'delete' ? 'delete' : 'update', base
+                        }));
+                    } else {
+                        outbox.put(current);
+                    }
+                }
+            }
+            await completed(tx);
+            conflicts.forEach(conflict => this.conflictListeners.forEach(listener => listener(conflict)));
+        }
+
+        async pull() {
+            let cursor = await this.getMeta('cursor');
+            if (cursor === undefined) return this.snapshot();
+
+            let changed = false;
+            let data;
+            do {
+                try {
+                    data = await fetchJSON(`/api/notes/sync?cursor=${cursor}`);
+                } catch (error) {
+                    if (error.status === 410) return this.snapshot();
+                    throw error;
+                }
+                await this.merge(data.notes, data.deleted);
+                changed = changed || data.notes.length > 0 || data.deleted.length > 0;
+                cursor = data.cursor;
+                await this.setMeta('cursor', cursor);
+            } while (data.has_more);
+            return changed;
+        }
+
+        async snapshot() {
+            let afterId = 0;
+            let cursor = null;
+            const received = [];
+            let data;
+            do {
+                data = await fetchJSON(`/api/notes/sync?after_id=${afterId}`);
+                if (cursor === null) cursor = data.cursor;
+                received.push(...data.notes);
+                afterId = data.after_id;
+            } while (data.has_more);
+
+            // Lo que no está en la instantánea se ha borrado, salvo lo pendiente de enviar
+            const pending = new Set(await promisify(this.db.transaction('outbox').objectStore('outbox').getAllKeys()));
+            const ids = new Set(received.map(note => note.id));
+            const local = await this.all();
+            const removed = local.filter(note => !ids.has(note.id) && !pending.has(note.id) && note.id > 0)
+                .map(note => note.id);
+            await this.merge(received, removed);
+            await this.setMeta('cursor', cursor);
+            return true;
+        }
+
+        async merge(records, deletedIds) {
+            const tx = this.db.transaction(['notes', 'outbox'], 'readwrite');
+            const notes = tx.objectStore('notes');
+            const outbox = tx.objectStore('outbox');
+            for (const record of records) {
+                const entry = await promisify(outbox.get(record.id));
+                if (entry && entry.op === 'delete') continue;
+                // Los cambios locales sin enviar se siguen viendo encima del servidor
+                notes.put(Object.assign({}, record, entry ? entry.changes : {}));
+            }
+            for (const id of deletedIds) {
+                notes.delete(id);
+                outbox.delete(id);
+            }
+            return completed(tx);
+        }
+    }
+
+    window.NotesStore = NotesStore;
+})(window);
@@ -0,0 +1,40 @@
+// Autocompletado de etiquetas para inputs "a, b, c" (data-tag-input).
+// Pide /api/tags?prefix=<última etiqueta> y rellena un <datalist> con el
+// valor completo del input para que al elegir se sustituya solo la última.
+(function (window, document) {
+    function attach(input) {
+        const datalist = document.getElementById(input.getAttribute('list'));
+        if (!datalist) return;
+        let timer = null;
+
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(async () => {
+                const parts = input.value.split(',');
+                const prefix = parts.pop().trim();
+                const head = parts.map(part => part.trim()).filter(Boolean);
+                if (!prefix) {
+                    datalist.innerHTML = '';
+                    return;
+                }
+                try {
+                    const response = await fetch(`/api/tags?prefix=${encodeURIComponent(prefix)}`);
+                    const tags = await response.json();
+                    datalist.innerHTML = '';
+                    tags.filter(tag => !head.includes(tag.name)).forEach(tag => {
+                        const option = document.createElement('option');
+                        option.value = head.concat(tag.name).join(', ');
+                        option.label = `${tag.name} (${tag.note_count})`;
+                        datalist.appendChild(option);
+                    });
+                } catch (error) {
+                    console.error('Error loading tags:', error);
+                }
+            }, 150);
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('[data-tag-input]').forEach(attach);
+    });
+})(window, document);
@@ -0,0 +1,220 @@
+// static/js/view_note.js
+// Likes, comments and sharing for the note detail page
+
+const NOTE = JSON.parse(document.getElementById('note-data').textContent);
+
+let commentsVisible = false;
+
+// Toggle like
+document.querySelector('.like-btn').addEventListener('click', function() {
+    const noteId = this.dataset.noteId;
+    const liked = this.dataset.liked === 'true';
+    
+    fetch(`/api/notes/${noteId}/like`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        }
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            this.dataset.liked = data.liked.toString();
+            this.querySelector('.likes-count').textContent = data.likes_count;
+            
+            if (data.liked) {
+                this.classList.remove('btn-outline-danger');
+                this.classList.add('btn-danger');
+            } else {
+                this.classList.remove('btn-danger');
+                this.classList.add('btn-outline-danger');
+            }
+            
+            showToast(data.message, 'success');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        showToast('Error al procesar like', 'error');
+    });
+});
+
+// Toggle comments section
+function toggleComments() {
+    const section = document.getElementById('comments-section');
+    if (commentsVisible) {
+        section.style.display = 'none';
+        commentsVisible = false;
+    } else {
+        section.style.display = 'block';
+        commentsVisible = true;
+        loadComments();
+    }
+}
+
+// Load comments
+function loadComments() {
+    const noteId = NOTE.id;
+    
+    fetch(`/api/notes/${noteId}/comments`)
+    .then(response => response.json())
+    .then(data => {
+        displayComments(data.comments);
+    })
+    .catch(error => {
+        console.error('Error loading comments:', error);
+    });
+}
+
+// Display comments
+function displayComments(comments) {
+    const container = document.getElementById('comments-list');
+    container.innerHTML = '';
+    
+    if (comments.length === 0) {
+        container.innerHTML = '<p class="text-muted text-center">No hay comentarios aún. ¡Sé el primero en comentar!</p>';
+        return;
+    }
+    
+    comments.forEach(comment => {
+        const commentHtml = `
+            <div class="comment mb-3 p-3 border rounded">
+                <div class="d-flex">
+                    <div class="me-3">
+                        ${comment.author.profile_pic ? 
+                            `<img src="/static/uploads/${comment.author.profile_pic}" class="rounded-circle" width="40" height="40">` :
+                            `<div class="bg-secondary rounded-circle d-inline-flex align-items-center justify-content-center" style="width: 40px; height: 40px;">
+                                <i class="fas fa-user text-white"></i>
+                            </div>`
+                        }
+                    </div>
+                    <div class="flex-grow-1">
+                        <div class="d-flex justify-content-between align-items-start">
+                            <h6 class="mb-1">${comment.author.username}</h6>
+                            <small class="text-muted">${new Date(comment.created_at).toLocaleDateString()}</small>
+                        </div>
+                        <p class="mb-2">${comment.content}</p>
+                        ${comment.replies_count > 0 ? 
+                            `<button class="btn btn-sm btn-outline-primary" onclick="loadReplies(${comment.id})">
+                                Ver ${comment.replies_count} respuestas
+                            </button>` : ''
+                        }
+                        <button class="btn btn-sm btn-link text-muted" onclick="replyToComment(${comment.id})">
+                            Responder
+                        </button>
+                    </div>
+                </div>
+                <div id="replies-${comment.id}" class="ms-5 mt-2" style="display: none;"></div>
+            </div>
+        `;
+        container.innerHTML += commentHtml;
+    });
+}
+
+// Submit comment
+function submitComment(parentId = null) {
+    const input = document.getElementById('comment-input');
+    const content = input.value.trim();
+    
+    if (!content) {
+        showToast('El comentario no puede estar vacío', 'error');
+        return;
+    }
+    
+    const noteId = NOTE.id;
+    
+    fetch(`/api/notes/${noteId}/comments`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            content: content,
+            parent_id: parentId
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            input.value = '';
+            loadComments();
+            
+            // Update comment count
+            document.querySelector('.comments-count').textContent = 
+                parseInt(document.querySelector('.comments-count').textContent) + 1;
+            
+            showToast(data.message, 'success');
+        } else {
+            showToast(data.error, 'error');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        showToast('Error al enviar comentario', 'error');
+    });
+}
+
+// Share note
+function shareNote() {
+    const url = window.location.href;
+    if (navigator.share) {
+        navigator.share({
+            title: NOTE.title,
+            text: `${NOTE.excerpt}...`,
+            url: url
+        });
+    } else {
+        navigator.clipboard.writeText(url).then(() => {
+            showToast('Enlace copiado al portapapeles', 'success');
+        });
+    }
+}
+
+// Toast notifications
+function showToast(message, type) {
+    const toast = document.createElement('div');
+    toast.className = `alert alert-${type === 'success' ? 'success' : 'danger'} position-fixed`;
+    toast.style.cssText = 'top: 20px; right: 20px; z-index: 9999; min-width: 300px;';
+    toast.innerHTML = `
+        ${message}
+        <button type="button" class="btn-close" onclick="this.parentElement.remove()"></button>
+    `;
+    document.body.appendChild(toast);
+    
+    setTimeout(() => {
+        if (toast.parentElement) {
+            toast.remove();
+        }
+    }, 3000);
+}
+
+// Initialize like button state
+document.addEventListener('DOMContentLoaded', function() {
+    const likeBtn = document.querySelector('.like-btn');
+    if (likeBtn.dataset.liked === 'true') {
+        likeBtn.classList.remove('btn-outline-danger');
+        likeBtn.classList.add('btn-danger');
+    }
+    
+    // Live likes and comments from other users
+    const noteId = NOTE.id;
+    const currentUserId = NOTE.currentUserId;
+    LiveUpdates.connect({
+        noteIds: [noteId],
+        handlers: {
+            like: data => {
+                if (data.note_id !== noteId) return;
+                likeBtn.querySelector('.likes-count').textContent = data.likes_count;
+            },
+            comment: data => {
+                if (data.note_id !== noteId || data.comment.author.id === currentUserId) return;
+                const counter = document.querySelector('.comments-count');
+                counter.textContent = parseInt(counter.textContent) + 1;
+                if (commentsVisible) loadComments();
+            },
+            comment_deleted: data => {
+                if (data.note_id === noteId && commentsVisible) loadComments();
+            }
+        }
+    });
+});
@@ -0,0 +1,181 @@
+# suggestions.py
+"""
+Motor de sugerencias de usuarios a seguir (amigos de amigos).
+
+La puntuación de cada candidato combina:
+- solapamiento a 2 saltos: cuántos de los usuarios que sigo le siguen,
+- intereses compartidos: similitud coseno entre las categorías de mis notas
+  y las de sus notas públicas,
+- reputación del candidato.
+
+El cálculo se hace offline (`flask compute-suggestions`) sobre una foto del
+grafo cargada con unas pocas consultas agrupadas, se reparte entre un pool de
+procesos y guarda el top-K por usuario en la tabla follow_suggestion.
+"""
+import math
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import func, exists
+from sqlalchemy.orm import joinedload
+from extensions import db
+from models import User, Note, FollowSuggestion, followers
+
+MUTUAL_WEIGHT = 3.0
+INTEREST_WEIGHT = 2.0
+REPUTATION_WEIGHT = 0.5
+CATEGORY_AUTHORS_LIMIT = 50
+DEFAULT_TOP_K = 20
+CHUNK_SIZE = 500
+
+
+def load_graph():
+    """Carga en memoria lo necesario para puntuar (no depende de la sesión)"""
+    following = defaultdict(set)
+    for follower_id, followed_id in db.session.query(followers.c.follower_id, followers.c.followed_id):
+        following[follower_id].add(followed_id)
+
+    interests = defaultdict(Counter)
+    public_interests = defaultdict(Counter)
+    rows = db.session.query(Note.user_id, Note.category_id, Note.is_public, func.count(Note.id))\
+        .group_by(Note.user_id, Note.category_id, Note.is_public)
+    for user_id, category_id, is_public, count in rows:
+        interests[user_id][category_id] += count
+        if is_public:
+            public_interests[user_id][category_id] += count
+
+    reputation = {user_id: points or 0 for user_id, points in db.session.query(User.id, User.reputation_points)}
+
+    # Autores con más reputación por categoría: candidatos por interés sin
+    # tener que recorrer todos los usuarios
+    category_authors = defaultdict(list)
+    for user_id, counts in public_interests.items():
+        for category_id in counts:
+            category_authors[category_id].append(user_id)
+    for category_id, authors in category_authors.items():
+        authors.sort(key=lambda uid: reputation.get(uid, 0), reverse=True)
+        del authors[CATEGORY_AUTHORS_LIMIT:]
+
+    return {
+        'following': dict(following),
+        'interests': dict(interests),
+        'public_interests': dict(public_interests),
+        'reputation': reputation,
+        'category_authors': dict(category_authors),
+    }
+
+
+def _cosine(a, b):
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b.get(key, 0) for key, count in a.items())
+    if not dot:
+        return 0.0
+    norm_a = math.sqrt(sum(v * v for v in a.values()))
+    norm_b = math.sqrt(sum(v * v for v in b.values()))
+    return dot / (norm_a * norm_b)
+
+
+def score_user(graph, user_id, top_k=DEFAULT_TOP_K):
+    """Devuelve [(candidate_id, score, mutual_count)] ordenado por score"""
+    following = graph['following']
+    my_following = following.get(user_id, set())
+    my_interests = graph['interests'].get(user_id, {})
+
+    mutual = Counter()
+    for followed_id in my_following:
+        mutual.update(following.get(followed_id, ()))
+
+    candidates = set(mutual)
+    for category_id in my_interests:
+        candidates.update(graph['category_authors'].get(category_id, ()))
+    candidates.discard(user_id)
+    candidates -= my_following
+
+    scored = []
+    for candidate_id in candidates:
+        similarity = _cosine(my_interests, graph['public_interests'].get(candidate_id, {}))
+        score = (MUTUAL_WEIGHT * mutual[candidate_id]
+                 + INTEREST_WEIGHT * similarity
+                 + REPUTATION_WEIGHT * math.log1p(graph['reputation'].get(candidate_id, 0)))
+        scored.append((candidate_id, score, mutual[candidate_id]))
+
+    scored.sort(key=lambda item: (-item[1], item[0]))
+    return scored[:top_k]
+
+
+# Estado de cada proceso del pool (se envía una vez con el initializer)
+_worker_graph = None
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _score_chunk(args):
+    user_ids, top_k = args
+    return [(user_id, score_user(_worker_graph, user_id, top_k)) for user_id in user_ids]
+
+
+def _store(results):
+    user_ids = [user_id for user_id, _ in results]
+    FollowSuggestion.query.filter(FollowSuggestion.user_id.in_(user_ids))\
+        .delete(synchronize_session=False)
+    now = datetime.utcnow()
+    db.session.bulk_insert_mappings(FollowSuggestion, [
+        {
+            'user_id': user_id,
+            'suggested_user_id': candidate_id,
+            'score': score,
+            'mutual_count': mutual_count,
+            'computed_at': now
+        }
+        for user_id, scored in results
+        for candidate_id, score, mutual_count in scored
+    ])
+
+
+def compute_all(workers=1, top_k=DEFAULT_TOP_K):
+    """Recalcula las sugerencias de todos los usuarios y devuelve cuántos procesó"""
+    graph = load_graph()
+    user_ids = sorted(graph['reputation'])
+    chunks = [(user_ids[i:i + CHUNK_SIZE], top_k) for i in range(0, len(user_ids), CHUNK_SIZE)]
+
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(graph,)) as pool:
+            for results in pool.map(_score_chunk, chunks):
+                _store(results)
+    else:
+        _init_worker(graph)
+        for chunk in chunks:
+            _store(_score_chunk(chunk))
+
+    db.session.commit()
+    return len(user_ids)
+
+
+def get_suggestions(user_id, limit=5):
+    """Sugerencias precalculadas (una lectura por índice) con fallback por reputación"""
+    suggested = User.query.join(FollowSuggestion, FollowSuggestion.suggested_user_id == User.id)\
+        .options(joinedload(User.stats))\
+        .filter(FollowSuggestion.user_id == user_id)\
+        .order_by(FollowSuggestion.score.desc())\
+        .limit(limit).all()
+    if suggested:
+        return suggested
+
+    # Aún sin calcular: usuarios con más reputación que no sigue
+    already_following = exists().where(followers.c.follower_id == user_id,
+                                       followers.c.followed_id == User.id)
+    return User.query.options(joinedload(User.stats))\
+        .filter(User.id != user_id, ~already_following)\
+        .order_by(User.reputation_points.desc())\
+        .limit(limit).all()
+
+
+def discard_suggestion(user_id, suggested_user_id):
+    """Incremental: al seguir a alguien deja de sugerirse"""
+    FollowSuggestion.query.filter_by(user_id=user_id, suggested_user_id=suggested_user_id)\
+        .delete(synchronize_session=False)
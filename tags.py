@@ -0,0 +1,121 @@
+# tags.py
+"""
+Etiquetas de notas: varias por nota, con filtrado AND/OR rápido.
+
+- La tabla note_tags indexada por (tag_id, note_id) hace de índice
+  invertido: cada etiqueta tiene su lista ordenada de notas y la
+  intersección (todas las etiquetas) o la unión (alguna) se resuelve en SQL
+  sin cargar las notas.
+- Tag.note_count se mantiene de forma incremental al etiquetar, quitar
+  etiquetas o borrar notas, así que los contadores no necesitan COUNT(*).
+- El autocompletado busca por rango [prefijo, prefijo + U+FFFF) sobre el
+  índice único (user_id, name).
+"""
+import re
+
+from sqlalchemy import func
+
+from extensions import db
+from models import Tag, note_tags
+
+MAX_TAG_LENGTH = 50
+MAX_TAGS_PER_NOTE = 20
+
+
+def normalize_tag(name):
+    """'  #Work  Ideas ' -> 'work ideas'"""
+    name = re.sub(r'\s+', ' ', (name or '').strip().lstrip('#').strip()).lower()
+    return name[:MAX_TAG_LENGTH]
+
+
+def parse_tags(value):
+    """Lista de nombres normalizados y sin duplicados desde 'a, b' o ['a', 'b']"""
+    if isinstance(value, str):
+        value = value.split(',')
+    names = []
+    for raw in value or ():
+        name = normalize_tag(raw)
+        if name and name not in names:
+            names.append(name)
+    return names[:MAX_TAGS_PER_NOTE]
+
+
+def set_note_tags(note, names):
+    """
+    Sustituye las etiquetas de una nota, creando las que falten y ajustando
+    los contadores. No hace commit. Devuelve True si algo ha cambiado.
+    """
+    names = parse_tags(names)
+    owner_id = note.user_id or note.author.id
+    current = {tag.name: tag for tag in note.tags}
+    added = [name for name in names if name not in current]
+    removed = [tag for name, tag in current.items() if name not in names]
+    if not added and not removed:
+        return False
+
+    existing = {}
+    if added:
+        existing = {tag.name: tag for tag in
+                    Tag.query.filter(Tag.user_id == owner_id, Tag.name.in_(added))}
+    for name in added:
+        tag = existing.get(name)
+        if tag is None:
+            tag = Tag(user_id=owner_id, name=name, note_count=1)
+            db.session.add(tag)
+        else:
+            tag.note_count = Tag.note_count + 1
+        note.tags.append(tag)
+    for tag in removed:
+        note.tags.remove(tag)
+        tag.note_count = Tag.note_count - 1
+    return True
+
+
+def remove_note_tags(note_ids):
+    """Quita las etiquetas de notas que se van a borrar (borrado en bloque). No hace commit."""
+    note_ids = list(note_ids)
+    counts = db.session.query(note_tags.c.tag_id, func.count())\
+        .filter(note_tags.c.note_id.in_(note_ids))\
+        .group_by(note_tags.c.tag_id).all()
+    for tag_id, count in counts:
+        Tag.query.filter_by(id=tag_id).update(
+            {Tag.note_count: Tag.note_count - count}, synchronize_session=False)
+    db.session.execute(note_tags.delete().where(note_tags.c.note_id.in_(note_ids)))
+
+
+def tagged_notes_query(user_id, names, match='all'):
+    """
+    Ids de las notas con las etiquetas dadas: intersección de las listas si
+    match='all', unión si match='any'. Para usar con Note.id.in_(...).
+    """
+    names = parse_tags(names)
+    query = db.session.query(note_tags.c.note_id)\
+        .join(Tag, Tag.id == note_tags.c.tag_id)\
+        .filter(Tag.user_id == user_id, Tag.name.in_(names))
+    if match == 'any':
+        return query.distinct()
+    # Cada par (note_id, tag_id) es único: una nota con todas las etiquetas
+    # aparece exactamente len(names) veces
+    return query.group_by(note_tags.c.note_id)\
+        .having(func.count(note_tags.c.tag_id) == len(names))
+
+
+def note_tags_map(note_ids):
+    """{note_id: [nombres]} para una página de notas con una sola consulta"""
+    result = {}
+    rows = db.session.query(note_tags.c.note_id, Tag.name)\
+        .join(Tag, Tag.id == note_tags.c.tag_id)\
+        .filter(note_tags.c.note_id.in_(list(note_ids)))\
+        .order_by(Tag.name)
+    for note_id, name in rows:
+        result.setdefault(note_id, []).append(name)
+    return result
+
+
+def autocomplete(user_id, prefix, limit=10):
+    """Etiquetas en uso del usuario que empiezan por prefix, las más usadas primero"""
+    prefix = normalize_tag(prefix)
+    query = Tag.query.filter(Tag.user_id == user_id, Tag.note_count > 0)
+    if prefix:
+        query = query.filter(Tag.name >= prefix, Tag.name < prefix + '\uffff')
+    return query.order_by(Tag.note_count.desc(), Tag.name).limit(limit).all()